@@ -0,0 +1,16 @@
+from fastapi import APIRouter, HTTPException
+from app.core.circuit_breaker import list_destinations, get_destination_state, BREAKER_HOSTS_KEY
+from app.core.cache import redis_client
+
+router = APIRouter(prefix="/destinations", tags=["destinations"])
+
+@router.get("/")
+def get_destinations():
+    """Circuit breaker and concurrency state for every target host"""
+    return list_destinations()
+
+@router.get("/{host}")
+def get_destination(host: str):
+    if not redis_client.sismember(BREAKER_HOSTS_KEY, host):
+        raise HTTPException(status_code=404, detail="Destination not found")
+    return get_destination_state(host)
@@ -1,11 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
 from app.database import get_db
 from app.schemas.subscription import SubscriptionCreate, Subscription, SubscriptionUpdate
 from app.models.subscription import Subscription as SubscriptionModel
+from app.schemas.webhook import WebhookDeliveryDetail
 from app.models.webhook import WebhookDelivery
-from app.core.cache import cache_subscription, invalidate_subscription_cache
+from app.core.cache import (
+    cache_subscription, invalidate_subscription_cache, stamp_subscription_deleted, stamp_subscription_version
+)
+from app.core.event_index import index_subscription, remove_subscription
+from app.core.delivery_query import delivery_details
 import hashlib
 import secrets
 
@@ -28,11 +33,18 @@ def create_subscription(subscription: SubscriptionCreate, db: Session = Depends(
     db.commit()
     db.refresh(db_subscription)
     cache_subscription(db_subscription)
+    index_subscription(db_subscription)
     return db_subscription
 
 @router.get("/", response_model=List[Subscription])
-def list_subscriptions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    subscriptions = db.query(SubscriptionModel).offset(skip).limit(limit).all()
+def list_subscriptions(skip: int = 0, limit: int = 100, after_id: Optional[int] = None, db: Session = Depends(get_db)):
+    # after_id pages by primary key, which stays fast at any depth; skip is kept for old clients
+    query = db.query(SubscriptionModel).order_by(SubscriptionModel.id)
+    if after_id is not None:
+        query = query.filter(SubscriptionModel.id > after_id)
+    else:
+        query = query.offset(skip)
+    subscriptions = query.limit(limit).all()
     return subscriptions
 
 @router.get("/{subscription_id}", response_model=Subscription)
@@ -52,13 +64,19 @@ def update_subscription(
     if not db_subscription:
         raise HTTPException(status_code=404, detail="Subscription not found")
     
-    for key, value in subscription.dict(exclude_unset=True).items():
+    update_data = subscription.dict(exclude_unset=True)
+    if "target_url" in update_data:
+        update_data["target_url"] = str(update_data["target_url"])
+    for key, value in update_data.items():
         setattr(db_subscription, key, value)
+    db_subscription.version = SubscriptionModel.version + 1
     
     db.commit()
     db.refresh(db_subscription)
+    stamp_subscription_version(subscription_id, db_subscription.version)
     invalidate_subscription_cache(subscription_id)
     cache_subscription(db_subscription)
+    index_subscription(db_subscription)
     return db_subscription
 
 @router.delete("/{subscription_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -69,12 +87,14 @@ def delete_subscription(subscription_id: int, db: Session = Depends(get_db)):
     
     db.delete(subscription)
     db.commit()
-    invalidate_subscription_cache(subscription_id) 
+    stamp_subscription_deleted(subscription_id)
+    invalidate_subscription_cache(subscription_id)
+    remove_subscription(subscription_id)
 
 
-@router.get("/{subscription_id}/recent-deliveries")
+@router.get("/{subscription_id}/recent-deliveries", response_model=List[WebhookDeliveryDetail])
 def get_recent_deliveries(subscription_id: int, limit: int = 20, db: Session = Depends(get_db)):
-    deliveries = db.query(WebhookDelivery).filter(
+    deliveries = db.query(WebhookDelivery).options(selectinload(WebhookDelivery.attempts)).filter(
         WebhookDelivery.subscription_id == subscription_id
-    ).order_by(WebhookDelivery.created_at.desc()).limit(limit).all()
-    return deliveries
\ No newline at end of file
+    ).order_by(WebhookDelivery.created_at.desc(), WebhookDelivery.id.desc()).limit(limit).all()
+    return delivery_details(db, deliveries)
\ No newline at end of file
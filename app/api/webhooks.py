@@ -1,77 +1,398 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
-from sqlalchemy.orm import Session
-from typing import Optional
-from app.database import get_db
-from app.schemas.webhook import WebhookIngestion, WebhookDeliveryStatus
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Request, Response, Query
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from datetime import datetime
+import time
+from typing import Optional, List, Tuple
+from app.config import settings
+from app.database import get_db, get_async_db
+from app.schemas.webhook import (
+    WebhookIngestion, WebhookDeliveryStatus, WebhookDeliveryDetail, WebhookBatchItem, WebhookBatchItemResult, WebhookBatchResponse,
+    ReplayRequest, ReplayStatus
+)
 from app.models.webhook import WebhookDelivery, DeliveryAttempt
 from app.models.subscription import Subscription as SubscriptionModel
-from app.core.security import verify_signature
-from app.tasks.webhook_tasks import process_webhook
-from app.core.cache import get_cached_subscription, cache_subscription
+from app.core.security import verify_signature, StreamingSignatureVerifier
+from app.core.payload_store import encode_json
+from app.core.broker import enqueue_new_deliveries_async
+from app.core.cache import get_subscription_async
+from app.core.ingest_buffer import get_write_buffer
+from app.core.admission import enforce_queue_depth, enforce_rate_limit
+from app.core.subscription_store import load_subscription
+from app.core.delivery_store import insert_deliveries
+from app.core.delivery_query import decode_cursor, delivery_details, encode_cursor, filter_deliveries, page_newest_first
+from app.core.export import iter_delivery_records, iter_ndjson
+from app.core.metrics import INGEST_STAGE_SECONDS, INGEST_DUPLICATES
+from app.core import codec, idempotency, replay
 
 router = APIRouter(prefix="/webhooks", tags=["webhooks"])
 
-def get_subscription_from_db(subscription_id: int, db: Session):
-    """Get subscription from database and return as dict"""
-    db_subscription = db.query(SubscriptionModel).filter(
-        SubscriptionModel.id == subscription_id,
-        SubscriptionModel.is_active == True
-    ).first()
+async def get_subscription(subscription_id: int) -> dict:
+    """Get subscription from the local or Redis cache, falling back to the database"""
+    subscription = await get_subscription_async(subscription_id, load_subscription)
+    if not subscription:
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    return subscription
+
+def check_signature(subscription: dict, payload: dict, body: bytes, signature: Optional[str]) -> Optional[str]:
+    """Return the rejection reason for a payload encoded as body, or None if it is acceptable"""
+    if subscription.get('secret_key'):
+        if not signature:
+            return "Signature required"
+        with INGEST_STAGE_SECONDS.labels(stage="signature").time():
+            valid = verify_signature(payload, subscription['secret_key'], signature, body)
+        if not valid:
+            return "Invalid signature"
+    return None
+
+async def create_delivery(
+    subscription: dict,
+    webhook: WebhookIngestion,
+    body: bytes,
+    db: AsyncSession,
+    claim: Optional[Tuple[str, int]] = None
+) -> int:
+    """Store an accepted webhook, its payload already encoded as body, and queue it.
+
+    claim is the request's idempotency (key, ttl). It is completed as soon as
+    the row is committed and released only when the INSERT failed, so a
+    request cancelled or failing after its row was written never frees the
+    key for a duplicate. A cancellation mid-INSERT leaves the claim to expire.
+    """
+    row = {
+        "subscription_id": subscription["id"],
+        "payload": body,
+        "event_type": webhook.event_type,
+        "status": "PENDING"
+    }
     
-    if not db_subscription:
-        return None
+    # In group-commit mode the row is written, its claim settled and queued with its batch
+    if settings.INGEST_GROUP_COMMIT:
+        return await get_write_buffer().submit(row, subscription, claim)
     
-    # Cache the subscription for future use
-    cache_subscription(db_subscription)
+    try:
+        (delivery_id, payload_hash), = await insert_deliveries([row], db)
+    except Exception:
+        if claim:
+            await idempotency.release(claim[0])
+        raise
+    if claim:
+        await idempotency.complete(claim[0], delivery_id, claim[1])
     
-    # Convert DB model to dict for consistent usage
-    return {
-        "id": db_subscription.id,
-        "target_url": str(db_subscription.target_url),
-        "event_types": db_subscription.event_types,
-        "is_active": db_subscription.is_active,
-        "secret_key": db_subscription.secret_key
-    }
+    # Queue the webhook for processing
+    await enqueue_new_deliveries_async([(delivery_id, payload_hash, subscription)])
+    return delivery_id
+
+async def accept_webhook(
+    subscription: dict,
+    webhook: WebhookIngestion,
+    body: bytes,
+    idempotency_key: Optional[str],
+    response: Response,
+    db: AsyncSession
+) -> dict:
+    """Store and queue a verified webhook once per idempotency key; body is its encoded payload"""
+    subscription_id = subscription["id"]
+    if idempotency_key and len(idempotency_key) > idempotency.MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+    scoped = idempotency.scoped_key(subscription_id, idempotency_key, webhook.event_type, body)
+    if scoped is None:
+        await enforce_rate_limit(subscription)
+        delivery_id = await create_delivery(subscription, webhook, body, db)
+        return {"message": "Webhook accepted", "delivery_id": delivery_id}
+    
+    key, ttl = scoped
+    try:
+        existing_id = await idempotency.claim(key)
+    except idempotency.IdempotencyKeyInUse:
+        raise HTTPException(status_code=409, detail="A request with this idempotency key is still in progress")
+    
+    # Duplicates get the original delivery without touching the database or the queue
+    if existing_id is not None:
+        INGEST_DUPLICATES.labels(key_source="header" if idempotency_key else "payload").inc()
+        response.headers["Idempotent-Replayed"] = "true"
+        return {"message": "Webhook accepted", "delivery_id": existing_id}
+    
+    # Only new requests are charged to the rate limit; replays above are free
+    try:
+        await enforce_rate_limit(subscription)
+    except BaseException:
+        await idempotency.release(key)
+        raise
+    delivery_id = await create_delivery(subscription, webhook, body, db, scoped)
+    return {"message": "Webhook accepted", "delivery_id": delivery_id}
 
 @router.post("/ingest/{subscription_id}", status_code=status.HTTP_202_ACCEPTED)
 async def ingest_webhook(
     subscription_id: int,
     webhook: WebhookIngestion,
+    response: Response,
     x_hub_signature_256: Optional[str] = Header(None, alias="X-Hub-Signature-256"),
-    db: Session = Depends(get_db)
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # Get subscription from cache
-    subscription = get_cached_subscription(subscription_id)
-    
-    # If not in cache, try to get from database
-    if not subscription:
-        subscription = get_subscription_from_db(subscription_id, db)
-        if not subscription:
-            raise HTTPException(status_code=404, detail="Subscription not found")
+    await enforce_queue_depth()
+    subscription = await get_subscription(subscription_id)
     
     # Check event type filtering
     if subscription.get('event_types') and webhook.event_type not in subscription['event_types']:
         return {"message": "Event type not subscribed"}
     
+    # Encoded once; the same bytes are verified, hashed, stored and delivered
+    body = encode_json(webhook.payload)
+    
     # Verify signature if secret is present
+    error = check_signature(subscription, webhook.payload, body, x_hub_signature_256)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    
+    return await accept_webhook(subscription, webhook, body, idempotency_key, response, db)
+
+@router.post("/ingest/{subscription_id}/raw", status_code=status.HTTP_202_ACCEPTED)
+async def ingest_webhook_raw(
+    subscription_id: int,
+    request: Request,
+    response: Response,
+    x_hub_signature_256: Optional[str] = Header(None, alias="X-Hub-Signature-256"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Ingest with the signature computed over the raw request body.
+
+    The body is hashed as it streams in and only parsed once the signature
+    checks out, so forged requests never reach JSON parsing or the database.
+    """
+    await enforce_queue_depth()
+    subscription = await get_subscription(subscription_id)
+    
     if subscription.get('secret_key'):
         if not x_hub_signature_256:
             raise HTTPException(status_code=400, detail="Signature required")
-        if not verify_signature(webhook.payload, subscription['secret_key'], x_hub_signature_256):
+        verifier = StreamingSignatureVerifier(subscription['secret_key'])
+        chunks = []
+        # Only hashing counts towards the signature stage, not waiting on the client
+        hashing = 0.0
+        async for chunk in request.stream():
+            started = time.perf_counter()
+            verifier.update(chunk)
+            hashing += time.perf_counter() - started
+            chunks.append(chunk)
+        started = time.perf_counter()
+        valid = verifier.verify(x_hub_signature_256)
+        INGEST_STAGE_SECONDS.labels(stage="signature").observe(hashing + time.perf_counter() - started)
+        if not valid:
             raise HTTPException(status_code=400, detail="Invalid signature")
+        body = b"".join(chunks)
+    else:
+        body = await request.body()
     
-    # Create webhook delivery record
-    delivery = WebhookDelivery(
+    # Parsed once; the payload is stored and delivered in the bytes it arrived as
+    try:
+        members, payload_body = codec.loads_with_raw(body, "payload")
+        webhook = WebhookIngestion.model_validate(members)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid JSON: {str(e)}")
+    
+    # Check event type filtering
+    if subscription.get('event_types') and webhook.event_type not in subscription['event_types']:
+        return {"message": "Event type not subscribed"}
+    
+    return await accept_webhook(subscription, webhook, payload_body, idempotency_key, response, db)
+
+@router.post("/ingest/{subscription_id}/batch", response_model=WebhookBatchResponse, status_code=status.HTTP_202_ACCEPTED)
+async def ingest_webhook_batch(
+    subscription_id: int,
+    webhooks: List[WebhookBatchItem],
+    db: AsyncSession = Depends(get_async_db)
+):
+    # One multi-row INSERT per batch has to stay inside the drivers' bind parameter limits
+    if len(webhooks) > settings.INGEST_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch may hold at most {settings.INGEST_BATCH_MAX_ITEMS} webhooks"
+        )
+    await enforce_queue_depth()
+    subscription = await get_subscription(subscription_id)
+    
+    # Validate every item up front; only accepted items reach the database
+    results = []
+    rows = []
+    for index, webhook in enumerate(webhooks):
+        if subscription.get('event_types') and webhook.event_type not in subscription['event_types']:
+            error = "Event type not subscribed"
+        else:
+            body = encode_json(webhook.payload)
+            error = check_signature(subscription, webhook.payload, body, webhook.signature)
+        
+        result = WebhookBatchItemResult(index=index, accepted=error is None, error=error)
+        results.append(result)
+        if error is None:
+            rows.append({
+                "subscription_id": subscription_id,
+                "payload": body,
+                "event_type": webhook.event_type,
+                "status": "PENDING"
+            })
+    
+    if rows:
+        # Charged per item: the first ones the bucket covers go in, the rest are refused
+        admitted = await enforce_rate_limit(subscription, len(rows), partial=True)
+        if admitted < len(rows):
+            for result in [result for result in results if result.accepted][admitted:]:
+                result.accepted = False
+                result.error = "Rate limit exceeded"
+            rows = rows[:admitted]
+        stored = await insert_deliveries(rows, db)
+        
+        accepted = iter(stored)
+        for result in results:
+            if result.accepted:
+                result.delivery_id, _ = next(accepted)
+        
+        await enqueue_new_deliveries_async([
+            (delivery_id, payload_hash, subscription) for delivery_id, payload_hash in stored
+        ])
+    
+    return WebhookBatchResponse(
+        accepted=len(rows),
+        rejected=len(results) - len(rows),
+        results=results
+    )
+
+@router.get("/deliveries", response_model=List[WebhookDeliveryStatus])
+def list_deliveries(
+    response: Response,
+    subscription_id: Optional[int] = None,
+    delivery_status: Optional[str] = Query(None, alias="status"),
+    event_type: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """
+    List deliveries newest first with keyset pagination.
+
+    Pass the X-Next-Cursor response header back as ?cursor= for the next
+    page; the header is absent on the last page.
+    """
+    query = filter_deliveries(
+        db.query(WebhookDelivery),
         subscription_id=subscription_id,
-        payload=webhook.payload,
-        event_type=webhook.event_type,
-        status="PENDING"
+        status=delivery_status,
+        event_type=event_type,
+        created_after=created_after,
+        created_before=created_before
     )
-    db.add(delivery)
-    db.commit()
-    db.refresh(delivery)
+    try:
+        query = page_newest_first(query, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Queue the webhook for processing
-    process_webhook.delay(delivery.id)
+    # Attempts for the whole page come from one IN query instead of one per delivery
+    deliveries = query.options(selectinload(WebhookDelivery.attempts)).limit(limit + 1).all()
+    if len(deliveries) > limit:
+        deliveries = deliveries[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(deliveries[-1].created_at, deliveries[-1].id)
+    return deliveries
+
+@router.get("/deliveries/export")
+def export_deliveries(
+    subscription_id: Optional[int] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    compress: bool = False
+):
+    """
+    Stream deliveries and their attempts as NDJSON, oldest first.
+
+    Each line carries a cursor; pass the last one received as ?cursor= to
+    resume an interrupted export. compress=true returns gzip.
+    """
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
-    return {"message": "Webhook accepted", "delivery_id": delivery.id}
\ No newline at end of file
+    records = iter_delivery_records(
+        subscription_id=subscription_id,
+        created_after=created_after,
+        created_before=created_before,
+        cursor=cursor
+    )
+    if compress:
+        return StreamingResponse(
+            iter_ndjson(records, compress=True),
+            media_type="application/gzip",
+            headers={"Content-Disposition": "attachment; filename=deliveries.ndjson.gz"}
+        )
+    return StreamingResponse(iter_ndjson(records), media_type="application/x-ndjson")
+
+@router.post("/deliveries/{delivery_id}/retry", response_model=WebhookDeliveryDetail, status_code=status.HTTP_202_ACCEPTED)
+def retry_delivery(delivery_id: int, db: Session = Depends(get_db)):
+    """Requeue a FAILED delivery for a fresh set of attempts; returns the delivery as requeued"""
+    delivery = db.query(WebhookDelivery.status).filter(WebhookDelivery.id == delivery_id).first()
+    if not delivery:
+        raise HTTPException(status_code=404, detail="Delivery not found")
+    # Checked again atomically by requeue, in case a concurrent replay got there first
+    if delivery.status != "FAILED" or not replay.requeue(db, [delivery_id], "single"):
+        raise HTTPException(status_code=409, detail="Only failed deliveries can be retried")
+    return get_delivery(delivery_id, db)
+
+@router.post("/replays", response_model=ReplayStatus, status_code=status.HTTP_202_ACCEPTED)
+def start_replay(request: ReplayRequest, db: Session = Depends(get_db)):
+    """
+    Requeue a subscription's FAILED deliveries in the background.
+
+    Matching deliveries are walked oldest first and requeued at
+    rate_per_second, so a recovering endpoint is not flooded. Poll
+    GET /webhooks/replays/{id} for progress; POST /webhooks/replays/{id}/cancel
+    stops it.
+    """
+    rate = request.rate_per_second or settings.REPLAY_RATE_PER_SECOND
+    if rate > settings.REPLAY_MAX_RATE_PER_SECOND:
+        raise HTTPException(
+            status_code=400, detail=f"rate_per_second may not exceed {settings.REPLAY_MAX_RATE_PER_SECOND:g}"
+        )
+    if not db.query(SubscriptionModel.id).filter(SubscriptionModel.id == request.subscription_id).first():
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    return replay.start(
+        db, request.subscription_id, request.event_type, request.created_after, request.created_before, rate
+    )
+
+@router.get("/replays", response_model=List[ReplayStatus])
+def list_replays():
+    """Replays that are still running"""
+    return [job for job in map(replay.get_job, replay.running_jobs()) if job]
+
+@router.get("/replays/{replay_id}", response_model=ReplayStatus)
+def get_replay(replay_id: int):
+    job = replay.get_job(replay_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Replay not found")
+    return job
+
+@router.post("/replays/{replay_id}/cancel", response_model=ReplayStatus)
+def cancel_replay(replay_id: int):
+    """Stop a running replay; deliveries it has already requeued still go out"""
+    job = replay.cancel(replay_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Replay not found")
+    return job
+
+@router.get("/deliveries/{delivery_id}", response_model=WebhookDeliveryDetail)
+def get_delivery(delivery_id: int, db: Session = Depends(get_db)):
+    delivery = db.query(WebhookDelivery).options(selectinload(WebhookDelivery.attempts)).filter(
+        WebhookDelivery.id == delivery_id
+    ).first()
+    if not delivery:
+        raise HTTPException(status_code=404, detail="Delivery not found")
+    return delivery_details(db, [delivery])[0]
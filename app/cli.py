@@ -0,0 +1,97 @@
+"""
+Operational commands for the webhook service.
+
+    python -m app.cli migrate --wait 120
+    python -m app.cli export --subscription-id 42 --since 2024-01-01T00:00:00 --gzip -o deliveries.ndjson.gz
+    python -m app.cli partitions --partitions 12
+"""
+import argparse
+import json
+import sys
+from datetime import datetime
+from app.core.export import iter_delivery_records, iter_ndjson
+
+def export(args):
+    resume = {"cursor": args.cursor}
+    
+    def records():
+        # Track the last cursor written so an interrupted run can be resumed
+        for record in iter_delivery_records(
+            subscription_id=args.subscription_id,
+            created_after=args.since,
+            created_before=args.until,
+            cursor=args.cursor,
+            chunk_size=args.chunk_size
+        ):
+            yield record
+            resume["cursor"] = record["cursor"]
+    
+    out = open(args.output, "wb") if args.output != "-" else sys.stdout.buffer
+    try:
+        for chunk in iter_ndjson(records(), compress=args.gzip):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+        if resume["cursor"]:
+            print(json.dumps({"cursor": resume["cursor"]}), file=sys.stderr)
+
+def migrate(args):
+    from app.core.db_init import migrate_db, wait_for_db
+    
+    if not wait_for_db(args.wait):
+        sys.exit(1)
+    migrate_db()
+
+def partitions(args):
+    from app.config import settings
+    from app.core import ordered_queue
+    from app.database import SessionLocal
+    from app.models.subscription import Subscription
+    
+    current = settings.ORDERED_PARTITIONS
+    target = args.partitions or current
+    db = SessionLocal()
+    try:
+        subscription_ids = [subscription_id for subscription_id, in db.query(Subscription.id).filter(Subscription.ordered == True)]
+    finally:
+        db.close()
+    moving = sum(
+        ordered_queue.partition_for(subscription_id, current) != ordered_queue.partition_for(subscription_id, target)
+        for subscription_id in subscription_ids
+    )
+    print(f"{len(subscription_ids)} ordered subscriptions; {moving} change partition going from {current} to {target} partitions")
+    
+    # A subscription moves only once its current partition has none of its deliveries left
+    print(f"{'partition':>9} {'waiting':>8} {'moving':>7}")
+    for partition, waiting in ordered_queue.backlog().items():
+        moving = sum(ordered_queue.partition_for(subscription_id, target) != partition for subscription_id in waiting)
+        print(f"{partition:>9} {len(waiting):>8} {moving:>7}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    migrate_parser = commands.add_parser("migrate", help="Create or upgrade the database schema")
+    migrate_parser.add_argument("--wait", type=float, default=60, help="seconds to wait for the database")
+    migrate_parser.set_defaults(func=migrate)
+    
+    export_parser = commands.add_parser("export", help="Export deliveries and attempts as NDJSON")
+    export_parser.add_argument("--subscription-id", type=int)
+    export_parser.add_argument("--since", type=datetime.fromisoformat, help="created_at lower bound (inclusive)")
+    export_parser.add_argument("--until", type=datetime.fromisoformat, help="created_at upper bound (exclusive)")
+    export_parser.add_argument("--cursor", help="Resume after this cursor from a previous run")
+    export_parser.add_argument("--chunk-size", type=int, default=1000)
+    export_parser.add_argument("--gzip", action="store_true")
+    export_parser.add_argument("-o", "--output", default="-")
+    export_parser.set_defaults(func=export)
+    
+    partitions_parser = commands.add_parser("partitions", help="Show ordered partition backlog and the effect of a new partition count")
+    partitions_parser.add_argument("--partitions", type=int, help="Partition count to compare with ORDERED_PARTITIONS")
+    partitions_parser.set_defaults(func=partitions)
+    
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
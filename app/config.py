@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings 
 
 class Settings(BaseSettings):
@@ -6,6 +7,17 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = "postgresql://postgres:postgres@db:5432/webhook_service"
+    ASYNC_DATABASE_URL: Optional[str] = None  # derived from DATABASE_URL when unset
+    
+    # Connection pools, per process: the API's sync and async engines and each worker pool process
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # seconds before a connection is replaced; -1 disables
+    DB_POOL_PRE_PING: bool = True
+    DB_WORKER_POOL_SIZE: int = 2  # a prefork worker process runs one task at a time
+    DB_WORKER_MAX_OVERFLOW: int = 2
+    DB_PGBOUNCER: bool = False  # PgBouncer in transaction mode: no in-process pool, no prepared statements
     
     # Redis
     REDIS_HOST: str = "redis"
@@ -15,10 +27,100 @@ class Settings(BaseSettings):
     BROKER_CONNECTION_RETRY: bool = True
     BROKER_CONNECTION_MAX_RETRIES: int = 5
     
+    # In-process subscription cache in front of Redis
+    SUBSCRIPTION_CACHE_SIZE: int = 1024
+    SUBSCRIPTION_CACHE_TTL: float = 30.0  # seconds
+    
     # Webhook settings
     MAX_RETRY_ATTEMPTS: int = 3
     RETRY_INTERVALS: list[int] = [10, 30, 60]  # in seconds
-    WEBHOOK_TIMEOUT: int = 10  # seconds
+    WEBHOOK_TIMEOUT: int = 10  # seconds, read timeout for deliveries
+    EVENTS_SIGNING_SECRET: Optional[str] = None  # signs POST /events; publishing is refused (503) while unset
     LOG_RETENTION_HOURS: int = 72
+    DELIVERY_RETENTION_HOURS: int = 72  # keep at least LOG_RETENTION_HOURS
+    
+    # Time partitioning of webhook_deliveries and delivery_attempts (Postgres only)
+    DB_PARTITIONED: bool = False  # drops the delivery_attempts -> webhook_deliveries foreign key
+    PARTITION_INTERVAL_HOURS: int = 24
+    PARTITIONS_AHEAD: int = 3  # future partitions kept ready
+    
+    # Payload storage: content-addressed, compressed above the threshold
+    PAYLOAD_COMPRESSION: str = "zstd"  # zstd (falls back to gzip if not installed) or gzip
+    PAYLOAD_COMPRESS_THRESHOLD: int = 1024  # bytes
+    PAYLOAD_SWEEP_BATCH: int = 1000  # payloads checked per DELETE when retention removes unreferenced ones
+    JSON_CODEC: str = "orjson"  # orjson (falls back to json if not installed) or json
+    
+    # Retry scheduler: due retries are swept out of a Redis sorted set
+    RETRY_SWEEP_SECONDS: float = 1.0
+    RETRY_RELEASE_BATCH: int = 500  # retries released per sweep round
+    RETRY_SWEEP_MAX_ROUNDS: int = 20  # rounds per sweep task, bounds its run time
+    RETRY_RECOVERY_GRACE_SECONDS: int = 300  # overdue or silent rows rescheduled after this; above the longest broker wait
+    
+    # Replay of FAILED deliveries: bulk jobs requeue onto RETRY_QUEUE at their own rate
+    REPLAY_RATE_PER_SECOND: float = 50  # default for a bulk replay that sets no rate
+    REPLAY_MAX_RATE_PER_SECOND: float = 1000
+    REPLAY_SWEEP_SECONDS: float = 1.0  # how often running replays are advanced
+    REPLAY_RETENTION_HOURS: int = 168  # progress of finished replays is kept this long
+    
+    # Delivery engine: concurrent HTTP sends inside one worker process
+    DELIVERY_CONCURRENCY: int = 100  # in-flight requests per worker process
+    DELIVERY_BATCH_SIZE: int = 50  # deliveries per deliver_messages task or fair-queue turn
+    DELIVERY_SELF_CONTAINED: bool = True  # first attempts carry target and payload hash; workers skip the row reads
+    
+    # Broker queues: first attempts and retries go to separately sized worker pools
+    DELIVERY_QUEUE: str = "deliveries"
+    RETRY_QUEUE: str = "retries"
+    FAIR_SCHEDULING: bool = True  # serve subscriptions in turn, DELIVERY_BATCH_SIZE deliveries per turn
+    FAIR_SWEEP_SECONDS: int = 30  # re-issues drain tasks for work a lost message left behind
+    DELIVERY_MAX_CONNECTIONS: int = 200
+    DELIVERY_MAX_KEEPALIVE: int = 50
+    DELIVERY_KEEPALIVE_EXPIRY: float = 30.0  # seconds
+    DELIVERY_CONNECT_TIMEOUT: float = 5.0  # seconds
+    DELIVERY_HTTP2: bool = False
+    
+    # Ordered delivery: ordered subscriptions hash onto partitions that one consumer at a time drains
+    ORDERED_QUEUE: str = "ordered"
+    ORDERED_PARTITIONS: int = 8  # a subscription moves to its new partition once its old one has drained
+    ORDERED_DRAIN_SECONDS: float = 10  # a drain task hands its partition back after this long
+    ORDERED_SWEEP_SECONDS: float = 1.0  # picks up partitions whose retries have come due
+    
+    # Per-destination limits: in-flight cap and circuit breaker per target host
+    HOST_MAX_IN_FLIGHT: int = 20
+    HOST_LEASE_SECONDS: int = 60  # in-flight slot expiry if a worker dies mid-delivery
+    BREAKER_FAILURE_THRESHOLD: int = 5  # consecutive failures before opening
+    BREAKER_OPEN_SECONDS: int = 30  # time open before half-open probing
+    BREAKER_HALF_OPEN_PROBES: int = 1
+    BREAKER_DEFER_SECONDS: int = 10  # delay before a deferred delivery is tried again
+    
+    # Ingest group commit: batch concurrent inserts into one multi-row commit
+    INGEST_GROUP_COMMIT: bool = False
+    INGEST_FLUSH_MAX_ROWS: int = 200
+    INGEST_FLUSH_MAX_MS: int = 5
+    INGEST_BATCH_MAX_ITEMS: int = 1000  # webhooks per batch request; larger batches get 413
+    
+    # Ingest deduplication: Idempotency-Key header, or a hash of the event when absent
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_DERIVED_TTL_SECONDS: int = 300  # 0 disables payload-hash keys
+    IDEMPOTENCY_WAIT_SECONDS: float = 2.0  # wait on a concurrent request holding the same key
+    IDEMPOTENCY_PENDING_TTL_SECONDS: int = 60  # claim of a request still storing its delivery; outlives the request
+    
+    # Batched delivery defaults for subscriptions that set batch_max_size
+    BATCH_DEFAULT_MAX_BYTES: int = 1048576
+    BATCH_DEFAULT_LINGER_MS: int = 1000
+    BATCH_SWEEP_SECONDS: float = 0.5  # how often lingering batches are checked
+    
+    # Ingest backpressure: answered with 429 and Retry-After
+    RATE_LIMIT_DEFAULT_PER_SECOND: Optional[float] = None  # for subscriptions without their own limit
+    RATE_LIMIT_DEFAULT_BURST: Optional[int] = None  # defaults to one second of the rate
+    INGEST_MAX_QUEUE_DEPTH: int = 10000  # deliveries awaiting a first attempt (broker tasks without FAIR_SCHEDULING); 0 disables
+    QUEUE_DEPTH_CHECK_SECONDS: float = 0.5
+    QUEUE_FULL_RETRY_AFTER: int = 5  # seconds
+    
+    # Startup: migrations run in the background of the API lifespan, or via `python -m app.cli migrate`
+    DB_MIGRATE_ON_STARTUP: bool = True
+    READINESS_TIMEOUT_SECONDS: float = 2.0
+    
+    # Metrics: worker pool processes write samples to PROMETHEUS_MULTIPROC_DIR
+    WORKER_METRICS_PORT: int = 0  # served by the main worker process when set
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,40 @@
+from typing import List
+from fastapi import HTTPException
+from app.core import rate_limit
+from app.core.metrics import INGEST_REJECTED
+
+# Admission checks shared by the ingest and event routers: each turns a
+# rate_limit.LimitExceeded into a 429 with Retry-After
+
+def too_many_requests(error: rate_limit.LimitExceeded) -> HTTPException:
+    INGEST_REJECTED.labels(reason=error.reason).inc()
+    detail = "Delivery queue is full" if error.reason == "queue_full" else "Rate limit exceeded"
+    return HTTPException(status_code=429, detail=detail, headers={"Retry-After": error.retry_after_header})
+
+async def enforce_queue_depth():
+    """429 while the delivery queues are over the global depth limit"""
+    try:
+        await rate_limit.check_queue_depth()
+    except rate_limit.LimitExceeded as e:
+        raise too_many_requests(e)
+
+async def enforce_rate_limit(subscription: dict, cost: int = 1, partial: bool = False) -> int:
+    """Charge cost requests to the subscription's token bucket; returns how many were admitted.
+
+    429 when the bucket cannot cover them, or with partial, any of them.
+    """
+    try:
+        return await rate_limit.take_tokens(subscription, cost, partial)
+    except rate_limit.LimitExceeded as e:
+        raise too_many_requests(e)
+
+async def enforce_rate_limits(subscriptions: List[dict]) -> List[dict]:
+    """Charge one request to each subscription; returns those within their limit.
+
+    429 when every one of them is over it.
+    """
+    waits = await rate_limit.take_tokens_each(subscriptions)
+    admitted = [subscription for subscription, wait in zip(subscriptions, waits) if wait is None]
+    if subscriptions and not admitted:
+        raise too_many_requests(rate_limit.LimitExceeded("rate_limit", min(waits)))
+    return admitted
@@ -0,0 +1,61 @@
+import time
+from typing import Iterable, List
+from app.core.cache import redis_client
+
+# Deliveries waiting to go out in a batched POST, per subscription, oldest first
+BATCH_PENDING_KEY = "batches:pending:{subscription_id}"
+# Subscriptions with a pending batch: member = subscription id, score = flush time (epoch seconds)
+BATCH_DUE_KEY = "batches:due"
+
+_ADD = redis_client.register_script("""
+redis.call('RPUSH', KEYS[1], unpack(ARGV, 3))
+redis.call('ZADD', KEYS[2], 'NX', ARGV[1], ARGV[2])
+return redis.call('LLEN', KEYS[1])
+""")
+
+_TAKE = redis_client.register_script("""
+local ids = redis.call('LPOP', KEYS[1], ARGV[1])
+if redis.call('LLEN', KEYS[1]) > 0 then
+    redis.call('ZADD', KEYS[2], ARGV[2], ARGV[3])
+else
+    redis.call('ZREM', KEYS[2], ARGV[3])
+end
+return ids or {}
+""")
+
+_POP_DUE = redis_client.register_script("""
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+""")
+
+def _pending_key(subscription_id: int) -> str:
+    return BATCH_PENDING_KEY.format(subscription_id=subscription_id)
+
+def add_to_batch(subscription_id: int, delivery_ids: Iterable[int], linger_seconds: float) -> int:
+    """Buffer deliveries for a subscription and return how many are now pending.
+
+    The first delivery into an empty buffer sets the flush time, so no
+    delivery waits much longer than linger_seconds.
+    """
+    ids = [str(delivery_id) for delivery_id in delivery_ids]
+    if not ids:
+        return 0
+    return _ADD(
+        keys=[_pending_key(subscription_id), BATCH_DUE_KEY],
+        args=[time.time() + linger_seconds, subscription_id, *ids]
+    )
+
+def take_batch(subscription_id: int, max_size: int, linger_seconds: float) -> List[int]:
+    """Atomically take up to max_size pending deliveries; any left over get a new flush time"""
+    ids = _TAKE(
+        keys=[_pending_key(subscription_id), BATCH_DUE_KEY],
+        args=[max_size, time.time() + linger_seconds, subscription_id]
+    )
+    return [int(delivery_id) for delivery_id in ids]
+
+def pop_due_batches(limit: int) -> List[int]:
+    """Atomically take up to limit subscriptions whose batch is due"""
+    return [int(subscription_id) for subscription_id in _POP_DUE(keys=[BATCH_DUE_KEY], args=[time.time(), limit])]
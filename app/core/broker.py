@@ -0,0 +1,100 @@
+import asyncio
+import time
+from typing import Dict, List, Tuple
+from app.config import settings
+from app.core import fair_queue, ordered_queue
+from app.core.metrics import INGEST_STAGE_SECONDS
+from app.tasks.webhook_tasks import celery_app, deliver_messages, drain_fair_queue, drain_ordered_partition
+
+def delivery_queue_names():
+    """Broker queues that hold delivery work; the default queue still drains tasks queued before the split"""
+    return list(dict.fromkeys([
+        settings.DELIVERY_QUEUE, settings.RETRY_QUEUE, settings.ORDERED_QUEUE, celery_app.conf.task_default_queue
+    ]))
+
+def publish_messages(messages: List[dict], queue: str):
+    """Queue delivery messages over a single broker connection.
+
+    With FAIR_SCHEDULING the messages wait per subscription in the fair queue
+    and the broker gets one drain task per turn they add. Otherwise they go
+    out directly in deliver_messages tasks of DELIVERY_BATCH_SIZE. kombu has
+    no multi-message publish, so every task shares one producer and connection.
+    """
+    if not messages:
+        return
+    size = settings.DELIVERY_BATCH_SIZE
+    with celery_app.producer_or_acquire() as producer:
+        if settings.FAIR_SCHEDULING:
+            by_subscription: Dict[int, List[dict]] = {}
+            for message in messages:
+                by_subscription.setdefault(message["subscription_id"], []).append(message)
+            fair_queue.push(queue, by_subscription)
+            turns = sum(fair_queue.turns_needed(len(batch), size) for batch in by_subscription.values())
+            for _ in range(turns):
+                drain_fair_queue.apply_async(args=[queue], queue=queue, producer=producer)
+        else:
+            for start in range(0, len(messages), size):
+                deliver_messages.apply_async(args=[messages[start:start + size]], queue=queue, producer=producer)
+
+def enqueue_deliveries(deliveries: List[Tuple[int, int]], queue: str):
+    """Queue deliveries given as (delivery id, subscription id); the worker reads their rows"""
+    publish_messages([
+        {"id": delivery_id, "subscription_id": subscription_id} for delivery_id, subscription_id in deliveries
+    ], queue)
+
+def enqueue_ordered(deliveries: List[Tuple[int, int]]):
+    """Queue deliveries of ordered subscriptions, given as (delivery id, subscription id) in delivery order.
+
+    They wait in their subscriptions' partitions; a drain task is published
+    for each partition nobody is draining yet.
+    """
+    by_subscription: Dict[int, List[int]] = {}
+    for delivery_id, subscription_id in deliveries:
+        by_subscription.setdefault(subscription_id, []).append(delivery_id)
+    if not by_subscription:
+        return
+    partitions = [partition for partition in ordered_queue.push(by_subscription) if not ordered_queue.is_draining(partition)]
+    with celery_app.producer_or_acquire() as producer:
+        for partition in partitions:
+            drain_ordered_partition.apply_async(args=[partition], queue=settings.ORDERED_QUEUE, producer=producer)
+
+def delivery_message(delivery_id: int, payload_hash: str, subscription: dict) -> dict:
+    """Everything a worker needs to make a first attempt without reading the database"""
+    return {
+        "id": delivery_id,
+        "subscription_id": subscription["id"],
+        "version": subscription.get("version"),
+        "target_url": subscription["target_url"],
+        "payload_hash": payload_hash,
+        "batch_max_size": subscription.get("batch_max_size"),
+        "batch_max_bytes": subscription.get("batch_max_bytes"),
+        "batch_linger_ms": subscription.get("batch_linger_ms"),
+        "queued_at": time.time()
+    }
+
+def enqueue_new_deliveries(deliveries: List[Tuple[int, str, dict]]):
+    """Queue freshly stored deliveries on DELIVERY_QUEUE, given as (id, payload hash, subscription).
+
+    With DELIVERY_SELF_CONTAINED the messages carry the send details,
+    otherwise only the ids, which the worker looks up. Deliveries of ordered
+    subscriptions go to their partitions instead.
+    """
+    if any(subscription.get("ordered") for _, _, subscription in deliveries):
+        enqueue_ordered([
+            (delivery_id, subscription["id"]) for delivery_id, _, subscription in deliveries if subscription.get("ordered")
+        ])
+        deliveries = [delivery for delivery in deliveries if not delivery[2].get("ordered")]
+    if settings.DELIVERY_SELF_CONTAINED:
+        messages = [delivery_message(*delivery) for delivery in deliveries]
+    else:
+        messages = [{"id": delivery_id, "subscription_id": subscription["id"]} for delivery_id, _, subscription in deliveries]
+    publish_messages(messages, settings.DELIVERY_QUEUE)
+
+async def enqueue_new_deliveries_async(deliveries: List[Tuple[int, str, dict]]):
+    """Queue freshly stored deliveries without blocking the event loop.
+
+    kombu's Redis transport is socket-blocking, so the publish is handed to a
+    worker thread instead of running on the loop.
+    """
+    with INGEST_STAGE_SECONDS.labels(stage="enqueue").time():
+        await asyncio.to_thread(enqueue_new_deliveries, deliveries)
@@ -1,33 +1,249 @@
-import json
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
 from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 from app.config import settings
+from app.core import codec
+from app.core.metrics import SUBSCRIPTION_CACHE_LOOKUPS, SUBSCRIPTION_CACHE_EVICTIONS, INGEST_STAGE_SECONDS
 from app.models.subscription import Subscription
 
+logger = logging.getLogger(__name__)
+
 redis_client = Redis(
     host=settings.REDIS_HOST,
     port=settings.REDIS_PORT,
     decode_responses=True
 )
 
-def cache_subscription(subscription: Subscription):
-    """Cache subscription details"""
-    key = f"subscription:{subscription.id}"
-    data = {
+# Non-blocking client for the async ingest path
+async_redis_client = AsyncRedis(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    decode_responses=True
+)
+
+# Published with a subscription id whenever a subscription changes
+INVALIDATION_CHANNEL = "subscription:invalidate"
+
+# Current version of each changed subscription, or DELETED, kept without
+# expiry so workers can tell a delivery message's copy is out of date
+VERSION_KEY = "subscription:{subscription_id}:version"
+DELETED = "deleted"
+
+# Only ever moves forward, so concurrent updates cannot stamp an older version
+_STAMP_VERSION = redis_client.register_script("""
+local current = redis.call('GET', KEYS[1])
+if current == ARGV[2] or (current and tonumber(current) >= tonumber(ARGV[1])) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1])
+return 1
+""")
+
+class LocalSubscriptionCache:
+    """Bounded in-process LRU with a per-entry TTL, sitting in front of Redis"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+
+    def get(self, subscription_id: int) -> Optional[dict]:
+        entry = self._entries.get(subscription_id)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at < time.monotonic():
+            del self._entries[subscription_id]
+            SUBSCRIPTION_CACHE_EVICTIONS.labels(reason="expired").inc()
+            return None
+        self._entries.move_to_end(subscription_id)
+        return data
+
+    def put(self, subscription_id: int, data: dict):
+        self._entries[subscription_id] = (time.monotonic() + self.ttl, data)
+        self._entries.move_to_end(subscription_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            SUBSCRIPTION_CACHE_EVICTIONS.labels(reason="size").inc()
+
+    def invalidate(self, subscription_id: int):
+        if self._entries.pop(subscription_id, None) is not None:
+            SUBSCRIPTION_CACHE_EVICTIONS.labels(reason="invalidated").inc()
+
+    def clear(self):
+        self._entries.clear()
+
+local_cache = LocalSubscriptionCache(settings.SUBSCRIPTION_CACHE_SIZE, settings.SUBSCRIPTION_CACHE_TTL)
+
+# Lookups currently falling through to Redis/DB, shared by concurrent misses
+_inflight: Dict[int, asyncio.Task] = {}
+
+def _subscription_key(subscription_id: int) -> str:
+    return f"subscription:{subscription_id}"
+
+def _subscription_data(subscription: Subscription) -> dict:
+    return {
         "id": subscription.id,
         "target_url": str(subscription.target_url),
         "event_types": subscription.event_types,
         "is_active": subscription.is_active,
-        "secret_key": subscription.secret_key
+        "secret_key": subscription.secret_key,
+        "rate_limit_per_second": subscription.rate_limit_per_second,
+        "rate_limit_burst": subscription.rate_limit_burst,
+        "batch_max_size": subscription.batch_max_size,
+        "batch_max_bytes": subscription.batch_max_bytes,
+        "batch_linger_ms": subscription.batch_linger_ms,
+        "ordered": subscription.ordered,
+        "version": subscription.version
     }
-    redis_client.setex(key, 3600, json.dumps(data))  # Cache for 1 hour
+
+def cache_subscription(subscription: Subscription):
+    """Cache subscription details"""
+    key = _subscription_key(subscription.id)
+    data = _subscription_data(subscription)
+    redis_client.setex(key, 3600, codec.dumps(data))  # Cache for 1 hour
+    local_cache.put(subscription.id, data)
 
 def get_cached_subscription(subscription_id: int) -> dict:
     """Get subscription details from cache"""
-    key = f"subscription:{subscription_id}"
-    data = redis_client.get(key)
-    return json.loads(data) if data else None
+    data = redis_client.get(_subscription_key(subscription_id))
+    return codec.loads(data) if data else None
+
+def stamp_subscription_version(subscription_id: int, version: int):
+    """Record the subscription's current version for workers holding older copies"""
+    _STAMP_VERSION(keys=[VERSION_KEY.format(subscription_id=subscription_id)], args=[version, DELETED])
+
+def stamp_subscription_deleted(subscription_id: int):
+    redis_client.set(VERSION_KEY.format(subscription_id=subscription_id), DELETED)
+
+def subscription_versions(subscription_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+    """Current version stamps in one round-trip; None for subscriptions never stamped"""
+    subscription_ids = list(subscription_ids)
+    if not subscription_ids:
+        return {}
+    stamps = redis_client.mget([VERSION_KEY.format(subscription_id=subscription_id) for subscription_id in subscription_ids])
+    return dict(zip(subscription_ids, stamps))
 
 def invalidate_subscription_cache(subscription_id: int):
-    """Remove subscription from cache"""
-    key = f"subscription:{subscription_id}"
-    redis_client.delete(key) 
\ No newline at end of file
+    """Remove subscription from cache on every replica"""
+    redis_client.delete(_subscription_key(subscription_id))
+    local_cache.invalidate(subscription_id)
+    redis_client.publish(INVALIDATION_CHANNEL, subscription_id)
+
+async def cache_subscription_async(subscription: Subscription):
+    """Cache subscription details without blocking the event loop"""
+    key = _subscription_key(subscription.id)
+    data = _subscription_data(subscription)
+    await async_redis_client.setex(key, 3600, codec.dumps(data))
+    local_cache.put(subscription.id, data)
+
+async def cache_subscriptions_async(subscriptions: Iterable[Subscription]) -> List[dict]:
+    """Cache several subscriptions in one round-trip; returns their details"""
+    records = [_subscription_data(subscription) for subscription in subscriptions]
+    if records:
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            for data in records:
+                pipe.setex(_subscription_key(data["id"]), 3600, codec.dumps(data))
+            await pipe.execute()
+    for data in records:
+        local_cache.put(data["id"], data)
+    return records
+
+async def get_cached_subscription_async(subscription_id: int) -> dict:
+    """Get subscription details from cache without blocking the event loop"""
+    data = await async_redis_client.get(_subscription_key(subscription_id))
+    return codec.loads(data) if data else None
+
+async def get_subscription_async(
+    subscription_id: int,
+    load_from_db: Callable[[int], Awaitable[Optional[dict]]]
+) -> Optional[dict]:
+    """Two-tier lookup: local LRU, then Redis, then load_from_db.
+
+    Concurrent misses for the same id wait on a single lookup instead of
+    each going to Redis and the database.
+    """
+    started = time.perf_counter()
+    data = local_cache.get(subscription_id)
+    if data is not None:
+        SUBSCRIPTION_CACHE_LOOKUPS.labels(tier="local", result="hit").inc()
+        INGEST_STAGE_SECONDS.labels(stage="cache_lookup").observe(time.perf_counter() - started)
+        return data
+    SUBSCRIPTION_CACHE_LOOKUPS.labels(tier="local", result="miss").inc()
+
+    task = _inflight.get(subscription_id)
+    if task is None:
+        task = asyncio.ensure_future(_load_subscription(subscription_id, load_from_db))
+        _inflight[subscription_id] = task
+        task.add_done_callback(lambda _: _inflight.pop(subscription_id, None))
+    # Shielded so one caller disconnecting does not cancel the lookup for the others
+    return await asyncio.shield(task)
+
+async def get_subscriptions_async(
+    subscription_ids: List[int],
+    load_many_from_db: Callable[[List[int]], Awaitable[Dict[int, dict]]]
+) -> List[dict]:
+    """Batch form of get_subscription_async for fan-out, in subscription_ids order.
+
+    Misses on the local LRU are read with one Redis MGET, and whatever Redis
+    does not have comes from a single load_many_from_db call. Ids that do not
+    resolve (deleted or inactive) are left out.
+    """
+    started = time.perf_counter()
+    found: Dict[int, dict] = {}
+    for subscription_id in subscription_ids:
+        data = local_cache.get(subscription_id)
+        if data is not None:
+            found[subscription_id] = data
+    SUBSCRIPTION_CACHE_LOOKUPS.labels(tier="local", result="hit").inc(len(found))
+    
+    missing = [subscription_id for subscription_id in subscription_ids if subscription_id not in found]
+    if missing:
+        SUBSCRIPTION_CACHE_LOOKUPS.labels(tier="local", result="miss").inc(len(missing))
+        cached = await async_redis_client.mget([_subscription_key(subscription_id) for subscription_id in missing])
+        for subscription_id, raw in zip(missing, cached):
+            if raw:
+                found[subscription_id] = data = codec.loads(raw)
+                local_cache.put(subscription_id, data)
+        missing = [subscription_id for subscription_id in missing if subscription_id not in found]
+        SUBSCRIPTION_CACHE_LOOKUPS.labels(tier="redis", result="hit").inc(len(cached) - len(missing))
+    INGEST_STAGE_SECONDS.labels(stage="cache_lookup").observe(time.perf_counter() - started)
+    
+    if missing:
+        SUBSCRIPTION_CACHE_LOOKUPS.labels(tier="redis", result="miss").inc(len(missing))
+        found.update(await load_many_from_db(missing))
+    return [found[subscription_id] for subscription_id in subscription_ids if subscription_id in found]
+
+async def _load_subscription(subscription_id: int, load_from_db) -> Optional[dict]:
+    started = time.perf_counter()
+    data = await get_cached_subscription_async(subscription_id)
+    INGEST_STAGE_SECONDS.labels(stage="cache_lookup").observe(time.perf_counter() - started)
+    SUBSCRIPTION_CACHE_LOOKUPS.labels(tier="redis", result="hit" if data else "miss").inc()
+    if data is None:
+        data = await load_from_db(subscription_id)
+    if data is not None:
+        local_cache.put(subscription_id, data)
+    return data
+
+async def listen_for_invalidations():
+    """Drop local entries when any replica changes a subscription"""
+    while True:
+        pubsub = async_redis_client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Anything cached before (re)subscribing may have missed a message
+            local_cache.clear()
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    local_cache.invalidate(int(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Subscription invalidation listener failed, reconnecting: {str(e)}")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.close()
@@ -0,0 +1,149 @@
+import time
+import uuid
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+from app.config import settings
+from app.core.cache import redis_client
+
+# Per target host state, shared by every worker through Redis:
+#   destination:{host}         hash: state, failures, opened_at, changed_at, transitions, deferred
+#   destination:{host}:leases  sorted set of in-flight delivery leases scored by expiry
+#   destination:{host}:probes  the half-open probe leases among them, scored the same way
+#   destinations               set of every host seen
+#
+# A probe slot is given back when its lease is released without an outcome or
+# expires, so a worker dying mid-probe cannot leave the host half-open for good.
+BREAKER_HOSTS_KEY = "destinations"
+
+_ACQUIRE = redis_client.register_script("""
+local now = tonumber(ARGV[1])
+local max_in_flight = tonumber(ARGV[2])
+local open_seconds = tonumber(ARGV[3])
+local half_open_probes = tonumber(ARGV[4])
+local lease_expiry = tonumber(ARGV[5])
+
+redis.call('SADD', KEYS[4], ARGV[7])
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if state == 'open' then
+    local opened_at = tonumber(redis.call('HGET', KEYS[1], 'opened_at') or 0)
+    if now - opened_at < open_seconds then
+        redis.call('HINCRBY', KEYS[1], 'deferred', 1)
+        return {0, state}
+    end
+    state = 'half_open'
+    redis.call('HSET', KEYS[1], 'state', state, 'changed_at', now)
+    redis.call('DEL', KEYS[3])
+    redis.call('HINCRBY', KEYS[1], 'transitions', 1)
+end
+
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+if redis.call('ZCARD', KEYS[2]) >= max_in_flight then
+    redis.call('HINCRBY', KEYS[1], 'deferred', 1)
+    return {0, 'busy'}
+end
+
+if state == 'half_open' then
+    redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+    if redis.call('ZCARD', KEYS[3]) >= half_open_probes then
+        redis.call('HINCRBY', KEYS[1], 'deferred', 1)
+        return {0, state}
+    end
+    redis.call('ZADD', KEYS[3], lease_expiry, ARGV[6])
+end
+
+redis.call('ZADD', KEYS[2], lease_expiry, ARGV[6])
+return {1, state}
+""")
+
+_RELEASE = redis_client.register_script("""
+local now = tonumber(ARGV[1])
+local outcome = ARGV[2]
+local threshold = tonumber(ARGV[3])
+
+redis.call('ZREM', KEYS[2], ARGV[4])
+redis.call('ZREM', KEYS[3], ARGV[4])
+if outcome == 'none' then
+    return
+end
+
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if outcome == 'success' then
+    redis.call('HSET', KEYS[1], 'failures', 0)
+    if state ~= 'closed' then
+        redis.call('HSET', KEYS[1], 'state', 'closed', 'changed_at', now)
+        redis.call('HINCRBY', KEYS[1], 'transitions', 1)
+        redis.call('DEL', KEYS[3])
+    end
+    return
+end
+
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+if state == 'half_open' or (state == 'closed' and failures >= threshold) then
+    redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', now, 'changed_at', now)
+    redis.call('HINCRBY', KEYS[1], 'transitions', 1)
+    redis.call('DEL', KEYS[3])
+end
+""")
+
+def destination_host(url: str) -> str:
+    """Key deliveries by scheme-less host[:port]"""
+    return urlsplit(url).netloc.lower()
+
+def _keys(host: str):
+    return [f"destination:{host}", f"destination:{host}:leases", f"destination:{host}:probes", BREAKER_HOSTS_KEY]
+
+def acquire(host: str) -> Tuple[Optional[str], str]:
+    """Try to take an in-flight slot for host.
+
+    Returns (lease, state). lease is None when the breaker is open, the
+    half-open probe budget is used up, or the host is at HOST_MAX_IN_FLIGHT;
+    the caller should defer the delivery without making a network call.
+    """
+    now = time.time()
+    lease = uuid.uuid4().hex
+    allowed, state = _ACQUIRE(
+        keys=_keys(host),
+        args=[
+            now,
+            settings.HOST_MAX_IN_FLIGHT,
+            settings.BREAKER_OPEN_SECONDS,
+            settings.BREAKER_HALF_OPEN_PROBES,
+            now + settings.HOST_LEASE_SECONDS,
+            lease,
+            host
+        ]
+    )
+    return (lease if allowed else None), state
+
+def release(host: str, lease: str, success: Optional[bool]):
+    """Return the slot and feed the outcome to the breaker.
+
+    success=None frees the slot, and a half-open probe slot with it, without
+    counting towards the breaker, for deliveries that never reached the network.
+    """
+    outcome = "none" if success is None else ("success" if success else "failure")
+    _RELEASE(
+        keys=_keys(host)[:3],
+        args=[time.time(), outcome, settings.BREAKER_FAILURE_THRESHOLD, lease]
+    )
+
+def get_destination_state(host: str) -> dict:
+    """Breaker state, in-flight count and deferred count for one host"""
+    now = time.time()
+    pipe = redis_client.pipeline()
+    pipe.hgetall(f"destination:{host}")
+    pipe.zcount(f"destination:{host}:leases", now, "+inf")
+    data, in_flight = pipe.execute()
+    return {
+        "host": host,
+        "state": data.get("state", "closed"),
+        "consecutive_failures": int(data.get("failures", 0)),
+        "in_flight": in_flight,
+        "deferred": int(data.get("deferred", 0)),
+        "transitions": int(data.get("transitions", 0)),
+        "opened_at": float(data["opened_at"]) if "opened_at" in data else None,
+        "changed_at": float(data["changed_at"]) if "changed_at" in data else None
+    }
+
+def list_destinations() -> list:
+    return [get_destination_state(host) for host in sorted(redis_client.smembers(BREAKER_HOSTS_KEY))]
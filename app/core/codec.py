@@ -0,0 +1,82 @@
+import json
+import re
+from typing import Any, Optional, Tuple, Union
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:  # stdlib json is always available
+    orjson = None
+
+# Payloads, cache entries and queue messages all go through here. Both
+# backends write compact UTF-8 with non-ASCII characters left unescaped; they
+# differ only in float exponents (1e16 vs 1e+16) and orjson writing NaN as null.
+_orjson = orjson if settings.JSON_CODEC == "orjson" else None
+
+def dumps(value: Any) -> bytes:
+    """Compact JSON bytes; the form a payload is signed, stored and sent in"""
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(value)
+        except TypeError:  # integers past 64 bits, which only stdlib can write
+            pass
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def dumps_str(value: Any) -> str:
+    """dumps as text, for APIs that want str (SQLAlchemy's JSON columns)"""
+    return dumps(value).decode("utf-8")
+
+def loads(data: Union[bytes, str]) -> Any:
+    if _orjson is not None:
+        return _orjson.loads(data)
+    return json.loads(data)
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
+
+def loads_with_raw(data: bytes, key: str) -> Tuple[dict, Optional[bytes]]:
+    """Parse a JSON object and return its key member exactly as it appears in data.
+
+    Each member is parsed once, and the raw member lets a value be stored and
+    sent in the sender's own bytes instead of being encoded again. Raises
+    ValueError unless data is a single JSON object.
+    """
+    text = data.decode("utf-8")
+    skip = _whitespace.match
+    members = {}
+    raw = None
+    try:
+        position = skip(text).end()
+        if text[position] != "{":
+            raise ValueError("Expected a JSON object")
+        position = skip(text, position + 1).end()
+        if text[position] == "}":
+            position += 1
+        else:
+            while True:
+                name, position = _decoder.raw_decode(text, position)
+                if not isinstance(name, str):
+                    raise ValueError("Expected a member name")
+                position = skip(text, position).end()
+                if text[position] != ":":
+                    raise ValueError("Expected ':' after a member name")
+                start = skip(text, position + 1).end()
+                members[name], position = _decoder.raw_decode(text, start)
+                if name == key:
+                    raw = text[start:position]
+                position = skip(text, position).end()
+                if text[position] == "}":
+                    position += 1
+                    break
+                if text[position] != ",":
+                    raise ValueError("Expected ',' or '}' after a member")
+                position = skip(text, position + 1).end()
+    except IndexError:
+        raise ValueError("Unexpected end of JSON") from None
+    if skip(text, position).end() != len(text):
+        raise ValueError("Extra data after the JSON object")
+    return members, raw.encode("utf-8") if raw is not None else None
+
+def dumps_legacy(value: Any) -> bytes:
+    """The stdlib form used before this module, with non-ASCII escaped as \\uXXXX"""
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
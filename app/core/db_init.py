@@ -1,58 +1,98 @@
 from app.database import Base, engine
 from app.models.subscription import Subscription
-from app.models.webhook import WebhookDelivery, DeliveryAttempt
+from app.models.webhook import WebhookPayload, WebhookDelivery, DeliveryAttempt
+from app.config import settings
+from app.core.partitions import PARTITIONED_TABLES, create_partitioned_tables, ensure_partitions, is_partitioned
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from typing import Optional
+import os
 import time
 from sqlalchemy import inspect, text
 import logging
-from sqlalchemy.exc import OperationalError, ProgrammingError
 
 logger = logging.getLogger(__name__)
 
-def wait_for_db():
-    max_retries = 60  # Increase max retries
-    retry_interval = 3  # Longer interval between retries
-    
-    for i in range(max_retries):
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "alembic.ini")
+# Revision matching the tables init_db created before migrations existed
+BASELINE_REVISION = "0001"
+# pg_advisory_xact_lock key, so replicas starting together migrate one at a time
+MIGRATION_LOCK_ID = 7215030
+
+def alembic_config(connection=None) -> Config:
+    config = Config(ALEMBIC_INI)
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+def head_revision() -> str:
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+def wait_for_db(timeout: float, interval: float = 3) -> bool:
+    """Poll the database until it answers or timeout seconds have passed"""
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while True:
+        attempt += 1
         try:
-            # Try a simple connection test
             with engine.connect() as conn:
-                result = conn.execute(text("SELECT 1"))
-                row = result.fetchone()
-                if row and row[0] == 1:
-                    logger.info("Database connection successful")
-                    return True
-        except (OperationalError, ProgrammingError) as e:
-            # These are the common exceptions when DB is not ready
-            logger.info(f"Waiting for database... attempt {i+1}/{max_retries}: {str(e)}")
-            time.sleep(retry_interval)
+                conn.execute(text("SELECT 1"))
+            logger.info("Database connection successful")
+            return True
         except Exception as e:
-            # Log other unexpected errors
-            logger.warning(f"Unexpected error connecting to database: {str(e)}")
-            time.sleep(retry_interval)
-    
-    logger.error("Failed to connect to database after maximum retries")
-    return False
+            if time.monotonic() + interval > deadline:
+                logger.error(f"Database not available after {attempt} attempts: {str(e)}")
+                return False
+            logger.info(f"Waiting for database... attempt {attempt}: {str(e)}")
+            time.sleep(interval)
 
-def init_db():
-    if not wait_for_db():
-        logger.error("Database not available after maximum retries")
-        return False
+def create_schema(conn, partitioned: bool):
+    """Create every table from the models, the delivery tables partitioned if asked.
+
+    The partitioned layout has no delivery_attempts -> webhook_deliveries
+    foreign key; see partitions._partitioned_ddl.
+    """
+    tables = [Subscription.__table__, WebhookPayload.__table__, WebhookDelivery.__table__, DeliveryAttempt.__table__]
+    if partitioned:
+        tables = [table for table in tables if table.name not in PARTITIONED_TABLES]
+    Base.metadata.create_all(bind=conn, tables=tables)
+    if partitioned:
+        create_partitioned_tables(conn)
+        logger.info("Created partitioned delivery tables")
+
+def migrate_db(partitioned: Optional[bool] = None):
+    """Bring the schema up to the latest migration; raises if that fails.
+
+    A fresh database is created straight from the models and stamped at
+    head. One created by init_db before migrations existed is stamped at the
+    baseline and upgraded. Anything else is upgraded with Alembic.
+    """
+    if partitioned is None:
+        partitioned = settings.DB_PARTITIONED
+    if partitioned and engine.dialect.name != "postgresql":
+        logger.warning("Partitioned layout needs PostgreSQL, creating plain tables")
+        partitioned = False
+    
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_ID})
+        config = alembic_config(conn)
+        existing_tables = inspect(conn).get_table_names()
         
-    try:
-        inspector = inspect(engine)
-        existing_tables = inspector.get_table_names()
+        if "alembic_version" not in existing_tables:
+            if "subscriptions" not in existing_tables:
+                create_schema(conn, partitioned)
+                command.stamp(config, "head")
+                logger.info("Created database schema")
+                return
+            logger.info("Adopting a database created before migrations")
+            command.stamp(config, BASELINE_REVISION)
         
-        tables_to_create = []
-        for table in [Subscription.__table__, WebhookDelivery.__table__, DeliveryAttempt.__table__]:
-            if table.name not in existing_tables:
-                tables_to_create.append(table)
+        command.upgrade(config, "head")
         
-        if tables_to_create:
-            Base.metadata.create_all(bind=engine, tables=tables_to_create)
-            logger.info("Successfully created missing database tables")
-        else:
-            logger.info("All tables already exist")
-        return True
-    except Exception as e:
-        logger.error(f"Error initializing database: {str(e)}")
-        return False
\ No newline at end of file
+        if partitioned:
+            if is_partitioned(conn, "webhook_deliveries"):
+                ensure_partitions(conn)
+            else:
+                logger.warning("Delivery tables exist unpartitioned; migrate them before enabling DB_PARTITIONED")
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import httpx
+from app.config import settings
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+@dataclass
+class DeliveryResult:
+    status_code: Optional[int] = None
+    response_body: Optional[str] = None
+    error: Optional[str] = None
+    first_byte_seconds: Optional[float] = None  # until response headers arrived
+    duration_seconds: Optional[float] = None  # whole request, including reading the body
+
+    @property
+    def succeeded(self) -> bool:
+        return self.status_code is not None and self.status_code < 400
+
+class DeliveryEngine:
+    """Concurrent webhook sender for a single worker process.
+
+    Owns an asyncio loop on a background thread and one httpx.AsyncClient
+    whose connection pool keeps keep-alive connections per target host. Celery
+    tasks hand it a list of requests and block until all of them finish, so
+    one process can have up to DELIVERY_CONCURRENCY deliveries in flight.
+    Redirects are followed, as requests did, and judged by the final response.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # The loop thread does not survive a fork, so each worker child starts its own
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="delivery-engine", daemon=True)
+            thread.start()
+            self._loop = loop
+            self._client, self._semaphore = asyncio.run_coroutine_threadsafe(self._create_client(), loop).result()
+            self._pid = os.getpid()
+
+    async def _create_client(self):
+        client = httpx.AsyncClient(
+            http2=settings.DELIVERY_HTTP2,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=settings.DELIVERY_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.DELIVERY_MAX_KEEPALIVE,
+                keepalive_expiry=settings.DELIVERY_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                settings.WEBHOOK_TIMEOUT,
+                connect=settings.DELIVERY_CONNECT_TIMEOUT
+            )
+        )
+        return client, asyncio.Semaphore(settings.DELIVERY_CONCURRENCY)
+
+    async def send(self, url: str, body: bytes) -> DeliveryResult:
+        """POST one pre-encoded JSON body and capture the outcome"""
+        async with self._semaphore:
+            started = time.perf_counter()
+            first_byte = None
+            try:
+                async with self._client.stream("POST", url, content=body, headers=JSON_HEADERS) as response:
+                    first_byte = time.perf_counter() - started
+                    await response.aread()
+                response_body = response.text if response.status_code >= 400 else None
+            except Exception as e:
+                # Not just httpx.HTTPError: e.g. InvalidURL for one bad target must fail
+                # that delivery alone, not the whole batch it was sent with
+                return DeliveryResult(
+                    error=str(e) or type(e).__name__,
+                    first_byte_seconds=first_byte,
+                    duration_seconds=time.perf_counter() - started
+                )
+        return DeliveryResult(
+            status_code=response.status_code,
+            response_body=response_body,
+            first_byte_seconds=first_byte,
+            duration_seconds=time.perf_counter() - started
+        )
+
+    async def _send_all(self, requests: List[Tuple[str, bytes]]) -> List[DeliveryResult]:
+        return await asyncio.gather(*(self.send(url, body) for url, body in requests))
+
+    def send_many(self, requests: List[Tuple[str, bytes]]) -> List[DeliveryResult]:
+        """Send (url, body) pairs concurrently, results in request order"""
+        if not requests:
+            return []
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(self._send_all(requests), self._loop).result()
+
+    def close(self):
+        if self._pid == os.getpid():
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._pid = None
+
+delivery_engine = DeliveryEngine()
@@ -0,0 +1,65 @@
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from app.models.webhook import WebhookDelivery
+from app.schemas.webhook import WebhookDeliveryDetail
+from app.core.payload_store import delivery_payload, load_payloads
+
+def encode_cursor(created_at: datetime, delivery_id: int) -> str:
+    """Opaque keyset cursor for the position just after a delivery"""
+    raw = f"{created_at.isoformat()}|{delivery_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, delivery_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(delivery_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+def filter_deliveries(
+    query,
+    subscription_id: Optional[int] = None,
+    status: Optional[str] = None,
+    event_type: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None
+):
+    """Apply the common delivery filters to a query"""
+    if subscription_id is not None:
+        query = query.filter(WebhookDelivery.subscription_id == subscription_id)
+    if status is not None:
+        query = query.filter(WebhookDelivery.status == status)
+    if event_type is not None:
+        query = query.filter(WebhookDelivery.event_type == event_type)
+    if created_after is not None:
+        query = query.filter(WebhookDelivery.created_at >= created_after)
+    if created_before is not None:
+        query = query.filter(WebhookDelivery.created_at < created_before)
+    return query
+
+def page_newest_first(query, cursor: Optional[str]):
+    """Order newest first and seek past the cursor on the (created_at, id) indexes"""
+    if cursor:
+        created_at, delivery_id = decode_cursor(cursor)
+        query = query.filter(tuple_(WebhookDelivery.created_at, WebhookDelivery.id) < tuple_(created_at, delivery_id))
+    return query.order_by(WebhookDelivery.created_at.desc(), WebhookDelivery.id.desc())
+
+def page_oldest_first(query, cursor: Optional[str]):
+    """Order oldest first and seek past the cursor; used by exports so a cursor resumes forward"""
+    if cursor:
+        created_at, delivery_id = decode_cursor(cursor)
+        query = query.filter(tuple_(WebhookDelivery.created_at, WebhookDelivery.id) > tuple_(created_at, delivery_id))
+    return query.order_by(WebhookDelivery.created_at.asc(), WebhookDelivery.id.asc())
+
+def delivery_details(db: Session, deliveries: List[WebhookDelivery]) -> List[WebhookDeliveryDetail]:
+    """Delivery responses with their payloads, each stored payload fetched once"""
+    payloads = load_payloads(db, (delivery.payload_hash for delivery in deliveries if delivery.payload_hash))
+    return [
+        WebhookDeliveryDetail.model_validate(delivery).model_copy(update={"payload": delivery_payload(delivery, payloads)})
+        for delivery in deliveries
+    ]
@@ -0,0 +1,54 @@
+from typing import Dict, List, Tuple
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import async_engine
+from app.models.webhook import WebhookDelivery
+from app.core.payload_store import encode_json, payload_row, insert_payloads_statement
+from app.core.metrics import INGEST_STAGE_SECONDS
+
+async def insert_deliveries(rows: List[dict], db: AsyncSession) -> List[Tuple[int, str]]:
+    """Store delivery rows and commit, returning (id, payload hash) in row order.
+
+    Each row's "payload", a JSON value or its encode_json bytes, is moved
+    into webhook_payloads, stored once per distinct content, and the delivery
+    keeps only its hash. Payloads and deliveries each go in with a single
+    multi-row statement.
+    
+    A payload that was already stored is skipped by the payload INSERT, and
+    delete_orphaned_payloads may remove it before the delivery INSERT refers
+    to it. That fails the foreign key check; the whole write is then retried
+    once, which stores the payload again.
+    """
+    payload_rows = []
+    delivery_rows = []
+    # Fan-out rows share one payload; hash and compress it once
+    by_body: Dict[bytes, dict] = {}
+    for row in rows:
+        row = dict(row)
+        body = row.pop("payload")
+        if not isinstance(body, bytes):
+            body = encode_json(body)
+        payload = by_body.get(body)
+        if payload is None:
+            payload = by_body[body] = payload_row(body)
+            payload_rows.append(payload)
+        row["payload_hash"] = payload["hash"]
+        delivery_rows.append(row)
+    
+    with INGEST_STAGE_SECONDS.labels(stage="insert_commit").time():
+        for retry in (True, False):
+            try:
+                await db.execute(insert_payloads_statement(async_engine.dialect.name, payload_rows))
+                inserted = await db.execute(
+                    insert(WebhookDelivery).returning(WebhookDelivery.id, sort_by_parameter_order=True),
+                    delivery_rows
+                )
+                delivery_ids = list(inserted.scalars().all())
+                await db.commit()
+                break
+            except IntegrityError:
+                await db.rollback()
+                if not retry:
+                    raise
+    return [(delivery_id, row["payload_hash"]) for delivery_id, row in zip(delivery_ids, delivery_rows)]
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from typing import Dict, List
+from uuid import uuid4
+from app.core.cache import redis_client, async_redis_client
+from app.models.subscription import Subscription
+
+logger = logging.getLogger(__name__)
+
+# Inverted index from event type to active subscription ids:
+#   event_index:type:{event_type}   subscriptions filtering on that type
+#   event_index:all                 subscriptions with no filter, which get every event
+#   event_index:subscription:{id}   index keys the subscription is in, for removal
+#   event_index:ready               set once the index has been built from the table
+#   event_index:generation          bumped by every move, so a rebuild can tell it raced one
+#   event_index:rebuild_lock        held by the one caller rebuilding a missing index
+ALL_EVENTS_KEY = "event_index:all"
+READY_KEY = "event_index:ready"
+GENERATION_KEY = "event_index:generation"
+REBUILD_LOCK_KEY = "event_index:rebuild_lock"
+KEY_PATTERN = "event_index:*"
+REBUILD_LOCK_SECONDS = 60
+
+_RELEASE_LOCK = async_redis_client.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+class IndexUnavailable(Exception):
+    """The index is missing and no rebuild finished in time"""
+
+def _type_key(event_type: str) -> str:
+    return f"event_index:type:{event_type}"
+
+def _membership_key(subscription_id: int) -> str:
+    return f"event_index:subscription:{subscription_id}"
+
+def _index_keys(subscription: Subscription) -> List[str]:
+    if not subscription.is_active:
+        return []
+    if not subscription.event_types:
+        return [ALL_EVENTS_KEY]
+    return [_type_key(event_type) for event_type in subscription.event_types]
+
+def _move(subscription_id: int, new_keys: List[str]):
+    """Put a subscription in exactly new_keys, in one MULTI.
+
+    The membership key is WATCHed between reading it and the MULTI, so two
+    concurrent moves of the same subscription cannot interleave.
+    """
+    membership_key = _membership_key(subscription_id)
+    
+    def move(pipe):
+        old_keys = pipe.smembers(membership_key)
+        pipe.multi()
+        for key in old_keys.difference(new_keys):
+            pipe.srem(key, subscription_id)
+        for key in new_keys:
+            pipe.sadd(key, subscription_id)
+        pipe.delete(membership_key)
+        if new_keys:
+            pipe.sadd(membership_key, *new_keys)
+        pipe.incr(GENERATION_KEY)
+    
+    redis_client.transaction(move, membership_key)
+
+def index_subscription(subscription: Subscription):
+    """Move a subscription to the index keys matching its current event types"""
+    _move(subscription.id, _index_keys(subscription))
+
+def remove_subscription(subscription_id: int):
+    """Drop a subscription from every index key it is in"""
+    _move(subscription_id, [])
+
+def _snapshot() -> Dict[str, List[int]]:
+    """Members of every index key, read from the subscriptions table"""
+    from app.database import SessionLocal
+    
+    db = SessionLocal()
+    try:
+        members: Dict[str, List[int]] = {}
+        for subscription in db.query(Subscription).yield_per(1000):
+            keys = _index_keys(subscription)
+            for key in keys:
+                members.setdefault(key, []).append(subscription.id)
+            if keys:
+                members[_membership_key(subscription.id)] = keys
+        return members
+    finally:
+        db.close()
+
+def rebuild_event_index():
+    """Rebuild the whole index from the subscriptions table.
+
+    The old keys are replaced and the ready marker set in a single MULTI, so
+    readers see either the previous index or the complete new one. The
+    generation key is WATCHed from before the table is read, so a move
+    landing between the read and the MULTI aborts it and the rebuild starts
+    over from a fresh read instead of overwriting the move.
+    """
+    def rebuild(pipe):
+        members = _snapshot()
+        stale = [
+            key for key in pipe.scan_iter(match=KEY_PATTERN, count=1000)
+            if key not in (GENERATION_KEY, REBUILD_LOCK_KEY)
+        ]
+        pipe.multi()
+        if stale:
+            pipe.delete(*stale)
+        for key, values in members.items():
+            pipe.sadd(key, *values)
+        pipe.set(READY_KEY, 1)
+    
+    redis_client.transaction(rebuild, GENERATION_KEY)
+    logger.info("Event type index rebuilt")
+
+async def _ensure_index():
+    """Rebuild a missing index once across all API processes.
+
+    The caller that takes the rebuild lock rebuilds; the others wait for the
+    ready marker, up to REBUILD_LOCK_SECONDS, after which the lock has
+    expired and one of them takes over.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + 2 * REBUILD_LOCK_SECONDS
+    token = uuid4().hex
+    while not await async_redis_client.exists(READY_KEY):
+        if await async_redis_client.set(REBUILD_LOCK_KEY, token, nx=True, ex=REBUILD_LOCK_SECONDS):
+            try:
+                if not await async_redis_client.exists(READY_KEY):
+                    await asyncio.to_thread(rebuild_event_index)
+            finally:
+                await _RELEASE_LOCK(keys=[REBUILD_LOCK_KEY], args=[token])
+            return
+        if loop.time() >= deadline:
+            raise IndexUnavailable()
+        await asyncio.sleep(0.05)
+
+async def subscribers_for_event(event_type: str) -> List[int]:
+    """Active subscription ids that should receive event_type"""
+    if not await async_redis_client.exists(READY_KEY):
+        # First use, or Redis lost the index; rebuild once from the table
+        await _ensure_index()
+    members = await async_redis_client.sunion(_type_key(event_type), ALL_EVENTS_KEY)
+    return sorted(int(subscription_id) for subscription_id in members)
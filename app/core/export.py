@@ -0,0 +1,92 @@
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from app.database import SessionLocal
+from app.core import codec
+from app.models.webhook import WebhookDelivery
+from app.core.delivery_query import encode_cursor, filter_deliveries, page_oldest_first
+from app.core.payload_store import delivery_payload, load_payloads
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+def _delivery_record(delivery: WebhookDelivery, payloads: dict) -> dict:
+    return {
+        "cursor": encode_cursor(delivery.created_at, delivery.id),
+        "id": delivery.id,
+        "subscription_id": delivery.subscription_id,
+        "event_type": delivery.event_type,
+        "status": delivery.status,
+        "attempt_count": delivery.attempt_count,
+        "created_at": _isoformat(delivery.created_at),
+        "last_attempt": _isoformat(delivery.last_attempt),
+        "next_retry": _isoformat(delivery.next_retry),
+        "payload": delivery_payload(delivery, payloads),
+        "attempts": [
+            {
+                "attempt_number": attempt.attempt_number,
+                "status_code": attempt.status_code,
+                "outcome": attempt.outcome,
+                "error_details": attempt.error_details,
+                "duration_ms": attempt.duration_ms,
+                "timestamp": _isoformat(attempt.timestamp)
+            }
+            for attempt in delivery.attempts
+        ]
+    }
+
+def iter_delivery_records(
+    subscription_id: Optional[int] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    chunk_size: int = 1000
+) -> Iterator[dict]:
+    """
+    Yield deliveries oldest first with their attempts and payload.
+
+    Rows come through a server-side cursor chunk_size at a time, and each
+    chunk is dropped from the session once written, so memory stays flat
+    however many rows match. Every record carries the cursor to resume
+    after it.
+    """
+    db = SessionLocal()
+    try:
+        query = page_oldest_first(
+            filter_deliveries(
+                select(WebhookDelivery),
+                subscription_id=subscription_id,
+                created_after=created_after,
+                created_before=created_before
+            ),
+            cursor
+        ).options(selectinload(WebhookDelivery.attempts)).execution_options(yield_per=chunk_size)
+        
+        for chunk in db.execute(query).scalars().partitions():
+            payloads = load_payloads(db, {d.payload_hash for d in chunk if d.payload_hash})
+            for delivery in chunk:
+                yield _delivery_record(delivery, payloads)
+                # Release written rows so the identity map doesn't grow with the export
+                for attempt in delivery.attempts:
+                    db.expunge(attempt)
+                db.expunge(delivery)
+    finally:
+        db.close()
+
+def iter_ndjson(records: Iterator[dict], compress: bool = False) -> Iterator[bytes]:
+    """Encode records as NDJSON, optionally as one continuous gzip stream"""
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 writes a gzip header
+    lines = []
+    for record in records:
+        lines.append(codec.dumps(record) + b"\n")
+        if len(lines) >= 100:
+            chunk = b"".join(lines)
+            lines = []
+            yield compressor.compress(chunk) if compressor else chunk
+    chunk = b"".join(lines)
+    if compressor:
+        yield compressor.compress(chunk) + compressor.flush()
+    elif chunk:
+        yield chunk
@@ -0,0 +1,76 @@
+from typing import Dict, List, Optional, Tuple
+from app.core import codec
+from app.core.cache import redis_client
+
+# Round-robin staging area in front of a broker queue. Producers park delivery
+# messages per subscription and publish one drain task per turn they add; each
+# drain task serves the subscription at the head of the ring, so a subscription
+# with a deep backlog gets one turn per round like everyone else.
+#   fair:{queue}:ring          subscription ids with waiting messages, in service order
+#   fair:{queue}:items:{id}    the subscription's messages, oldest first
+#   fair:{queue}:pending       messages waiting across all subscriptions
+RING_KEY = "fair:{queue}:ring"
+ITEMS_KEY = "fair:{queue}:items:"
+PENDING_KEY = "fair:{queue}:pending"
+
+_PUSH = redis_client.register_script("""
+local was_empty = redis.call('LLEN', KEYS[2]) == 0
+redis.call('RPUSH', KEYS[2], unpack(ARGV, 2))
+if was_empty then
+    redis.call('RPUSH', KEYS[1], ARGV[1])
+end
+return redis.call('INCRBY', KEYS[3], #ARGV - 1)
+""")
+
+# The items key is derived from the ring entry, so it cannot be declared up front
+_POP = redis_client.register_script("""
+local subscription_id = redis.call('LPOP', KEYS[1])
+if not subscription_id then
+    return {}
+end
+local key = ARGV[1] .. subscription_id
+local items = redis.call('LPOP', key, ARGV[2]) or {}
+if redis.call('LLEN', key) > 0 then
+    redis.call('RPUSH', KEYS[1], subscription_id)
+end
+redis.call('DECRBY', KEYS[2], #items)
+return {subscription_id, items}
+""")
+
+def _keys(queue: str) -> Tuple[str, str, str]:
+    return RING_KEY.format(queue=queue), ITEMS_KEY.format(queue=queue), PENDING_KEY.format(queue=queue)
+
+def turns_needed(count: int, turn_size: int) -> int:
+    """Drain tasks to publish for count messages added to one subscription"""
+    return -(-count // turn_size)
+
+def push(queue: str, messages_by_subscription: Dict[int, List[dict]]):
+    """Park messages behind their subscriptions, one round-trip for all of them"""
+    ring_key, items_prefix, pending_key = _keys(queue)
+    with redis_client.pipeline(transaction=False) as pipe:
+        for subscription_id, messages in messages_by_subscription.items():
+            if messages:
+                _PUSH(
+                    keys=[ring_key, f"{items_prefix}{subscription_id}", pending_key],
+                    args=[subscription_id, *(codec.dumps(message) for message in messages)],
+                    client=pipe
+                )
+        pipe.execute()
+
+def pop(queue: str, turn_size: int) -> Tuple[Optional[int], List[dict]]:
+    """Take up to turn_size messages from the next subscription in turn"""
+    ring_key, items_prefix, pending_key = _keys(queue)
+    result = _POP(keys=[ring_key, pending_key], args=[items_prefix, turn_size])
+    if not result:
+        return None, []
+    subscription_id, items = result
+    return int(subscription_id), [codec.loads(item) for item in items]
+
+def backlog(queue: str) -> Tuple[int, int]:
+    """(messages waiting, subscriptions waiting) for queue"""
+    ring_key, _, pending_key = _keys(queue)
+    with redis_client.pipeline(transaction=False) as pipe:
+        pipe.get(pending_key)
+        pipe.llen(ring_key)
+        pending, subscriptions = pipe.execute()
+    return int(pending or 0), subscriptions
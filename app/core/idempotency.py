@@ -0,0 +1,74 @@
+import asyncio
+import hashlib
+from typing import Iterable, Optional, Tuple
+from app.config import settings
+from app.core.cache import async_redis_client
+
+# idempotency:{subscription_id}:{key} -> "pending" while the first request is
+# being stored, then the delivery id. A pending claim lives only
+# IDEMPOTENCY_PENDING_TTL_SECONDS, so a request that dies holding one does not
+# block its retries for the full TTL. Entries expire, so memory is bounded by
+# the ingest rate times the TTL.
+IDEMPOTENCY_KEY_PREFIX = "idempotency"
+PENDING = "pending"
+MAX_KEY_LENGTH = 255
+
+class IdempotencyKeyInUse(Exception):
+    """Another request with the same key is still being stored"""
+
+def scoped_key(subscription_id: int, header_key: Optional[str], event_type: Optional[str], body: bytes) -> Optional[Tuple[str, int]]:
+    """Redis key and TTL for a request, or None when it should not be deduplicated.
+
+    A client-supplied Idempotency-Key is kept for IDEMPOTENCY_TTL_SECONDS.
+    Without one the key is a hash of the event type and the encoded payload
+    body, which a producer retry repeats byte for byte, kept only for the short
+    IDEMPOTENCY_DERIVED_TTL_SECONDS window in which producer retries land.
+    """
+    if header_key:
+        return f"{IDEMPOTENCY_KEY_PREFIX}:{subscription_id}:key:{header_key}", settings.IDEMPOTENCY_TTL_SECONDS
+    if settings.IDEMPOTENCY_DERIVED_TTL_SECONDS <= 0:
+        return None
+    digest = hashlib.sha256((event_type or "").encode() + b"\n" + body).hexdigest()
+    return f"{IDEMPOTENCY_KEY_PREFIX}:{subscription_id}:hash:{digest}", settings.IDEMPOTENCY_DERIVED_TTL_SECONDS
+
+async def claim(key: str) -> Optional[int]:
+    """Claim a key for this request; returns the original delivery id if it was already used.
+
+    SET NX makes the first request the owner in one round-trip. A duplicate
+    that arrives while the owner is still storing its delivery waits up to
+    IDEMPOTENCY_WAIT_SECONDS for the id, then raises IdempotencyKeyInUse.
+    """
+    pending_ttl = settings.IDEMPOTENCY_PENDING_TTL_SECONDS
+    if await async_redis_client.set(key, PENDING, nx=True, ex=pending_ttl):
+        return None
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        value = await async_redis_client.get(key)
+        if value is None:
+            # The owner failed and released the key, or its claim expired; take it over
+            if await async_redis_client.set(key, PENDING, nx=True, ex=pending_ttl):
+                return None
+            continue
+        if value != PENDING:
+            return int(value)
+        if loop.time() >= deadline:
+            raise IdempotencyKeyInUse()
+        await asyncio.sleep(0.05)
+
+async def complete(key: str, delivery_id: int, ttl: int):
+    """Record the delivery created for a claimed key, kept for the key's full TTL"""
+    await async_redis_client.set(key, delivery_id, ex=ttl)
+
+async def complete_many(entries: Iterable[Tuple[str, int, int]]):
+    """complete() for (key, delivery id, ttl) entries in one round-trip"""
+    async with async_redis_client.pipeline(transaction=False) as pipe:
+        for key, delivery_id, ttl in entries:
+            pipe.set(key, delivery_id, ex=ttl)
+        await pipe.execute()
+
+async def release(*keys: str):
+    """Give up claims whose delivery was not stored, so retries can go through"""
+    if keys:
+        await async_redis_client.delete(*keys)
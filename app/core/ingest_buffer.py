@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional, Tuple
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.core.broker import enqueue_new_deliveries_async
+from app.core.delivery_store import insert_deliveries
+from app.core import idempotency
+from app.core.metrics import INGEST_FLUSH_ROWS, INGEST_FLUSH_SECONDS, INGEST_FLUSH_WAITERS
+
+logger = logging.getLogger(__name__)
+
+class DeliveryWriteBuffer:
+    """Group-commit buffer for WebhookDelivery inserts.
+
+    Concurrent ingest calls submit their rows here and await the new ids. A
+    single flusher drains the queue into micro-batches that are written with
+    one multi-row INSERT and one commit, then enqueued together. A batch is
+    flushed once it holds max_rows rows or its first row has waited max_delay_ms.
+    
+    A row's idempotency claim is settled here rather than by the caller, who
+    may be gone by the time the batch is written: completed once the row is
+    committed, released only if the INSERT failed.
+    """
+
+    def __init__(self, max_rows: int, max_delay_ms: int):
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def submit(self, row: dict, subscription: dict, claim: Optional[Tuple[str, int]] = None) -> int:
+        """Queue a delivery row for subscription and wait until it is committed and enqueued.
+
+        claim is the (key, ttl) of the request's idempotency claim, if any.
+        """
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, subscription, future, claim))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[dict, dict, asyncio.Future, Optional[Tuple[str, int]]]]):
+        rows = [row for row, _, _, _ in batch]
+        started = time.perf_counter()
+        stored = None
+        try:
+            async with AsyncSessionLocal() as db:
+                stored = await insert_deliveries(rows, db)
+            await idempotency.complete_many(
+                (claim[0], delivery_id, claim[1])
+                for (_, _, _, claim), (delivery_id, _) in zip(batch, stored) if claim
+            )
+            await enqueue_new_deliveries_async([
+                (delivery_id, payload_hash, subscription)
+                for (delivery_id, payload_hash), (_, subscription, _, _) in zip(stored, batch)
+            ])
+        except Exception as e:
+            logger.error(f"Group-commit flush of {len(rows)} rows failed: {str(e)}")
+            # Rows that were committed keep their claims; recovery queues them later
+            if stored is None:
+                await idempotency.release(*(claim[0] for _, _, _, claim in batch if claim))
+            for _, _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        INGEST_FLUSH_SECONDS.observe(time.perf_counter() - started)
+        INGEST_FLUSH_ROWS.observe(len(rows))
+        INGEST_FLUSH_WAITERS.observe(sum(1 for _, _, future, _ in batch if not future.done()))
+
+        for (_, _, future, _), (delivery_id, _) in zip(batch, stored):
+            # A caller that disconnected has a cancelled future; its row still stands
+            if not future.done():
+                future.set_result(delivery_id)
+
+_write_buffer: Optional[DeliveryWriteBuffer] = None
+
+def get_write_buffer() -> DeliveryWriteBuffer:
+    global _write_buffer
+    if _write_buffer is None:
+        _write_buffer = DeliveryWriteBuffer(settings.INGEST_FLUSH_MAX_ROWS, settings.INGEST_FLUSH_MAX_MS)
+    return _write_buffer
@@ -0,0 +1,173 @@
+import logging
+import os
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Group-commit ingest buffer
+INGEST_FLUSH_ROWS = Histogram(
+    "webhook_ingest_flush_rows",
+    "Rows written per group-commit flush",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+INGEST_FLUSH_SECONDS = Histogram(
+    "webhook_ingest_flush_seconds",
+    "Time to insert, commit and enqueue one group-commit batch"
+)
+INGEST_FLUSH_WAITERS = Histogram(
+    "webhook_ingest_flush_waiters",
+    "Ingest requests released by one group-commit flush",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+
+# Two-tier subscription cache
+SUBSCRIPTION_CACHE_LOOKUPS = Counter(
+    "webhook_subscription_cache_lookups_total",
+    "Subscription cache lookups by tier and result",
+    ["tier", "result"]
+)
+SUBSCRIPTION_CACHE_EVICTIONS = Counter(
+    "webhook_subscription_cache_evictions_total",
+    "Entries dropped from the in-process subscription cache",
+    ["reason"]
+)
+
+# Ingest backpressure: reason is rate_limit or queue_full
+INGEST_REJECTED = Counter(
+    "webhook_ingest_rejected_total",
+    "Ingest requests refused with 429",
+    ["reason"]
+)
+
+# Ingest deduplication
+INGEST_DUPLICATES = Counter(
+    "webhook_ingest_duplicates_total",
+    "Ingest requests answered with an earlier delivery id",
+    ["key_source"]
+)
+
+# Ingest stages: cache_lookup, db_lookup, signature, insert_commit, enqueue
+INGEST_STAGE_SECONDS = Histogram(
+    "webhook_ingest_stage_seconds",
+    "Time spent in each stage of webhook ingestion",
+    ["stage"]
+)
+
+# Delivery stages: db_load, http_first_byte, http_total, status_write
+DELIVERY_STAGE_SECONDS = Histogram(
+    "webhook_delivery_stage_seconds",
+    "Time spent in each stage of a delivery",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+DELIVERY_QUEUE_WAIT_SECONDS = Histogram(
+    "webhook_delivery_queue_wait_seconds",
+    "Time from a delivery becoming due (created or retry time) to a worker starting it",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+)
+DELIVERIES_REPLAYED = Counter(
+    "webhook_deliveries_replayed_total",
+    "FAILED deliveries requeued for a fresh set of attempts",
+    ["mode"]  # single or bulk
+)
+
+# Database connection pools: engine is sync or async
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "webhook_db_pool_checkout_seconds",
+    "Time to get a connection from the pool, including opening a new one",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "webhook_db_pool_checkout_timeouts_total",
+    "Checkouts that gave up after DB_POOL_TIMEOUT",
+    ["engine"]
+)
+DB_POOL_IN_USE = Gauge(
+    "webhook_db_pool_connections_in_use",
+    "Connections checked out of the pool",
+    ["engine"],
+    multiprocess_mode="livesum"
+)
+DB_POOL_CAPACITY = Gauge(
+    "webhook_db_pool_capacity",
+    "Pool size plus overflow; in_use / capacity is the pool saturation",
+    ["engine"],
+    multiprocess_mode="livesum"
+)
+
+class BacklogCollector:
+    """Queue depth and pending retries, read from Redis at scrape time"""
+
+    def collect(self):
+        from app.config import settings
+        from app.core import fair_queue, ordered_queue
+        from app.core.retry_scheduler import pending_retry_count
+        from app.core.broker import delivery_queue_names
+        from app.tasks.webhook_tasks import celery_app
+        
+        # A broker outage drops these gauges from the scrape rather than failing it
+        try:
+            depth = GaugeMetricFamily("webhook_queue_depth", "Messages waiting in the broker queue", labels=["queue"])
+            with celery_app.connection_or_acquire() as connection:
+                client = connection.default_channel.client
+                for queue in delivery_queue_names():
+                    depth.add_metric([queue], client.llen(queue))
+            yield depth
+        except Exception as e:
+            logger.warning(f"Could not read queue depth: {str(e)}")
+        try:
+            waiting = GaugeMetricFamily("webhook_fair_queue_messages", "Messages parked in the fair queue", labels=["queue"])
+            subscriptions = GaugeMetricFamily(
+                "webhook_fair_queue_subscriptions", "Subscriptions with messages in the fair queue", labels=["queue"]
+            )
+            for queue in dict.fromkeys([settings.DELIVERY_QUEUE, settings.RETRY_QUEUE]):
+                pending, active = fair_queue.backlog(queue)
+                waiting.add_metric([queue], pending)
+                subscriptions.add_metric([queue], active)
+            yield waiting
+            yield subscriptions
+        except Exception as e:
+            logger.warning(f"Could not read fair queue backlog: {str(e)}")
+        try:
+            waiting = GaugeMetricFamily(
+                "webhook_ordered_partition_subscriptions",
+                "Ordered subscriptions with deliveries waiting, per partition",
+                labels=["partition"]
+            )
+            for partition, subscription_ids in ordered_queue.backlog().items():
+                waiting.add_metric([str(partition)], len(subscription_ids))
+            yield waiting
+        except Exception as e:
+            logger.warning(f"Could not read ordered partitions: {str(e)}")
+        try:
+            pending = pending_retry_count()
+        except Exception as e:
+            logger.warning(f"Could not read pending retries: {str(e)}")
+        else:
+            yield GaugeMetricFamily("webhook_pending_retries", "Deliveries scheduled for a later retry", value=pending)
+
+BACKLOG_REGISTRY = CollectorRegistry()
+BACKLOG_REGISTRY.register(BacklogCollector())
+
+def process_registry() -> CollectorRegistry:
+    """Samples from every process sharing PROMETHEUS_MULTIPROC_DIR, or just this one"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+def render_metrics(include_backlog: bool = True) -> bytes:
+    output = generate_latest(process_registry())
+    if include_backlog:
+        output += generate_latest(BACKLOG_REGISTRY)
+    return output
+
+def reset_multiprocess_dir():
+    """Clear samples left by processes of an earlier run"""
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path and os.path.isdir(path):
+        for name in os.listdir(path):
+            os.remove(os.path.join(path, name))
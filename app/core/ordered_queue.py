@@ -0,0 +1,187 @@
+import bisect
+import hashlib
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+from app.config import settings
+from app.core.cache import redis_client
+
+# Partitions for ordered subscriptions. A subscription's deliveries wait in its
+# partition in ingest order, and the partition's lease lets one consumer at a
+# time send them, one delivery per subscription in flight. Separate partitions
+# drain in parallel. A failed delivery stays at the head of its subscription
+# until its retry is due, so later ones cannot overtake it.
+#   ordered:{p}:items:{id}  the subscription's delivery ids, oldest first
+#   ordered:{p}:ready       subscription ids scored by when their head may be sent
+#   ordered:{p}:lease       token of the consumer draining the partition
+#   ordered:home:{id}       partition holding the subscription's deliveries
+#   ordered:partitions      partitions with deliveries waiting
+#   ordered:pending         deliveries waiting across all partitions
+#
+# Subscriptions map onto ORDERED_PARTITIONS with a consistent-hash ring, so a
+# change of partition count moves only the subscriptions whose ring segment
+# changed owner. A moved subscription keeps using its home partition until
+# that has drained its deliveries, so a move never reorders them.
+PREFIX = "ordered:"
+ITEMS_KEY = "ordered:{partition}:items:{subscription_id}"
+READY_KEY = "ordered:{partition}:ready"
+LEASE_KEY = "ordered:{partition}:lease"
+HOME_KEY = "ordered:home:{subscription_id}"
+PARTITIONS_KEY = "ordered:partitions"
+PENDING_KEY = "ordered:pending"
+RING_POINTS = 160  # virtual points per partition; more evens out the spread
+LEASE_SECONDS = 60  # outlives one round of sends; renewed after each
+
+# The partition comes from the home key, so the other keys are derived here
+_PUSH = redis_client.register_script("""
+local partition = redis.call('GET', KEYS[1]) or ARGV[2]
+local prefix = ARGV[1] .. partition
+redis.call('SET', KEYS[1], partition)
+redis.call('RPUSH', prefix .. ':items:' .. ARGV[3], unpack(ARGV, 5))
+redis.call('ZADD', prefix .. ':ready', 'NX', ARGV[4], ARGV[3])
+redis.call('SADD', KEYS[2], partition)
+redis.call('INCRBY', KEYS[3], #ARGV - 4)
+return tonumber(partition)
+""")
+
+# Drops the head if it is still the delivery that was sent, then either
+# reschedules the subscription or, once it has nothing left, forgets it
+_ADVANCE = redis_client.register_script("""
+if ARGV[4] ~= '' and redis.call('LINDEX', KEYS[1], 0) == ARGV[4] then
+    redis.call('LPOP', KEYS[1])
+    redis.call('DECR', KEYS[5])
+end
+if redis.call('LLEN', KEYS[1]) > 0 then
+    redis.call('ZADD', KEYS[2], ARGV[3], ARGV[2])
+    return 1
+end
+redis.call('ZREM', KEYS[2], ARGV[2])
+if redis.call('GET', KEYS[3]) == ARGV[1] then
+    redis.call('DEL', KEYS[3])
+end
+if redis.call('ZCARD', KEYS[2]) == 0 then
+    redis.call('SREM', KEYS[4], ARGV[1])
+end
+return 0
+""")
+
+_RENEW = redis_client.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+""")
+
+_RELEASE = redis_client.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+@lru_cache(maxsize=8)
+def _ring(partitions: int) -> Tuple[List[int], List[int]]:
+    points = sorted(
+        (_point(f"partition:{partition}:{i}"), partition) for partition in range(partitions) for i in range(RING_POINTS)
+    )
+    return [point for point, _ in points], [partition for _, partition in points]
+
+def partition_for(subscription_id: int, partitions: Optional[int] = None) -> int:
+    """The subscription's partition on the ring of partitions (default ORDERED_PARTITIONS)"""
+    points, owners = _ring(partitions or settings.ORDERED_PARTITIONS)
+    return owners[bisect.bisect(points, _point(f"subscription:{subscription_id}")) % len(points)]
+
+def push(delivery_ids_by_subscription: Dict[int, List[int]]) -> List[int]:
+    """Append deliveries behind their subscriptions, one round-trip; returns the partitions used"""
+    now = time.time()
+    with redis_client.pipeline(transaction=False) as pipe:
+        for subscription_id, delivery_ids in delivery_ids_by_subscription.items():
+            _PUSH(
+                keys=[HOME_KEY.format(subscription_id=subscription_id), PARTITIONS_KEY, PENDING_KEY],
+                args=[PREFIX, partition_for(subscription_id), subscription_id, now, *delivery_ids],
+                client=pipe
+            )
+        return sorted(set(pipe.execute()))
+
+def ready_heads(partition: int, limit: int) -> List[Tuple[int, int]]:
+    """(subscription id, head delivery id) for up to limit subscriptions whose head may be sent now"""
+    subscription_ids = redis_client.zrangebyscore(READY_KEY.format(partition=partition), "-inf", time.time(), 0, limit)
+    if not subscription_ids:
+        return []
+    with redis_client.pipeline(transaction=False) as pipe:
+        for subscription_id in subscription_ids:
+            pipe.lindex(ITEMS_KEY.format(partition=partition, subscription_id=subscription_id), 0)
+        heads = pipe.execute()
+    return [
+        (int(subscription_id), int(head)) for subscription_id, head in zip(subscription_ids, heads) if head is not None
+    ]
+
+def advance(partition: int, outcomes: Iterable[Tuple[int, int, Optional[float]]]):
+    """Apply (subscription id, head delivery id, retry delay) results.
+
+    A delay of None means the head is settled and the next delivery moves up;
+    otherwise the head stays and the subscription waits that many seconds.
+    """
+    now = time.time()
+    with redis_client.pipeline(transaction=False) as pipe:
+        for subscription_id, delivery_id, delay in outcomes:
+            _ADVANCE(
+                keys=[
+                    ITEMS_KEY.format(partition=partition, subscription_id=subscription_id),
+                    READY_KEY.format(partition=partition),
+                    HOME_KEY.format(subscription_id=subscription_id),
+                    PARTITIONS_KEY,
+                    PENDING_KEY
+                ],
+                args=[partition, subscription_id, now + (delay or 0), delivery_id if delay is None else ""],
+                client=pipe
+            )
+        pipe.execute()
+
+def acquire(partition: int) -> Optional[str]:
+    """Take the partition's lease; returns its token, or None while another consumer holds it"""
+    token = uuid4().hex
+    if redis_client.set(LEASE_KEY.format(partition=partition), token, nx=True, ex=LEASE_SECONDS):
+        return token
+    return None
+
+def renew(partition: int, token: str) -> bool:
+    return bool(_RENEW(keys=[LEASE_KEY.format(partition=partition)], args=[token, LEASE_SECONDS]))
+
+def release(partition: int, token: str):
+    _RELEASE(keys=[LEASE_KEY.format(partition=partition)], args=[token])
+
+def is_draining(partition: int) -> bool:
+    return bool(redis_client.exists(LEASE_KEY.format(partition=partition)))
+
+def has_ready(partition: int) -> bool:
+    return redis_client.zcount(READY_KEY.format(partition=partition), "-inf", time.time()) > 0
+
+def active_partitions() -> List[int]:
+    return sorted(int(partition) for partition in redis_client.smembers(PARTITIONS_KEY))
+
+def due_partitions() -> List[int]:
+    """Partitions with a subscription ready to send and no consumer draining them"""
+    partitions = active_partitions()
+    now = time.time()
+    with redis_client.pipeline(transaction=False) as pipe:
+        for partition in partitions:
+            pipe.zcount(READY_KEY.format(partition=partition), "-inf", now)
+            pipe.exists(LEASE_KEY.format(partition=partition))
+        results = pipe.execute()
+    return [
+        partition for partition, ready, leased in zip(partitions, results[::2], results[1::2]) if ready and not leased
+    ]
+
+def backlog() -> Dict[int, List[int]]:
+    """Subscription ids waiting in each partition that has any"""
+    partitions = active_partitions()
+    with redis_client.pipeline(transaction=False) as pipe:
+        for partition in partitions:
+            pipe.zrange(READY_KEY.format(partition=partition), 0, -1)
+        waiting = pipe.execute()
+    return {partition: [int(subscription_id) for subscription_id in ids] for partition, ids in zip(partitions, waiting)}
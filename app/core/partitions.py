@@ -0,0 +1,156 @@
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from typing import List
+from sqlalchemy import MetaData, PrimaryKeyConstraint, ForeignKeyConstraint, text
+from sqlalchemy.schema import CreateTable, CreateIndex
+from app.config import settings
+from app.database import Base
+
+logger = logging.getLogger(__name__)
+
+# Tables range-partitioned by created_at, and how long each one keeps rows
+PARTITIONED_TABLES = {
+    "webhook_deliveries": "DELIVERY_RETENTION_HOURS",
+    "delivery_attempts": "LOG_RETENTION_HOURS",
+}
+_PARTITION_NAME = re.compile(r"^(?P<table>\w+)_p(?P<start>\d{10})$")
+
+def _interval() -> timedelta:
+    return timedelta(hours=settings.PARTITION_INTERVAL_HOURS)
+
+def _partition_start(moment: datetime) -> datetime:
+    """Floor a timestamp to the partition grid, aligned to the Unix epoch in UTC"""
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    interval = _interval()
+    return epoch + ((moment - epoch) // interval) * interval
+
+def _partition_name(table: str, start: datetime) -> str:
+    return f"{table}_p{start:%Y%m%d%H}"
+
+def _partitioned_ddl() -> list:
+    """CREATE TABLE/INDEX statements for the partitioned layout.
+
+    The model tables are copied with created_at added to the primary key,
+    as Postgres requires the partition key in every unique constraint, and
+    without foreign keys into webhook_deliveries, which a partitioned table
+    cannot be the target of once its key is composite. So in this layout
+    delivery_attempts.delivery_id is not enforced by the database: attempts
+    are only written by workers for deliveries they just loaded, and
+    LOG_RETENTION_HOURS <= DELIVERY_RETENTION_HOURS drops attempts no later
+    than their deliveries.
+    """
+    metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        table.to_metadata(metadata)
+    
+    statements = []
+    for name in PARTITIONED_TABLES:
+        table = metadata.tables[name]
+        table.c.id.autoincrement = True
+        table.c.created_at.primary_key = True
+        table.append_constraint(PrimaryKeyConstraint(table.c.id, table.c.created_at))
+        for constraint in list(table.constraints):
+            if isinstance(constraint, ForeignKeyConstraint) and constraint.referred_table.name in PARTITIONED_TABLES:
+                table.constraints.discard(constraint)
+                for element in constraint.elements:
+                    element.parent.foreign_keys.discard(element)
+        table.dialect_options["postgresql"]["partition_by"] = "RANGE (created_at)"
+        statements.append(CreateTable(table))
+        statements.extend(CreateIndex(index) for index in table.indexes)
+    return statements
+
+def create_partitioned_tables(conn):
+    """Create the partitioned parents, a default partition each, and upcoming partitions"""
+    for statement in _partitioned_ddl():
+        conn.execute(statement)
+    for table in PARTITIONED_TABLES:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+    ensure_partitions(conn)
+
+def _exists(conn, relation: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": relation}).scalar()
+
+def _create_partition(conn, table: str, start: datetime) -> bool:
+    """Create one range partition; returns False if it already existed.
+
+    Rows for the range that landed in the default partition while it was
+    missing would make CREATE ... PARTITION OF fail, so the default is
+    detached, the rows moved into the new partition and the default
+    attached again, all in the caller's transaction.
+    """
+    name = _partition_name(table, start)
+    if _exists(conn, name):
+        return False
+    end = start + _interval()
+    default = f"{table}_default"
+    bounds = {"start": start, "end": end}
+    stranded = _exists(conn, default) and conn.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {default} WHERE created_at >= :start AND created_at < :end)"
+    ), bounds).scalar()
+    if stranded:
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    if stranded:
+        moved = conn.execute(text(
+            f"WITH moved AS (DELETE FROM {default} WHERE created_at >= :start AND created_at < :end RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ), bounds).rowcount
+        conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+        logger.warning(f"Moved {moved} rows from {default} into {name}")
+    return True
+
+def ensure_partitions(conn, now: datetime = None) -> List[str]:
+    """Create partitions from the current one up to PARTITIONS_AHEAD intervals ahead.
+
+    Ranges older than the current one are created too when the default
+    partition holds rows for them, e.g. after maintenance lapsed, so those
+    rows move out and age out with their partitions. Returns the partitions
+    created.
+    """
+    now = now or datetime.now(timezone.utc)
+    created = []
+    for table in PARTITIONED_TABLES:
+        start = _partition_start(now)
+        last = start + settings.PARTITIONS_AHEAD * _interval()
+        default = f"{table}_default"
+        if _exists(conn, default):
+            oldest = conn.execute(text(f"SELECT min(created_at) FROM {default}")).scalar()
+            if oldest is not None:
+                start = min(start, _partition_start(oldest))
+        while start <= last:
+            if _create_partition(conn, table, start):
+                created.append(_partition_name(table, start))
+            start += _interval()
+    return created
+
+def drop_expired_partitions(conn, now: datetime = None) -> List[str]:
+    """Drop every partition whose whole range is older than its table's retention"""
+    now = now or datetime.now(timezone.utc)
+    rows = conn.execute(text(
+        "SELECT child.relname, parent.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "WHERE parent.relname = ANY(:tables)"
+    ), {"tables": list(PARTITIONED_TABLES)}).all()
+    
+    dropped = []
+    for partition, table in rows:
+        match = _PARTITION_NAME.match(partition)
+        if not match or match.group("table") != table:
+            continue
+        start = datetime.strptime(match.group("start"), "%Y%m%d%H").replace(tzinfo=timezone.utc)
+        cutoff = now - timedelta(hours=getattr(settings, PARTITIONED_TABLES[table]))
+        if start + _interval() <= cutoff:
+            conn.execute(text(f"DROP TABLE {partition}"))
+            dropped.append(partition)
+    return dropped
+
+def is_partitioned(conn, table: str) -> bool:
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table JOIN pg_class ON pg_class.oid = partrelid "
+        "WHERE relname = :table)"
+    ), {"table": table}).scalar()
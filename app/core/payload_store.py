@@ -0,0 +1,97 @@
+import gzip
+import hashlib
+from typing import Any, Dict, Iterable, List
+from sqlalchemy import delete, exists, select
+from sqlalchemy.dialects import postgresql, sqlite
+from app.config import settings
+from app.core import codec
+from app.models.webhook import WebhookDelivery, WebhookPayload
+
+try:
+    import zstandard
+except ImportError:  # gzip is always available
+    zstandard = None
+
+def encode_json(payload) -> bytes:
+    """The exact bytes a payload is hashed, stored and delivered as"""
+    return codec.dumps(payload)
+
+def _compress(body: bytes):
+    if len(body) < settings.PAYLOAD_COMPRESS_THRESHOLD:
+        return "identity", body
+    if settings.PAYLOAD_COMPRESSION == "zstd" and zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=3).compress(body)
+    return "gzip", gzip.compress(body, compresslevel=6)
+
+def _decompress(encoding: str, data: bytes) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    return data
+
+def payload_row(payload) -> dict:
+    """Content-addressed webhook_payloads row for a payload or its encode_json bytes"""
+    body = payload if isinstance(payload, bytes) else encode_json(payload)
+    encoding, data = _compress(body)
+    return {
+        "hash": hashlib.sha256(body).hexdigest(),
+        "encoding": encoding,
+        "size": len(body),
+        "data": data
+    }
+
+def insert_payloads_statement(dialect_name: str, rows: List[dict], table=WebhookPayload.__table__):
+    """INSERT that skips payloads already stored.
+
+    Rows are sorted by hash so concurrent writers take row locks in the same
+    order and cannot deadlock each other.
+    """
+    unique = sorted({row["hash"]: row for row in rows}.values(), key=lambda row: row["hash"])
+    dialect = postgresql if dialect_name == "postgresql" else sqlite
+    return dialect.insert(table).values(unique).on_conflict_do_nothing(index_elements=["hash"])
+
+def load_payloads(db, hashes: Iterable[str]) -> Dict[str, bytes]:
+    """Fetch and decompress each distinct payload once"""
+    hashes = set(hashes)
+    if not hashes:
+        return {}
+    rows = db.execute(
+        select(WebhookPayload.hash, WebhookPayload.encoding, WebhookPayload.data).where(WebhookPayload.hash.in_(hashes))
+    )
+    return {payload_hash: _decompress(encoding, data) for payload_hash, encoding, data in rows}
+
+def delivery_payload(delivery: WebhookDelivery, payloads: Dict[str, bytes]) -> Any:
+    """A delivery's payload as JSON data, from load_payloads output or, for older rows, its inline column"""
+    if delivery.payload_hash:
+        return codec.loads(payloads[delivery.payload_hash])
+    return delivery.payload
+
+def delete_orphaned_payloads(db, batch_size: int = None) -> int:
+    """Delete payloads no delivery refers to any more; returns how many went.
+
+    The table is walked in hash order, batch_size hashes per DELETE, each
+    with its own anti-join against webhook_deliveries and its own commit, so
+    locks stay short. A delivery inserted in the instant its reused payload
+    is deleted fails its foreign key check; insert_deliveries retries the
+    write, storing the payload again.
+    """
+    batch_size = batch_size or settings.PAYLOAD_SWEEP_BATCH
+    unreferenced = ~exists().where(WebhookDelivery.payload_hash == WebhookPayload.hash)
+    deleted = 0
+    last_hash = ""
+    while True:
+        hashes = db.execute(
+            select(WebhookPayload.hash).where(WebhookPayload.hash > last_hash).order_by(WebhookPayload.hash).limit(batch_size)
+        ).scalars().all()
+        if not hashes:
+            break
+        deleted += db.execute(
+            delete(WebhookPayload).where(WebhookPayload.hash.in_(hashes), unreferenced)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if len(hashes) < batch_size:
+            break
+        last_hash = hashes[-1]
+    return deleted
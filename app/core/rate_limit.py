@@ -0,0 +1,154 @@
+import math
+import time
+from typing import List, Optional
+from redis.asyncio import Redis as AsyncRedis
+from app.config import settings
+from app.core import fair_queue, ordered_queue
+from app.core.cache import async_redis_client
+
+RATE_LIMIT_KEY = "ratelimit:{subscription_id}"
+
+# Token bucket refilled continuously at ARGV[1] tokens/sec up to ARGV[2].
+# Uses the Redis clock so every API replica sees the same bucket.
+# Takes ARGV[3] tokens, or with ARGV[4] = '1' as many whole ones as are there.
+# Returns {tokens taken, seconds until the first refused one would be}.
+_TAKE_TOKENS = async_redis_client.register_script("""
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local taken = 0
+if tokens >= cost then
+    taken = cost
+elseif ARGV[4] == '1' then
+    taken = math.floor(tokens)
+end
+tokens = tokens - taken
+local wait = 0
+if taken < cost then
+    local needed = cost
+    if ARGV[4] == '1' then
+        needed = 1
+    end
+    wait = (needed - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {taken, tostring(wait)}
+""")
+
+# Celery queues live on the broker, which may not be the cache Redis
+broker_client = AsyncRedis.from_url(settings.BROKER_URL)
+
+class LimitExceeded(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+def subscription_limit(subscription: dict) -> Optional[tuple]:
+    """(tokens per second, burst) for a subscription, or None when it is unlimited"""
+    rate = subscription.get("rate_limit_per_second") or settings.RATE_LIMIT_DEFAULT_PER_SECOND
+    if not rate:
+        return None
+    burst = subscription.get("rate_limit_burst") or settings.RATE_LIMIT_DEFAULT_BURST or max(1, math.ceil(rate))
+    return rate, burst
+
+def _take_args(subscription: dict, cost: int, partial: bool) -> Optional[dict]:
+    limit = subscription_limit(subscription)
+    if limit is None:
+        return None
+    rate, burst = limit
+    return {
+        "keys": [RATE_LIMIT_KEY.format(subscription_id=subscription["id"])],
+        "args": [rate, burst, cost, "1" if partial else "0"]
+    }
+
+async def take_tokens(subscription: dict, cost: int = 1, partial: bool = False) -> int:
+    """Charge cost requests to the subscription's bucket and return how many were admitted.
+
+    partial admits as many of them as the bucket holds, so a batch is charged
+    item by item and never gets more than the bucket allows. Raises
+    LimitExceeded when none (or, without partial, not all) can be admitted.
+    """
+    call = _take_args(subscription, cost, partial)
+    if call is None:
+        return cost
+    taken, wait = await _TAKE_TOKENS(**call)
+    taken = int(taken)
+    if taken == 0 or (taken < cost and not partial):
+        raise LimitExceeded("rate_limit", float(wait))
+    return taken
+
+async def take_tokens_each(subscriptions: List[dict]) -> List[Optional[float]]:
+    """Charge one request to each subscription's bucket in one round-trip.
+
+    Returns, per subscription, None when it was charged (or is unlimited),
+    otherwise the seconds until its bucket would admit the request.
+    """
+    calls = [_take_args(subscription, 1, False) for subscription in subscriptions]
+    if not any(calls):
+        return [None] * len(subscriptions)
+    async with async_redis_client.pipeline(transaction=False) as pipe:
+        for call in calls:
+            if call is not None:
+                await _TAKE_TOKENS(client=pipe, **call)
+        replies = iter(await pipe.execute())
+    waits = []
+    for call in calls:
+        if call is None:
+            waits.append(None)
+            continue
+        taken, wait = next(replies)
+        waits.append(None if int(taken) else float(wait))
+    return waits
+
+_queue_depth = 0
+_queue_depth_checked = float("-inf")
+
+async def first_attempt_backlog() -> int:
+    """Deliveries waiting for their first attempt.
+
+    With FAIR_SCHEDULING they wait in the fair queue, whose pending counter is
+    read; the broker only holds drain tasks of up to DELIVERY_BATCH_SIZE
+    each. Without it the broker queue's length is used, which counts tasks
+    rather than deliveries. Deliveries waiting in ordered partitions are
+    added either way.
+    """
+    async with async_redis_client.pipeline(transaction=False) as pipe:
+        pipe.get(ordered_queue.PENDING_KEY)
+        if settings.FAIR_SCHEDULING:
+            pipe.get(fair_queue.PENDING_KEY.format(queue=settings.DELIVERY_QUEUE))
+        counts = await pipe.execute()
+    waiting = sum(max(int(count or 0), 0) for count in counts)
+    if not settings.FAIR_SCHEDULING:
+        waiting += await broker_client.llen(settings.DELIVERY_QUEUE)
+    return waiting
+
+async def check_queue_depth():
+    """Refuse new work while the first-attempt backlog is over INGEST_MAX_QUEUE_DEPTH.
+
+    Retries are left out, so one failing destination's backlog does not turn
+    away everyone's events. The backlog is re-read at most every
+    QUEUE_DEPTH_CHECK_SECONDS per process, so the check costs one round-trip
+    per interval rather than per request.
+    """
+    global _queue_depth, _queue_depth_checked
+    if settings.INGEST_MAX_QUEUE_DEPTH <= 0:
+        return
+    now = time.monotonic()
+    if now - _queue_depth_checked >= settings.QUEUE_DEPTH_CHECK_SECONDS:
+        # Mark first so concurrent requests don't all refresh at once
+        _queue_depth_checked = now
+        _queue_depth = await first_attempt_backlog()
+    if _queue_depth >= settings.INGEST_MAX_QUEUE_DEPTH:
+        raise LimitExceeded("queue_full", settings.QUEUE_FULL_RETRY_AFTER)
@@ -0,0 +1,209 @@
+import time
+import uuid
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import func, update
+from app.config import settings
+from app.database import SessionLocal
+from app.models.webhook import WebhookDelivery
+from app.models.subscription import Subscription
+from app.core.cache import redis_client
+from app.core.delivery_query import encode_cursor, filter_deliveries, page_oldest_first
+from app.core.metrics import DELIVERIES_REPLAYED
+
+# Bulk replays of FAILED deliveries. The advance_replays beat task walks each
+# running job forward on the (created_at, id) keyset, requeueing as many
+# deliveries per step as the job's rate has accrued since the last step.
+#   replay:next_id      job id counter
+#   replay:{id}         hash with the job's filters, rate and progress
+#   replay:{id}:lock    held by the task advancing the job
+#   replay:running      ids of jobs that still have deliveries to walk
+NEXT_ID_KEY = "replay:next_id"
+JOB_KEY = "replay:{job_id}"
+LOCK_KEY = "replay:{job_id}:lock"
+RUNNING_KEY = "replay:running"
+LOCK_SECONDS = 60
+
+# Deletes the lock only while it still holds this step's token, so a step
+# that overran LOCK_SECONDS cannot free the lock of the step after it
+_RELEASE_LOCK = redis_client.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+_INT_FIELDS = ("id", "subscription_id", "total", "scanned", "requeued")
+_TIME_FIELDS = ("created_after", "created_before", "created_at", "finished_at")
+
+def requeue(db, delivery_ids: List[int], mode: str) -> List[int]:
+    """Give FAILED deliveries a fresh set of attempts and queue them on RETRY_QUEUE.
+
+    The attempt count starts over, earlier attempts stay in the history.
+    Only rows still FAILED are reset, so a delivery replayed twice at once is
+    queued once. Ordered subscriptions get theirs back through their
+    partitions, in id order. Returns the ids that were queued.
+    """
+    from app.core.broker import enqueue_deliveries, enqueue_ordered
+
+    reset = db.execute(
+        update(WebhookDelivery)
+        .where(WebhookDelivery.id.in_(delivery_ids), WebhookDelivery.status == "FAILED")
+        .values(status="PENDING", attempt_count=0, next_retry=datetime.utcnow())
+        .returning(WebhookDelivery.id, WebhookDelivery.subscription_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    if not reset:
+        return []
+
+    requeued = [delivery_id for delivery_id, _ in reset]
+    ordered = {
+        subscription_id for subscription_id, in db.query(Subscription.id).filter(
+            Subscription.id.in_({subscription_id for _, subscription_id in reset}),
+            Subscription.ordered == True
+        )
+    }
+    try:
+        enqueue_deliveries([tuple(row) for row in reset if row[1] not in ordered], settings.RETRY_QUEUE)
+        enqueue_ordered(sorted(tuple(row) for row in reset if row[1] in ordered))
+    except Exception:
+        # Back to FAILED so a later replay picks them up again
+        db.execute(
+            update(WebhookDelivery)
+            .where(WebhookDelivery.id.in_(requeued), WebhookDelivery.status == "PENDING")
+            .values(status="FAILED", next_retry=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        raise
+    DELIVERIES_REPLAYED.labels(mode=mode).inc(len(requeued))
+    return requeued
+
+def _failed_deliveries(db, columns, job: dict):
+    return filter_deliveries(
+        db.query(*columns),
+        subscription_id=job["subscription_id"],
+        status="FAILED",
+        event_type=job["event_type"],
+        created_after=job["created_after"],
+        created_before=job["created_before"]
+    )
+
+def _parse(data: dict) -> Optional[dict]:
+    if not data:
+        return None
+    job = {key: value or None for key, value in data.items()}
+    for key in _INT_FIELDS:
+        job[key] = int(job[key] or 0)
+    for key in _TIME_FIELDS:
+        job[key] = datetime.fromisoformat(job[key]) if job[key] else None
+    job["rate_per_second"] = float(job["rate_per_second"])
+    job["allowance"] = float(job["allowance"] or 0)
+    job["last_step_at"] = float(job["last_step_at"])
+    return job
+
+def get_job(job_id: int) -> Optional[dict]:
+    return _parse(redis_client.hgetall(JOB_KEY.format(job_id=job_id)))
+
+def running_jobs() -> List[int]:
+    return sorted(int(job_id) for job_id in redis_client.smembers(RUNNING_KEY))
+
+def start(
+    db,
+    subscription_id: int,
+    event_type: Optional[str],
+    created_after: Optional[datetime],
+    created_before: Optional[datetime],
+    rate_per_second: float
+) -> dict:
+    """Register a bulk replay and return its initial status.
+
+    Without created_before the replay stops at deliveries created before it
+    started, so deliveries failing while it runs are not swept up.
+    """
+    job = {
+        "subscription_id": subscription_id,
+        "event_type": event_type,
+        "created_after": created_after,
+        "created_before": created_before or datetime.utcnow()
+    }
+    total = _failed_deliveries(db, [func.count(WebhookDelivery.id)], job).scalar()
+    job_id = redis_client.incr(NEXT_ID_KEY)
+    redis_client.hset(JOB_KEY.format(job_id=job_id), mapping={
+        "id": job_id,
+        "status": "running",
+        "subscription_id": subscription_id,
+        "event_type": event_type or "",
+        "created_after": created_after.isoformat() if created_after else "",
+        "created_before": job["created_before"].isoformat(),
+        "rate_per_second": rate_per_second,
+        "total": total,
+        "scanned": 0,
+        "requeued": 0,
+        "cursor": "",
+        "allowance": 0,
+        "last_step_at": time.time(),
+        "created_at": datetime.utcnow().isoformat(),
+        "finished_at": ""
+    })
+    redis_client.sadd(RUNNING_KEY, job_id)
+    return get_job(job_id)
+
+def _finish(job_id: int, status: str):
+    key = JOB_KEY.format(job_id=job_id)
+    redis_client.hset(key, mapping={"status": status, "finished_at": datetime.utcnow().isoformat()})
+    redis_client.srem(RUNNING_KEY, job_id)
+    redis_client.expire(key, settings.REPLAY_RETENTION_HOURS * 3600)
+
+def cancel(job_id: int) -> Optional[dict]:
+    """Stop a running replay; deliveries it already queued still go out"""
+    job = get_job(job_id)
+    if job is not None and job["status"] == "running":
+        _finish(job_id, "cancelled")
+        job = get_job(job_id)
+    return job
+
+def advance(job_id: int):
+    """Requeue the deliveries a running job's rate allows since its last step"""
+    lock = LOCK_KEY.format(job_id=job_id)
+    token = uuid.uuid4().hex
+    if not redis_client.set(lock, token, nx=True, ex=LOCK_SECONDS):
+        return
+    try:
+        job = get_job(job_id)
+        if job is None or job["status"] != "running":
+            redis_client.srem(RUNNING_KEY, job_id)
+            return
+
+        # Token bucket holding at most two sweeps' worth, so a stalled beat does not cause a burst
+        now = time.time()
+        rate = job["rate_per_second"]
+        allowance = min(
+            job["allowance"] + (now - job["last_step_at"]) * rate,
+            max(1.0, rate * settings.REPLAY_SWEEP_SECONDS * 2)
+        )
+        limit = int(allowance)
+        rows = []
+        if limit:
+            db = SessionLocal()
+            try:
+                columns = [WebhookDelivery.id, WebhookDelivery.created_at]
+                rows = page_oldest_first(_failed_deliveries(db, columns, job), job["cursor"]).limit(limit).all()
+                requeued = requeue(db, [delivery_id for delivery_id, _ in rows], "bulk") if rows else []
+            finally:
+                db.close()
+
+        key = JOB_KEY.format(job_id=job_id)
+        progress = {"allowance": allowance - len(rows), "last_step_at": now}
+        if rows:
+            progress["cursor"] = encode_cursor(rows[-1].created_at, rows[-1].id)
+            progress["scanned"] = job["scanned"] + len(rows)
+            progress["requeued"] = job["requeued"] + len(requeued)
+        redis_client.hset(key, mapping=progress)
+
+        # A short page means the keyset is exhausted; a cancel may have landed meanwhile
+        if limit and len(rows) < limit and redis_client.hget(key, "status") == "running":
+            _finish(job_id, "completed")
+    finally:
+        _RELEASE_LOCK(keys=[lock], args=[token])
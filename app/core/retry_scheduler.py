@@ -0,0 +1,33 @@
+import time
+from typing import Iterable, List
+from app.core.cache import redis_client
+
+# Time-ordered index of pending retries: member = delivery id, score = due time (epoch seconds).
+# Retries wait here instead of as countdown messages reserved in worker memory.
+RETRY_SCHEDULE_KEY = "retries:scheduled"
+
+_POP_DUE = redis_client.register_script("""
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+""")
+
+def schedule_retry(delivery_id: int, delay_seconds: float):
+    """Index a delivery to be released once delay_seconds have passed"""
+    redis_client.zadd(RETRY_SCHEDULE_KEY, {str(delivery_id): time.time() + delay_seconds})
+
+def schedule_retries(delivery_ids: Iterable[int], delay_seconds: float = 0, only_new: bool = False):
+    """Index many deliveries in one round-trip; only_new keeps existing due times"""
+    due_at = time.time() + delay_seconds
+    mapping = {str(delivery_id): due_at for delivery_id in delivery_ids}
+    if mapping:
+        redis_client.zadd(RETRY_SCHEDULE_KEY, mapping, nx=only_new)
+
+def pop_due_retries(limit: int) -> List[int]:
+    """Atomically take up to limit retries that are due now"""
+    return [int(delivery_id) for delivery_id in _POP_DUE(keys=[RETRY_SCHEDULE_KEY], args=[time.time(), limit])]
+
+def pending_retry_count() -> int:
+    return redis_client.zcard(RETRY_SCHEDULE_KEY)
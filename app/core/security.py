@@ -1,35 +1,62 @@
 import hmac
 import hashlib
-import json
+from typing import List, Optional
+from app.core import codec
+
+def sign_body(body: bytes, secret_key: str) -> str:
+    """HMAC-SHA256 hex digest of already-encoded payload bytes"""
+    return hmac.new(secret_key.encode('utf-8'), body, hashlib.sha256).hexdigest()
 
 def generate_direct_signature(payload: dict, secret_key: str) -> str:
     """
     Generate a signature exactly matching the frontend implementation
     with no string manipulation
     """
-    # Convert payload to a JSON string with no extra formatting
-    payload_str = json.dumps(payload, separators=(',', ':'))
-    
-    # Calculate HMAC
-    signature = hmac.new(
-        secret_key.encode('utf-8'),
-        payload_str.encode('utf-8'),
-        hashlib.sha256
-    ).hexdigest()
-    
-    return signature
+    # The same compact bytes the payload is stored and delivered as
+    return sign_body(codec.dumps(payload), secret_key)
 
-def verify_signature(payload: dict, stored_secret: str, signature: str) -> bool:
+def _candidate_secrets(stored_secret: str) -> list:
     # Extract salt and stored hash
     salt, stored_hash = stored_secret.split(':')
-    
+    return [stored_hash, "Pass123"]
+
+def signature_matches(payload, body: bytes, secrets: List[str], signature: str) -> bool:
+    """Check a signature over body, the codec encoding of payload, for any of secrets"""
     # Remove 'sha256=' prefix from the received signature
     received_signature = signature.replace('sha256=', '')
+    if any(hmac.compare_digest(sign_body(body, secret), received_signature) for secret in secrets):
+        return True
     
+    # Producers that sign with stdlib json.dumps escape non-ASCII characters
+    # and write float exponents differently; accept that form too
+    legacy = codec.dumps_legacy(payload)
+    return legacy != body and any(
+        hmac.compare_digest(sign_body(legacy, secret), received_signature) for secret in secrets
+    )
+
+def verify_signature(payload: dict, stored_secret: str, signature: str, body: Optional[bytes] = None) -> bool:
+    """Verify a subscription signature; pass body when the payload is already encoded"""
+    if body is None:
+        body = codec.dumps(payload)
     # Try with both possible secrets
-    for possible_secret in [stored_hash, "Pass123"]:
-        calculated_signature = generate_direct_signature(payload, possible_secret)
-        if hmac.compare_digest(calculated_signature, received_signature):
-            return True
+    return signature_matches(payload, body, _candidate_secrets(stored_secret), signature)
+
+class StreamingSignatureVerifier:
+    """
+    Verify a signature over raw request body bytes as they arrive,
+    without parsing or re-serializing the payload
+    """
+    def __init__(self, stored_secret: str):
+        # One running HMAC per candidate secret, fed the same chunks
+        self._macs = [
+            hmac.new(secret.encode('utf-8'), digestmod=hashlib.sha256)
+            for secret in _candidate_secrets(stored_secret)
+        ]
+    
+    def update(self, chunk: bytes):
+        for mac in self._macs:
+            mac.update(chunk)
     
-    return False 
\ No newline at end of file
+    def verify(self, signature: str) -> bool:
+        received_signature = signature.replace('sha256=', '')
+        return any(hmac.compare_digest(mac.hexdigest(), received_signature) for mac in self._macs)
@@ -0,0 +1,57 @@
+from typing import Dict, List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal
+from app.models.subscription import Subscription as SubscriptionModel
+from app.core.cache import cache_subscription_async, cache_subscriptions_async
+from app.core.metrics import INGEST_STAGE_SECONDS
+
+# Database loaders behind the subscription cache (cache.get_subscription_async
+# and get_subscriptions_async), shared by the ingest and event routers
+
+async def get_subscription_from_db(subscription_id: int, db: AsyncSession):
+    """Get subscription from database and return as dict"""
+    result = await db.execute(select(SubscriptionModel).filter(
+        SubscriptionModel.id == subscription_id,
+        SubscriptionModel.is_active == True
+    ))
+    db_subscription = result.scalars().first()
+    
+    if not db_subscription:
+        return None
+    
+    # Cache the subscription for future use
+    await cache_subscription_async(db_subscription)
+    
+    # Convert DB model to dict for consistent usage
+    return {
+        "id": db_subscription.id,
+        "target_url": str(db_subscription.target_url),
+        "event_types": db_subscription.event_types,
+        "is_active": db_subscription.is_active,
+        "secret_key": db_subscription.secret_key,
+        "rate_limit_per_second": db_subscription.rate_limit_per_second,
+        "rate_limit_burst": db_subscription.rate_limit_burst,
+        "batch_max_size": db_subscription.batch_max_size,
+        "batch_max_bytes": db_subscription.batch_max_bytes,
+        "batch_linger_ms": db_subscription.batch_linger_ms,
+        "ordered": db_subscription.ordered,
+        "version": db_subscription.version
+    }
+
+async def load_subscription(subscription_id: int):
+    """Cache-miss loader; owns its session since the lookup is shared between requests"""
+    with INGEST_STAGE_SECONDS.labels(stage="db_lookup").time():
+        async with AsyncSessionLocal() as db:
+            return await get_subscription_from_db(subscription_id, db)
+
+async def load_subscriptions(subscription_ids: List[int]) -> Dict[int, dict]:
+    """Cache-miss loader for a fan-out: all the misses in one query and one session"""
+    with INGEST_STAGE_SECONDS.labels(stage="db_lookup").time():
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(SubscriptionModel).filter(
+                SubscriptionModel.id.in_(subscription_ids),
+                SubscriptionModel.is_active == True
+            ))
+            subscriptions = result.scalars().all()
+    return {data["id"]: data for data in await cache_subscriptions_async(subscriptions)}
@@ -1,19 +1,130 @@
-from sqlalchemy import create_engine
+import time
+from typing import Optional
+from uuid import uuid4
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 from app.config import settings
+from app.core import codec
+from app.core.metrics import DB_POOL_CAPACITY, DB_POOL_CHECKOUT_SECONDS, DB_POOL_CHECKOUT_TIMEOUTS, DB_POOL_IN_USE
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+def _async_database_url(url: str) -> str:
+    """Map a sync database URL onto its asyncio driver"""
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    if url.startswith("postgresql://") or url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url.split("://", 1)[1]
+    return url
+
+class _TimedCheckout:
+    """Records how long callers wait for a pooled connection"""
+    metrics_label = ""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.labels(self.metrics_label).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.labels(self.metrics_label).observe(time.perf_counter() - started)
+
+class SyncQueuePool(_TimedCheckout, QueuePool):
+    metrics_label = "sync"
+
+class AsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+def _pool_options(pool_class, pool_size: int, max_overflow: int) -> dict:
+    """create_engine arguments for the configured pooling mode"""
+    if settings.DB_PGBOUNCER:
+        # PgBouncer does the pooling; a second pool here would pin its server connections
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": pool_class,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING
+    }
+
+def _instrument(engine: Engine, label: str, capacity: Optional[int]):
+    """Track checked-out connections for the pool saturation gauges"""
+    DB_POOL_CAPACITY.labels(label).set(capacity or 0)
+
+    @event.listens_for(engine, "checkout")
+    def _checked_out(*args):
+        DB_POOL_IN_USE.labels(label).inc()
+
+    @event.listens_for(engine, "checkin")
+    def _checked_in(*args):
+        DB_POOL_IN_USE.labels(label).dec()
+
+# JSON columns encode and decode through the shared codec
+_JSON_OPTIONS = {"json_serializer": codec.dumps_str, "json_deserializer": codec.loads}
+
+def _create_sync_engine(pool_size: int, max_overflow: int) -> Engine:
+    options = _pool_options(SyncQueuePool, pool_size, max_overflow)
+    sync_engine = create_engine(SQLALCHEMY_DATABASE_URL, **_JSON_OPTIONS, **options)
+    _instrument(sync_engine, "sync", None if settings.DB_PGBOUNCER else pool_size + max_overflow)
+    return sync_engine
+
+def _create_async_engine():
+    url = _async_database_url(SQLALCHEMY_DATABASE_URL)
+    connect_args = {}
+    if settings.DB_PGBOUNCER and url.startswith("postgresql+asyncpg://"):
+        # Transaction pooling hands each transaction to any server connection,
+        # so asyncpg must not cache prepared statements or reuse their names
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__"
+        }
+    options = _pool_options(AsyncQueuePool, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW)
+    async_engine = create_async_engine(url, connect_args=connect_args, **_JSON_OPTIONS, **options)
+    capacity = None if settings.DB_PGBOUNCER else settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    _instrument(async_engine.sync_engine, "async", capacity)
+    return async_engine
+
+# Sync engine, used by the Celery worker and the CRUD endpoints
+engine = _create_sync_engine(settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine, used by the ingest path so DB I/O never blocks the event loop
+async_engine = _create_async_engine()
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
+def configure_worker_engine():
+    """Give a forked worker process its own pool, sized for one task at a time.
+
+    The engines inherited from the parent hold its sockets; dispose(close=False)
+    drops them here without closing them under the parent.
+    """
+    global engine
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+    engine = _create_sync_engine(settings.DB_WORKER_POOL_SIZE, settings.DB_WORKER_MAX_OVERFLOW)
+    SessionLocal.configure(bind=engine)
+
 # Dependency
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+# Async dependency
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
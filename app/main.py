@@ -1,26 +1,48 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import subscriptions, webhooks
-from app.core.db_init import init_db
-import time
+from sqlalchemy import text
+from app.api import subscriptions, webhooks, destinations, events
+from app.config import settings
+from app.database import async_engine
+from app.core.db_init import migrate_db, head_revision
+from app.core.cache import listen_for_invalidations, async_redis_client
+from app.core.metrics import render_metrics
+from prometheus_client import CONTENT_TYPE_LATEST
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Initialize database with retries
-max_attempts = 5
-for attempt in range(max_attempts):
-    logger.info(f"Initializing database (attempt {attempt+1}/{max_attempts})...")
-    if init_db():
-        logger.info("Database initialization successful")
-        break
-    if attempt < max_attempts - 1:  # Don't sleep on the last attempt
-        time.sleep(10)
+async def prepare_schema():
+    """Apply migrations in the background, retrying until the database is reachable"""
+    delay = 1
+    while True:
+        try:
+            await asyncio.to_thread(migrate_db)
+            logger.info("Database schema is up to date")
+            return
+        except Exception as e:
+            logger.error(f"Database migration failed, retrying in {delay}s: {str(e)}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing here waits on the database, so the process serves /health at once
+    background = [asyncio.create_task(listen_for_invalidations())]
+    if settings.DB_MIGRATE_ON_STARTUP:
+        background.append(asyncio.create_task(prepare_schema()))
+    app.state.schema_head = head_revision()
+    yield
+    for task in background:
+        task.cancel()
 
 app = FastAPI(
     title="Webhook Delivery Service",
     description="A robust webhook delivery service with retry mechanism and delivery tracking",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -30,11 +52,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
 app.include_router(subscriptions.router)
 app.include_router(webhooks.router)
+app.include_router(destinations.router)
+app.include_router(events.router)
 
 @app.get("/")
 async def root():
@@ -46,4 +71,34 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"} 
\ No newline at end of file
+    """Liveness: the process is up and serving"""
+    return {"status": "healthy"}
+
+async def _check_schema(expected: str):
+    async with async_engine.connect() as conn:
+        version = (await conn.execute(text("SELECT version_num FROM alembic_version"))).scalar()
+    if version != expected:
+        raise RuntimeError(f"schema at {version}, expected {expected}")
+
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """Readiness: the database answers at the current migration and Redis answers"""
+    checks = {}
+    for name, probe in (
+        ("database", _check_schema(app.state.schema_head)),
+        ("redis", async_redis_client.ping()),
+    ):
+        try:
+            await asyncio.wait_for(probe, settings.READINESS_TIMEOUT_SECONDS)
+            checks[name] = "ok"
+        except Exception as e:
+            checks[name] = str(e) or type(e).__name__
+    ready = all(result == "ok" for result in checks.values())
+    if not ready:
+        response.status_code = 503
+    return {"status": "ready" if ready else "not ready", "checks": checks}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    # Sync so the Redis reads behind the backlog gauges run off the event loop
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, JSON
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, JSON, Float
+from sqlalchemy.sql import false, func
 from app.database import Base
 
 class Subscription(Base):
@@ -11,5 +11,16 @@ class Subscription(Base):
     secret_key = Column(String, nullable=False)
     event_types = Column(JSON, nullable=True)
     is_active = Column(Boolean, default=True)
+    # Batched delivery: pending deliveries go out together as one JSON array when batch_max_size > 1
+    batch_max_size = Column(Integer, nullable=True)
+    batch_max_bytes = Column(Integer, nullable=True)
+    batch_linger_ms = Column(Integer, nullable=True)
+    # Ingest token bucket; falls back to RATE_LIMIT_DEFAULT_* when unset
+    rate_limit_per_second = Column(Float, nullable=True)
+    rate_limit_burst = Column(Integer, nullable=True)
+    # Ordered delivery: one delivery at a time, in ingest order, through a hash partition
+    ordered = Column(Boolean, nullable=False, default=False, server_default=false())
+    # Bumped on every update; delivery messages carry it so workers can tell a stale copy
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
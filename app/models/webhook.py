@@ -1,34 +1,53 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, ForeignKey, LargeBinary, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
 from app.models.subscription import Subscription
 
+class WebhookPayload(Base):
+    """Delivery payloads stored once, keyed by the SHA-256 of their JSON bytes"""
+    __tablename__ = "webhook_payloads"
+    __table_args__ = {'extend_existing': True}
+    
+    hash = Column(String(64), primary_key=True)
+    encoding = Column(String(16), nullable=False)  # identity, gzip or zstd
+    size = Column(Integer, nullable=False)  # uncompressed bytes
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class DeliveryAttempt(Base):
     __tablename__ = "delivery_attempts"
     __table_args__ = {'extend_existing': True}
     
     id = Column(Integer, primary_key=True, index=True)
-    delivery_id = Column(Integer, ForeignKey("webhook_deliveries.id"))
+    delivery_id = Column(Integer, ForeignKey("webhook_deliveries.id"), index=True)
     attempt_number = Column(Integer)
     status_code = Column(Integer, nullable=True)
     error_details = Column(Text, nullable=True)
     outcome = Column(String)
+    duration_ms = Column(Integer, nullable=True)  # request time to the target, including the body
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class WebhookDelivery(Base):
     __tablename__ = "webhook_deliveries"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Keyset pagination: newest first, (created_at, id) as the cursor
+        Index("ix_webhook_deliveries_subscription_created", "subscription_id", "created_at", "id"),
+        Index("ix_webhook_deliveries_status_created", "status", "created_at", "id"),
+        Index("ix_webhook_deliveries_created", "created_at", "id"),
+        {'extend_existing': True}
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     subscription_id = Column(Integer, ForeignKey("subscriptions.id"), nullable=False)
-    payload = Column(JSON, nullable=False)
+    payload = Column(JSON, nullable=True)  # inline payload of rows written before webhook_payloads
+    payload_hash = Column(String(64), ForeignKey("webhook_payloads.hash"), nullable=True, index=True)
     event_type = Column(String, nullable=False)
     status = Column(String, nullable=False)
     attempt_count = Column(Integer, default=0)
     last_attempt = Column(DateTime(timezone=True), nullable=True)
-    next_retry = Column(DateTime(timezone=True), nullable=True)
+    next_retry = Column(DateTime(timezone=True), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
-    attempts = relationship("DeliveryAttempt", backref="delivery") 
\ No newline at end of file
+    attempts = relationship("DeliveryAttempt", backref="delivery", order_by="DeliveryAttempt.id") 
\ No newline at end of file
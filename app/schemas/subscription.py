@@ -1,10 +1,16 @@
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl
 from typing import Optional, List
 from datetime import datetime
 
 class SubscriptionBase(BaseModel):
     target_url: HttpUrl
     event_types: Optional[List[str]] = None
+    batch_max_size: Optional[int] = Field(None, ge=1, le=1000)
+    batch_max_bytes: Optional[int] = Field(None, ge=1024)
+    batch_linger_ms: Optional[int] = Field(None, ge=0, le=60000)
+    rate_limit_per_second: Optional[float] = Field(None, gt=0)
+    rate_limit_burst: Optional[int] = Field(None, ge=1)
+    ordered: bool = False  # deliver one at a time in ingest order; takes precedence over batching
 
 class SubscriptionCreate(SubscriptionBase):
     secret_key: str
@@ -15,6 +21,7 @@ class SubscriptionUpdate(SubscriptionBase):
 class Subscription(SubscriptionBase):
     id: int
     is_active: bool
+    version: int = 1
     created_at: datetime
     updated_at: Optional[datetime]
 
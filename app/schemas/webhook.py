@@ -1,10 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 class WebhookIngestion(BaseModel):
     payload: Dict[str, Any]
-    event_type: Optional[str] = None
+    event_type: str  # webhook_deliveries.event_type is NOT NULL
 
 class DeliveryAttemptResponse(BaseModel):
     attempt_number: int
@@ -18,16 +18,63 @@ class DeliveryAttemptSchema(BaseModel):
     status_code: Optional[int]
     outcome: str
     timestamp: datetime
+    error_details: Optional[str] = None
+    duration_ms: Optional[int] = None
 
     class Config:
         from_attributes = True
 
 class WebhookDeliveryStatus(BaseModel):
     id: int
+    subscription_id: int
+    event_type: Optional[str]
     status: str
     attempt_count: int
+    created_at: datetime
+    last_attempt: Optional[datetime]
     next_retry: Optional[datetime]
     attempts: List[DeliveryAttemptSchema]
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class WebhookDeliveryDetail(WebhookDeliveryStatus):
+    payload: Optional[Any] = None
+
+class WebhookBatchItem(WebhookIngestion):
+    signature: Optional[str] = None  # X-Hub-Signature-256 value for this item
+
+class WebhookBatchItemResult(BaseModel):
+    index: int
+    accepted: bool
+    delivery_id: Optional[int] = None
+    error: Optional[str] = None
+
+class WebhookBatchResponse(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[WebhookBatchItemResult]
+
+class EventPublish(BaseModel):
+    payload: Dict[str, Any]
+
+class ReplayRequest(BaseModel):
+    subscription_id: int
+    event_type: Optional[str] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    rate_per_second: Optional[float] = Field(None, gt=0)  # defaults to REPLAY_RATE_PER_SECOND
+
+class ReplayStatus(BaseModel):
+    id: int
+    status: str  # running, completed or cancelled
+    subscription_id: int
+    event_type: Optional[str]
+    created_after: Optional[datetime]
+    created_before: Optional[datetime]
+    rate_per_second: float
+    total: int  # FAILED deliveries matching when the replay started
+    scanned: int
+    requeued: int
+    created_at: datetime
+    finished_at: Optional[datetime]
@@ -1,25 +1,34 @@
 from celery import Celery
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
 from celery.utils.log import get_task_logger
-from datetime import datetime, timedelta
-import httpx
+from kombu import Exchange, Queue
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, case, insert, or_, update
 from app.config import settings
+from app import database
 from app.database import SessionLocal
 from app.models.webhook import WebhookDelivery, DeliveryAttempt
 from app.models.subscription import Subscription
-from app.core.db_init import init_db
+from app.core.delivery_engine import DeliveryResult, delivery_engine
+from app.core import circuit_breaker, codec, fair_queue, ordered_queue, replay
+from app.core.cache import DELETED, LocalSubscriptionCache, subscription_versions
+from app.core.partitions import ensure_partitions, drop_expired_partitions
+from app.core.payload_store import load_payloads, encode_json, delete_orphaned_payloads
+from app.core.retry_scheduler import schedule_retry, schedule_retries, pop_due_retries
+from app.core.batch_buffer import add_to_batch, take_batch, pop_due_batches
+from app.core.metrics import (
+    DELIVERY_STAGE_SECONDS, DELIVERY_QUEUE_WAIT_SECONDS, SUBSCRIPTION_CACHE_LOOKUPS,
+    process_registry, reset_multiprocess_dir
+)
+from prometheus_client import multiprocess, start_http_server
 from celery.schedules import crontab
+import os
 import time
-import requests
 
 logger = get_task_logger(__name__)
 
-# Initialize database tables with retry
-retries = 3
-for i in range(retries):
-    if init_db():
-        break
-    time.sleep(5)
-
 celery_app = Celery(
     'webhook_tasks',
     broker=settings.BROKER_URL,
@@ -38,104 +47,771 @@ celery_app.conf.update(
     redis_socket_timeout=30
 )
 
-@celery_app.task(bind=True, max_retries=settings.MAX_RETRY_ATTEMPTS)
-def process_webhook(self, delivery_id: int):
+# First attempts and retries have their own queues, so a failing destination's
+# retries cannot hold up fresh deliveries; ordered partitions are drained from
+# a third. Size a pool per queue with -Q; a worker started without -Q consumes
+# all of them.
+celery_app.conf.task_queues = [
+    Queue(name, Exchange(name), routing_key=name) for name in dict.fromkeys(
+        [celery_app.conf.task_default_queue, settings.DELIVERY_QUEUE, settings.RETRY_QUEUE, settings.ORDERED_QUEUE]
+    )
+]
+celery_app.conf.task_routes = {
+    'app.tasks.webhook_tasks.flush_delivery_batch': {'queue': settings.DELIVERY_QUEUE},
+}
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    """Serve the samples of all pool processes from the main worker process"""
+    if not settings.WORKER_METRICS_PORT:
+        return
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        logger.warning("WORKER_METRICS_PORT is set without PROMETHEUS_MULTIPROC_DIR; pool process metrics will be missing")
+    reset_multiprocess_dir()
+    start_http_server(settings.WORKER_METRICS_PORT, registry=process_registry())
+
+@worker_process_init.connect
+def reset_database_pool(**kwargs):
+    """Pool processes must not share the connections they inherit from the parent"""
+    database.configure_worker_engine()
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+def _seconds_since(moment: datetime) -> float:
+    """Age of a timestamp that may come back naive (UTC) or timezone-aware"""
+    now = datetime.now(timezone.utc) if moment.tzinfo else datetime.utcnow()
+    return max((now - moment).total_seconds(), 0.0)
+
+def _schedule_retry(delivery: WebhookDelivery):
+    """Mark a failed attempt for retry, or as permanently failed when out of attempts"""
+    if delivery.attempt_count >= settings.MAX_RETRY_ATTEMPTS:
+        delivery.status = "FAILED"
+        delivery.next_retry = None
+        logger.error(f"Webhook {delivery.id} failed permanently after {settings.MAX_RETRY_ATTEMPTS} attempts")
+    else:
+        retry_delay = settings.RETRY_INTERVALS[delivery.attempt_count - 1]
+        delivery.status = "PENDING_RETRY"
+        delivery.next_retry = datetime.utcnow() + timedelta(seconds=retry_delay)
+        schedule_retry(delivery.id, retry_delay)
+
+def _record_result(db, delivery: WebhookDelivery, result: DeliveryResult):
+    """Store the attempt and move the delivery to its next state"""
+    attempt = DeliveryAttempt(
+        delivery_id=delivery.id,
+        attempt_number=delivery.attempt_count,
+        status_code=result.status_code,
+        error_details=result.error or result.response_body,
+        outcome="SUCCESS" if result.succeeded else "FAILED_ATTEMPT",
+        duration_ms=round(result.duration_seconds * 1000) if result.duration_seconds is not None else None
+    )
+    db.add(attempt)
+    
+    if result.succeeded:
+        delivery.status = "COMPLETED"
+        delivery.next_retry = None
+    else:
+        _schedule_retry(delivery)
+
+def _outcome_rows(delivery_id: int, attempt_count: int, result: DeliveryResult, now: datetime):
+    """Attempt row, delivery update row and retry delay (None if no retry) for one send"""
+    attempt = {
+        "delivery_id": delivery_id,
+        "attempt_number": attempt_count,
+        "status_code": result.status_code,
+        "error_details": result.error or result.response_body,
+        "outcome": "SUCCESS" if result.succeeded else "FAILED_ATTEMPT",
+        "duration_ms": round(result.duration_seconds * 1000) if result.duration_seconds is not None else None
+    }
+    row = {"id": delivery_id, "attempt_count": attempt_count, "last_attempt": now}
+    delay = None
+    if result.succeeded:
+        row.update(status="COMPLETED", next_retry=None)
+    elif attempt_count >= settings.MAX_RETRY_ATTEMPTS:
+        row.update(status="FAILED", next_retry=None)
+    else:
+        delay = settings.RETRY_INTERVALS[attempt_count - 1]
+        row.update(status="PENDING_RETRY", next_retry=now + timedelta(seconds=delay))
+    return attempt, row, delay
+
+def _write_outcomes(db, attempts: List[dict], updates: List[dict]):
+    """Insert attempts and update deliveries by primary key, one statement each, and commit"""
+    write_started = time.perf_counter()
+    if attempts:
+        db.execute(insert(DeliveryAttempt), attempts)
+    if updates:
+        db.execute(update(WebhookDelivery), updates)
+    db.commit()
+    DELIVERY_STAGE_SECONDS.labels(stage="status_write").observe(time.perf_counter() - write_started)
+
+def _observe_send(result: DeliveryResult):
+    if result.first_byte_seconds is not None:
+        DELIVERY_STAGE_SECONDS.labels(stage="http_first_byte").observe(result.first_byte_seconds)
+    if result.duration_seconds is not None:
+        DELIVERY_STAGE_SECONDS.labels(stage="http_total").observe(result.duration_seconds)
+
+def _batch_limits(subscription: Subscription) -> Optional[Tuple[int, int, float]]:
+    """(max deliveries, max body bytes, linger seconds) for a batching subscription, else None"""
+    if not subscription.batch_max_size or subscription.batch_max_size <= 1:
+        return None
+    max_bytes = subscription.batch_max_bytes or settings.BATCH_DEFAULT_MAX_BYTES
+    linger_ms = settings.BATCH_DEFAULT_LINGER_MS if subscription.batch_linger_ms is None else subscription.batch_linger_ms
+    return subscription.batch_max_size, max_bytes, linger_ms / 1000
+
+def _defer(delivery: WebhookDelivery, state: str):
+    """Push a delivery back without spending an attempt"""
+    delay = settings.BREAKER_DEFER_SECONDS
+    delivery.next_retry = datetime.utcnow() + timedelta(seconds=delay)
+    schedule_retry(delivery.id, delay)
+    logger.info(f"Deferred webhook {delivery.id}: destination {state}")
+
+def _retry_unsettled(db, delivery_ids: List[int]):
+    """Put deliveries an unexpected error left unsettled back on the retry schedule.
+
+    Rows already COMPLETED or FAILED keep their state. The others are charged
+    an attempt, so a delivery that keeps hitting the same error still runs
+    out of them, and otherwise retry like a failed send.
+    """
+    db.rollback()
+    now = datetime.utcnow()
+    attempt_count = WebhookDelivery.attempt_count + 1
+    exhausted = attempt_count >= settings.MAX_RETRY_ATTEMPTS
+    delay = settings.RETRY_INTERVALS[0]
+    rows = db.execute(
+        update(WebhookDelivery)
+        .where(WebhookDelivery.id.in_(delivery_ids), WebhookDelivery.status.notin_(("COMPLETED", "FAILED")))
+        .values(
+            attempt_count=attempt_count,
+            status=case((exhausted, "FAILED"), else_="PENDING_RETRY"),
+            next_retry=case((exhausted, None), else_=now + timedelta(seconds=delay))
+        )
+        .returning(WebhookDelivery.id, WebhookDelivery.status)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    schedule_retries([delivery_id for delivery_id, status in rows if status == "PENDING_RETRY"], delay)
+
+def _process_deliveries(delivery_ids: List[int]):
+    """Load, send and record a set of deliveries with one round of DB reads"""
     db = SessionLocal()
+    leases = []
     try:
-        # Get delivery record
-        delivery = db.query(WebhookDelivery).get(delivery_id)
-        if not delivery:
+        load_started = time.perf_counter()
+        deliveries = db.query(WebhookDelivery).filter(WebhookDelivery.id.in_(delivery_ids)).all()
+        missing = set(delivery_ids) - {delivery.id for delivery in deliveries}
+        for delivery_id in missing:
             logger.error(f"Delivery {delivery_id} not found")
-            return
         
-        # Get subscription details
-        subscription = db.query(Subscription).get(delivery.subscription_id)
-        if not subscription:
-            logger.error(f"Subscription {delivery.subscription_id} not found")
-            return
-        
-        target_url = subscription.target_url
-        
-        # Check if max retries reached
-        if delivery.attempt_count >= settings.MAX_RETRY_ATTEMPTS:
-            delivery.status = "FAILED"
-            delivery.next_retry = None
-            db.commit()
-            logger.error(f"Webhook {delivery_id} failed permanently after {settings.MAX_RETRY_ATTEMPTS} attempts")
-            return
+        subscription_ids = {delivery.subscription_id for delivery in deliveries}
+        subscriptions = {
+            subscription.id: subscription
+            for subscription in db.query(Subscription).filter(Subscription.id.in_(subscription_ids)).all()
+        }
         
-        # Update delivery status and attempt count
-        delivery.status = "IN_PROGRESS"
-        delivery.attempt_count += 1
-        delivery.last_attempt = datetime.utcnow()
+        load_seconds = time.perf_counter() - load_started
         
-        try:
-            logger.info(f"Sending webhook to {target_url}")
-            response = requests.post(
-                target_url,
-                json=delivery.payload,
-                timeout=settings.WEBHOOK_TIMEOUT
-            )
+        to_send = []
+        batched: Dict[int, List[int]] = {}
+        for delivery in deliveries:
+            subscription = subscriptions.get(delivery.subscription_id)
+            if not subscription:
+                logger.error(f"Subscription {delivery.subscription_id} not found")
+                continue
             
-            # Record attempt
-            attempt = DeliveryAttempt(
-                delivery_id=delivery_id,
-                attempt_number=delivery.attempt_count,
-                status_code=response.status_code,
-                error_details=response.text if response.status_code >= 400 else None,
-                outcome="SUCCESS" if response.status_code < 400 else "FAILED_ATTEMPT"
-            )
-            db.add(attempt)
+            # Settled another way (e.g. a second message for the same retry) since it was queued
+            if delivery.status in ("COMPLETED", "FAILED"):
+                continue
             
-            if response.status_code >= 400:
-                if delivery.attempt_count >= settings.MAX_RETRY_ATTEMPTS:
-                    delivery.status = "FAILED"
-                    delivery.next_retry = None
-                    logger.error(f"Webhook {delivery_id} failed permanently after {settings.MAX_RETRY_ATTEMPTS} attempts")
-                else:
-                    retry_delay = settings.RETRY_INTERVALS[delivery.attempt_count - 1]
-                    delivery.status = "PENDING_RETRY"
-                    delivery.next_retry = datetime.utcnow() + timedelta(seconds=retry_delay)
-                    process_webhook.apply_async(args=[delivery_id], countdown=retry_delay)
-            else:
-                delivery.status = "COMPLETED"
+            # Check if max retries reached
+            if delivery.attempt_count >= settings.MAX_RETRY_ATTEMPTS:
+                delivery.status = "FAILED"
                 delivery.next_retry = None
+                logger.error(f"Webhook {delivery.id} failed permanently after {settings.MAX_RETRY_ATTEMPTS} attempts")
+                continue
             
-            db.commit()
+            # Batching subscriptions collect deliveries and send them together
+            if _batch_limits(subscription):
+                batched.setdefault(subscription.id, []).append(delivery.id)
+                continue
             
-        except requests.RequestException as e:
-            attempt = DeliveryAttempt(
-                delivery_id=delivery_id,
-                attempt_number=delivery.attempt_count,
-                error_details=str(e),
-                outcome="FAILED_ATTEMPT"
-            )
-            db.add(attempt)
+            # Skip the network call while the destination is open or saturated
+            host = circuit_breaker.destination_host(subscription.target_url)
+            lease, state = circuit_breaker.acquire(host)
+            if lease is None:
+                _defer(delivery, state)
+                continue
+            leases.append((host, lease))
             
+            # Retries, deferrals and replays become due at next_retry, first attempts when created
+            due = delivery.next_retry or delivery.created_at
+            if due is not None:
+                DELIVERY_QUEUE_WAIT_SECONDS.observe(_seconds_since(due))
+            
+            # Update delivery status and attempt count
+            delivery.status = "IN_PROGRESS"
+            delivery.attempt_count += 1
+            delivery.last_attempt = datetime.utcnow()
+            to_send.append((delivery, subscription.target_url))
+        
+        # Each distinct payload is fetched and decompressed once for the whole batch
+        load_started = time.perf_counter()
+        payloads = load_payloads(db, (delivery.payload_hash for delivery, _ in to_send if delivery.payload_hash))
+        DELIVERY_STAGE_SECONDS.labels(stage="db_load").observe(load_seconds + time.perf_counter() - load_started)
+        requests = []
+        for delivery, target_url in to_send:
+            logger.info(f"Sending webhook {delivery.id} to {target_url}")
+            body = payloads[delivery.payload_hash] if delivery.payload_hash else encode_json(delivery.payload)
+            requests.append((target_url, body))
+        results = delivery_engine.send_many(requests)
+        
+        write_started = time.perf_counter()
+        for (delivery, _), result, (host, lease) in zip(to_send, results, leases):
+            _observe_send(result)
+            _record_result(db, delivery, result)
+            circuit_breaker.release(host, lease, result.succeeded)
+        leases = []
+        
+        db.commit()
+        DELIVERY_STAGE_SECONDS.labels(stage="status_write").observe(time.perf_counter() - write_started)
+        
+        for subscription_id, batch_ids in batched.items():
+            max_size, _, linger = _batch_limits(subscriptions[subscription_id])
+            if add_to_batch(subscription_id, batch_ids, linger) >= max_size:
+                flush_delivery_batch.delay(subscription_id)
+        
+    except Exception as exc:
+        logger.error(f"Unhandled error processing deliveries {delivery_ids}: {str(exc)}")
+        _retry_unsettled(db, delivery_ids)
+    finally:
+        # Slots still held here never got a result; free them without judging the host
+        for host, lease in leases:
+            circuit_breaker.release(host, lease, None)
+        db.close()
+
+def _deliver_ordered(partition: int, heads: List[Tuple[int, int]]):
+    """Send the head delivery of each ready subscription in a partition and move the heads along.
+
+    At most one delivery per subscription is in flight. A head that fails
+    stays in place until its retry is due, holding back the subscription's
+    later deliveries; it leaves once it succeeds or runs out of attempts.
+    """
+    db = SessionLocal()
+    leases = []
+    try:
+        load_started = time.perf_counter()
+        deliveries = {
+            delivery.id: delivery
+            for delivery in db.query(WebhookDelivery).filter(WebhookDelivery.id.in_([delivery_id for _, delivery_id in heads])).all()
+        }
+        subscriptions = {
+            subscription.id: subscription
+            for subscription in db.query(Subscription).filter(Subscription.id.in_({subscription_id for subscription_id, _ in heads})).all()
+        }
+        
+        outcomes = []
+        to_send = []
+        for subscription_id, delivery_id in heads:
+            delivery = deliveries.get(delivery_id)
+            subscription = subscriptions.get(subscription_id)
+            # Gone, or settled another way (e.g. a replay) since it was queued
+            if delivery is None or subscription is None or delivery.status in ("COMPLETED", "FAILED"):
+                outcomes.append((subscription_id, delivery_id, None))
+                continue
+            
+            # An open or saturated destination holds the subscription back without spending an attempt
+            host = circuit_breaker.destination_host(subscription.target_url)
+            lease, state = circuit_breaker.acquire(host)
+            if lease is None:
+                outcomes.append((subscription_id, delivery_id, settings.BREAKER_DEFER_SECONDS))
+                logger.info(f"Deferred ordered webhook {delivery_id}: destination {state}")
+                continue
+            leases.append((host, lease))
+            DELIVERY_QUEUE_WAIT_SECONDS.observe(_seconds_since(delivery.next_retry or delivery.created_at))
+            to_send.append((subscription_id, delivery, subscription.target_url))
+        
+        payloads = load_payloads(db, (delivery.payload_hash for _, delivery, _ in to_send if delivery.payload_hash))
+        DELIVERY_STAGE_SECONDS.labels(stage="db_load").observe(time.perf_counter() - load_started)
+        results = delivery_engine.send_many([
+            (target_url, payloads[delivery.payload_hash] if delivery.payload_hash else encode_json(delivery.payload))
+            for _, delivery, target_url in to_send
+        ])
+        
+        now = datetime.utcnow()
+        attempts = []
+        updates = []
+        for (subscription_id, delivery, _), result, (host, lease) in zip(to_send, results, leases):
+            _observe_send(result)
+            attempt, row, delay = _outcome_rows(delivery.id, delivery.attempt_count + 1, result, now)
+            attempts.append(attempt)
+            updates.append(row)
+            outcomes.append((subscription_id, delivery.id, delay))
+            circuit_breaker.release(host, lease, result.succeeded)
+        leases = []
+        
+        # Outcomes are stored before the heads move, so a crash in between resends rather than skips
+        _write_outcomes(db, attempts, updates)
+        ordered_queue.advance(partition, outcomes)
+    finally:
+        for host, lease in leases:
+            circuit_breaker.release(host, lease, None)
+        db.close()
+
+def _batch_chunks(deliveries: List[WebhookDelivery], payloads: Dict[str, bytes], max_bytes: int):
+    """Split deliveries into JSON array bodies of at most max_bytes (one delivery may exceed it alone)"""
+    chunks = []
+    items, size = [], 2
+    for delivery in deliveries:
+        payload = payloads[delivery.payload_hash] if delivery.payload_hash else encode_json(delivery.payload)
+        item = b'{"delivery_id":%d,"event_type":%s,"payload":%s}' % (delivery.id, codec.dumps(delivery.event_type), payload)
+        if items and size + len(item) + 1 > max_bytes:
+            chunks.append(items)
+            items, size = [], 2
+        items.append((delivery, item))
+        size += len(item) + 1
+    if items:
+        chunks.append(items)
+    return [([delivery for delivery, _ in chunk], b"[" + b",".join(item for _, item in chunk) + b"]") for chunk in chunks]
+
+def _flush_batch(subscription_id: int):
+    """Send a subscription's buffered deliveries as JSON arrays and record them in bulk"""
+    db = SessionLocal()
+    leases = []
+    delivery_ids = []
+    try:
+        subscription = db.query(Subscription).filter(Subscription.id == subscription_id).first()
+        limits = _batch_limits(subscription) if subscription else None
+        if limits is None:
+            # Batching was switched off with deliveries still buffered; send them one by one
+            delivery_ids = take_batch(subscription_id, settings.RETRY_RELEASE_BATCH, 0)
+            db.close()
+            if delivery_ids:
+                _process_deliveries(delivery_ids)
+            return
+        
+        max_size, max_bytes, linger = limits
+        delivery_ids = take_batch(subscription_id, max_size, linger)
+        if not delivery_ids:
+            return
+        
+        deliveries = db.query(WebhookDelivery).filter(
+            WebhookDelivery.id.in_(delivery_ids),
+            WebhookDelivery.status.notin_(("COMPLETED", "FAILED"))
+        ).order_by(WebhookDelivery.id).all()
+        
+        updates = []
+        sendable = []
+        for delivery in deliveries:
             if delivery.attempt_count >= settings.MAX_RETRY_ATTEMPTS:
-                delivery.status = "FAILED"
-                delivery.next_retry = None
-                logger.error(f"Webhook {delivery_id} failed permanently after max retries")
-            else:
-                retry_delay = settings.RETRY_INTERVALS[delivery.attempt_count - 1]
-                delivery.status = "PENDING_RETRY"
-                delivery.next_retry = datetime.utcnow() + timedelta(seconds=retry_delay)
-                process_webhook.apply_async(args=[delivery_id], countdown=retry_delay)
+                updates.append({"id": delivery.id, "status": "FAILED", "next_retry": None})
+                continue
+            sendable.append(delivery)
+        
+        payloads = load_payloads(db, (delivery.payload_hash for delivery in sendable if delivery.payload_hash))
+        host = circuit_breaker.destination_host(subscription.target_url)
+        to_send = []
+        deferred = []
+        for chunk, body in _batch_chunks(sendable, payloads, max_bytes):
+            lease, state = circuit_breaker.acquire(host)
+            if lease is None:
+                deferred.extend(chunk)
+                continue
+            leases.append(lease)
+            to_send.append((chunk, body))
+        
+        now = datetime.utcnow()
+        results = delivery_engine.send_many([(subscription.target_url, body) for _, body in to_send])
+        
+        attempts = []
+        retries: Dict[int, List[int]] = {}
+        for (chunk, _), result, lease in zip(to_send, results, leases):
+            if result.duration_seconds is not None:
+                DELIVERY_STAGE_SECONDS.labels(stage="http_total").observe(result.duration_seconds)
+            for delivery in chunk:
+                attempt, row, delay = _outcome_rows(delivery.id, delivery.attempt_count + 1, result, now)
+                attempts.append(attempt)
+                updates.append(row)
+                if delay is not None:
+                    retries.setdefault(delay, []).append(delivery.id)
+            circuit_breaker.release(host, lease, result.succeeded)
+        leases = []
+        
+        # Deliveries held back by the breaker keep their attempt count
+        defer_until = now + timedelta(seconds=settings.BREAKER_DEFER_SECONDS)
+        updates.extend({"id": delivery.id, "next_retry": defer_until} for delivery in deferred)
+        
+        _write_outcomes(db, attempts, updates)
+        
+        for delay, retry_ids in retries.items():
+            schedule_retries(retry_ids, delay)
+        if deferred:
+            schedule_retries([delivery.id for delivery in deferred], settings.BREAKER_DEFER_SECONDS)
+        logger.info(f"Sent {sum(len(chunk) for chunk, _ in to_send)} deliveries in {len(to_send)} batches to subscription {subscription_id}")
+    
+    except Exception as exc:
+        logger.error(f"Unhandled error flushing batch for subscription {subscription_id}: {str(exc)}")
+        if delivery_ids:
+            _retry_unsettled(db, delivery_ids)
+    finally:
+        for lease in leases:
+            circuit_breaker.release(host, lease, None)
+        db.close()
+
+@dataclass
+class SubscriptionSnapshot:
+    """The subscription fields a delivery message carries, as of its version"""
+    version: int
+    target_url: str
+    batch_max_size: Optional[int] = None
+    batch_max_bytes: Optional[int] = None
+    batch_linger_ms: Optional[int] = None
+
+    @classmethod
+    def from_message(cls, message: dict) -> "SubscriptionSnapshot":
+        return cls(
+            version=message["version"],
+            target_url=message["target_url"],
+            batch_max_size=message.get("batch_max_size"),
+            batch_max_bytes=message.get("batch_max_bytes"),
+            batch_linger_ms=message.get("batch_linger_ms")
+        )
+
+# Newest subscription version seen in this process's messages
+worker_subscriptions = LocalSubscriptionCache(settings.SUBSCRIPTION_CACHE_SIZE, settings.SUBSCRIPTION_CACHE_TTL)
+
+def _current_subscription(message: dict, stamp: Optional[str]) -> Optional[SubscriptionSnapshot]:
+    """The subscription fields to send a message with, or None when its copy is out of date.
+
+    stamp is the subscription's version stamp from Redis (None if it was
+    never updated). A message queued before an update goes to the updated
+    target when this process has seen a message with the new version, and
+    otherwise returns None so the caller reads the row.
+    """
+    if stamp == DELETED:
+        return None
+    current = message["version"] if stamp is None else int(stamp)
+    cached = worker_subscriptions.get(message["subscription_id"])
+    if cached is not None and cached.version >= current:
+        SUBSCRIPTION_CACHE_LOOKUPS.labels(tier="worker", result="hit").inc()
+        return cached
+    SUBSCRIPTION_CACHE_LOOKUPS.labels(tier="worker", result="miss").inc()
+    if message["version"] < current:
+        return None
+    snapshot = SubscriptionSnapshot.from_message(message)
+    worker_subscriptions.put(message["subscription_id"], snapshot)
+    return snapshot
+
+def _process_messages(messages: List[dict]):
+    """Make first attempts straight from self-contained task messages.
+
+    Neither the delivery nor the subscription row is read; only the payloads
+    are fetched, once per distinct hash. Outcomes for the whole set go out as
+    one attempts INSERT and one deliveries UPDATE in a single commit.
+    """
+    # Id-only messages, those built from cache entries older than the version column, and those
+    # whose subscription has since changed or been deleted fall back to row reads
+    stamps = subscription_versions({message["subscription_id"] for message in messages if message.get("version") is not None})
+    current = []
+    stale = []
+    for message in messages:
+        subscription = None
+        if message.get("version") is not None:
+            subscription = _current_subscription(message, stamps[message["subscription_id"]])
+        if subscription is None:
+            stale.append(message["id"])
+        else:
+            current.append((message, subscription))
+    if stale:
+        _process_deliveries(stale)
+    if not current:
+        return
+    
+    db = SessionLocal()
+    leases = []
+    delivery_ids = [message["id"] for message, _ in current]
+    try:
+        to_send = []
+        deferred = []
+        batched: Dict[int, Tuple[tuple, List[int]]] = {}
+        for message, subscription in current:
+            # Batching subscriptions collect deliveries and send them together
+            limits = _batch_limits(subscription)
+            if limits:
+                batched.setdefault(message["subscription_id"], (limits, []))[1].append(message["id"])
+                continue
             
-            db.commit()
+            # Skip the network call while the destination is open or saturated
+            host = circuit_breaker.destination_host(subscription.target_url)
+            lease, state = circuit_breaker.acquire(host)
+            if lease is None:
+                deferred.append(message["id"])
+                logger.info(f"Deferred webhook {message['id']}: destination {state}")
+                continue
+            leases.append((host, lease))
             
+            DELIVERY_QUEUE_WAIT_SECONDS.observe(max(time.time() - message["queued_at"], 0.0))
+            to_send.append((message, subscription.target_url))
+        
+        load_started = time.perf_counter()
+        payloads = load_payloads(db, (message["payload_hash"] for message, _ in to_send))
+        DELIVERY_STAGE_SECONDS.labels(stage="db_load").observe(time.perf_counter() - load_started)
+        requests = []
+        for message, target_url in to_send:
+            logger.info(f"Sending webhook {message['id']} to {target_url}")
+            requests.append((target_url, payloads[message["payload_hash"]]))
+        results = delivery_engine.send_many(requests)
+        
+        now = datetime.utcnow()
+        attempts = []
+        updates = []
+        retries: Dict[int, List[int]] = {}
+        for (message, _), result, (host, lease) in zip(to_send, results, leases):
+            _observe_send(result)
+            attempt, row, delay = _outcome_rows(message["id"], 1, result, now)
+            attempts.append(attempt)
+            updates.append(row)
+            if delay is not None:
+                retries.setdefault(delay, []).append(message["id"])
+            circuit_breaker.release(host, lease, result.succeeded)
+        leases = []
+        
+        # Deliveries held back by the breaker keep their attempt count
+        defer_until = now + timedelta(seconds=settings.BREAKER_DEFER_SECONDS)
+        updates.extend({"id": delivery_id, "next_retry": defer_until} for delivery_id in deferred)
+        _write_outcomes(db, attempts, updates)
+        
+        for delay, retry_ids in retries.items():
+            schedule_retries(retry_ids, delay)
+        if deferred:
+            schedule_retries(deferred, settings.BREAKER_DEFER_SECONDS)
+        for subscription_id, ((max_size, _, linger), batch_ids) in batched.items():
+            if add_to_batch(subscription_id, batch_ids, linger) >= max_size:
+                flush_delivery_batch.delay(subscription_id)
+    
     except Exception as exc:
-        logger.error(f"Unhandled error in process_webhook {delivery_id}: {str(exc)}")
-        if 'delivery' in locals():
-            delivery.status = "FAILED"
-            delivery.next_retry = None
+        logger.error(f"Unhandled error processing deliveries {delivery_ids}: {str(exc)}")
+        _retry_unsettled(db, delivery_ids)
+    finally:
+        # Slots still held here never got a result; free them without judging the host
+        for host, lease in leases:
+            circuit_breaker.release(host, lease, None)
+        db.close()
+
+# Nothing publishes process_webhook or process_webhook_batch any more; they stay
+# registered so messages queued by an older release still get delivered
+@celery_app.task(bind=True, max_retries=settings.MAX_RETRY_ATTEMPTS)
+def process_webhook(self, delivery_id: int):
+    """Legacy: one delivery by id"""
+    _process_deliveries([delivery_id])
+
+@celery_app.task
+def process_webhook_batch(delivery_ids: List[int]):
+    """Legacy: several deliveries by id"""
+    _process_deliveries(delivery_ids)
+
+@celery_app.task
+def deliver_messages(messages: List[dict]):
+    """First attempts for deliveries whose messages carry their send details"""
+    _process_messages(messages)
+
+@celery_app.task
+def drain_fair_queue(queue: str):
+    """Deliver the next subscription's turn from a fair queue"""
+    _, messages = fair_queue.pop(queue, settings.DELIVERY_BATCH_SIZE)
+    if messages:
+        _process_messages(messages)
+
+@celery_app.task
+def redispatch_fair_queues():
+    """Re-issue drain tasks for fair queues that hold work but have no tasks queued.
+
+    Every publish adds enough drain tasks for its messages, so this only
+    matters when a drain task was lost, e.g. a publish that failed after
+    the messages were parked.
+    """
+    with celery_app.connection_or_acquire() as connection:
+        client = connection.default_channel.client
+        for queue in dict.fromkeys([settings.DELIVERY_QUEUE, settings.RETRY_QUEUE]):
+            pending, subscriptions = fair_queue.backlog(queue)
+            if not pending or client.llen(queue):
+                continue
+            logger.warning(f"Fair queue {queue} has {pending} messages and no drain tasks; re-issuing")
+            # Enough turns however the messages are split between subscriptions
+            with celery_app.producer_or_acquire() as producer:
+                for _ in range(subscriptions + fair_queue.turns_needed(pending, settings.DELIVERY_BATCH_SIZE)):
+                    drain_fair_queue.apply_async(args=[queue], queue=queue, producer=producer)
+
+@celery_app.task
+def drain_ordered_partition(partition: int):
+    """Deliver an ordered partition while holding its lease, for up to ORDERED_DRAIN_SECONDS"""
+    token = ordered_queue.acquire(partition)
+    if token is None:
+        return  # another consumer is draining it
+    deadline = time.monotonic() + settings.ORDERED_DRAIN_SECONDS
+    try:
+        while time.monotonic() < deadline:
+            heads = ordered_queue.ready_heads(partition, settings.DELIVERY_BATCH_SIZE)
+            if not heads:
+                break
+            _deliver_ordered(partition, heads)
+            if not ordered_queue.renew(partition, token):
+                logger.warning(f"Lost the lease on ordered partition {partition}")
+                return
+    finally:
+        ordered_queue.release(partition, token)
+    # Hand over rather than hold a worker indefinitely; held-back heads are picked up by the sweep
+    if ordered_queue.has_ready(partition):
+        drain_ordered_partition.apply_async(args=[partition], queue=settings.ORDERED_QUEUE)
+
+@celery_app.task
+def redispatch_ordered_partitions():
+    """Wake ordered partitions whose held-back deliveries have come due and that nobody is draining"""
+    partitions = ordered_queue.due_partitions()
+    if not partitions:
+        return
+    with celery_app.producer_or_acquire() as producer:
+        for partition in partitions:
+            drain_ordered_partition.apply_async(args=[partition], queue=settings.ORDERED_QUEUE, producer=producer)
+
+@celery_app.task
+def flush_delivery_batch(subscription_id: int):
+    """Send one batch of a subscription's buffered deliveries"""
+    _flush_batch(subscription_id)
+
+@celery_app.task
+def flush_due_batches():
+    """Send batches that have lingered long enough without filling up"""
+    for subscription_id in pop_due_batches(settings.RETRY_RELEASE_BATCH):
+        flush_delivery_batch.delay(subscription_id)
+
+@celery_app.task
+def release_due_retries():
+    """Move retries that have come due from the schedule onto the retry queue"""
+    from app.core.broker import enqueue_deliveries
+    
+    released = 0
+    for _ in range(settings.RETRY_SWEEP_MAX_ROUNDS):
+        delivery_ids = pop_due_retries(settings.RETRY_RELEASE_BATCH)
+        if not delivery_ids:
+            break
+        db = SessionLocal()
+        try:
+            # QUEUED with next_retry as the release time; recover_stranded_retries picks the row
+            # up again if its message never gets processed. Fair scheduling takes turns by
+            # subscription, which the schedule does not record.
+            deliveries = db.execute(
+                update(WebhookDelivery)
+                .where(WebhookDelivery.id.in_(delivery_ids), WebhookDelivery.status.notin_(("COMPLETED", "FAILED")))
+                .values(status="QUEUED", next_retry=datetime.utcnow())
+                .returning(WebhookDelivery.id, WebhookDelivery.subscription_id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            db.commit()
+            enqueue_deliveries([tuple(delivery) for delivery in deliveries], settings.RETRY_QUEUE)
+        except Exception:
+            # Put them back so a broker outage does not drop retries
+            db.rollback()
+            db.execute(
+                update(WebhookDelivery)
+                .where(WebhookDelivery.id.in_(delivery_ids), WebhookDelivery.status == "QUEUED")
+                .values(status="PENDING_RETRY")
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            schedule_retries(delivery_ids)
+            raise
+        finally:
+            db.close()
+        released += len(deliveries)
+    if released:
+        logger.info(f"Released {released} due retries")
+
+@celery_app.task
+def advance_replays():
+    """Requeue the next slice of every running bulk replay, each at its own rate"""
+    for job_id in replay.running_jobs():
+        try:
+            replay.advance(job_id)
+        except Exception as e:
+            logger.error(f"Error advancing replay {job_id}: {str(e)}")
+
+def _stranded(cutoff: datetime):
+    """PENDING, QUEUED or IN_PROGRESS rows nothing has touched since cutoff"""
+    return and_(
+        WebhookDelivery.status.in_(("PENDING", "QUEUED", "IN_PROGRESS")),
+        WebhookDelivery.created_at < cutoff,
+        or_(WebhookDelivery.next_retry == None, WebhookDelivery.next_retry < cutoff),
+        or_(WebhookDelivery.last_attempt == None, WebhookDelivery.last_attempt < cutoff)
+    )
+
+@celery_app.task
+def recover_stranded_retries():
+    """Put deliveries whose message or schedule entry was lost back on the retry schedule.
+
+    Overdue PENDING_RETRY rows lost their entry between being popped from the
+    schedule and reaching the broker, and are re-indexed (next_retry index).
+    PENDING, QUEUED and IN_PROGRESS rows untouched for the grace period lost
+    their task message: a sweeper died between marking them QUEUED and
+    publishing, or a worker died holding the message. They are moved to
+    PENDING_RETRY and scheduled now. The grace period must outlast the
+    longest wait on the broker, or a row is sent alongside its message.
+    Ordered subscriptions retry from their partitions, never the schedule.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=settings.RETRY_RECOVERY_GRACE_SECONDS)
+        limit = settings.RETRY_RELEASE_BATCH * 10
+        unordered = db.query(WebhookDelivery.id).join(
+            Subscription, Subscription.id == WebhookDelivery.subscription_id
+        ).filter(Subscription.ordered == False)
+        
+        overdue = unordered.filter(
+            WebhookDelivery.status == "PENDING_RETRY",
+            WebhookDelivery.next_retry < cutoff
+        ).order_by(WebhookDelivery.next_retry)
+        delivery_ids = [delivery_id for delivery_id, in overdue.limit(limit)]
+        if delivery_ids:
+            schedule_retries(delivery_ids, only_new=True)
+            logger.warning(f"Re-indexed {len(delivery_ids)} stranded retries")
+        
+        stranded = [delivery_id for delivery_id, in unordered.filter(_stranded(cutoff)).limit(limit)]
+        if stranded:
+            # The condition is checked again so rows that moved on meanwhile are left alone
+            delivery_ids = db.execute(
+                update(WebhookDelivery)
+                .where(WebhookDelivery.id.in_(stranded), _stranded(cutoff))
+                .values(status="PENDING_RETRY", next_retry=now)
+                .returning(WebhookDelivery.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
             db.commit()
+            schedule_retries(delivery_ids)
+            if delivery_ids:
+                logger.warning(f"Rescheduled {len(delivery_ids)} deliveries whose task message was lost")
+    finally:
+        db.close()
+
+def _sweep_payloads():
+    """Delete payloads left without deliveries once retention has removed theirs"""
+    db = SessionLocal()
+    try:
+        deleted = delete_orphaned_payloads(db)
+        if deleted:
+            logger.info(f"Deleted {deleted} unreferenced payloads")
+    except Exception as e:
+        logger.error(f"Error deleting unreferenced payloads: {str(e)}")
+        db.rollback()
     finally:
         db.close()
 
 @celery_app.task
 def cleanup_old_logs():
     """Clean up old webhook delivery logs"""
+    if settings.DB_PARTITIONED:
+        # Retention is handled by dropping whole partitions in maintain_partitions
+        return
     db = SessionLocal()
     try:
         cutoff_date = datetime.utcnow() - timedelta(hours=settings.LOG_RETENTION_HOURS)
@@ -146,6 +822,24 @@ def cleanup_old_logs():
         db.rollback()
     finally:
         db.close()
+    _sweep_payloads()
+
+@celery_app.task
+def maintain_partitions():
+    """Create upcoming partitions and drop the ones past retention"""
+    if not settings.DB_PARTITIONED:
+        return
+    try:
+        with database.engine.begin() as conn:
+            ensure_partitions(conn)
+            dropped = drop_expired_partitions(conn)
+        if dropped:
+            logger.info(f"Dropped expired partitions: {', '.join(dropped)}")
+    except Exception as e:
+        logger.error(f"Error maintaining partitions: {str(e)}")
+        return
+    if dropped:
+        _sweep_payloads()
 
 # Schedule cleanup task
 celery_app.conf.beat_schedule = {
@@ -153,4 +847,32 @@ celery_app.conf.beat_schedule = {
         'task': 'app.tasks.webhook_tasks.cleanup_old_logs',
         'schedule': crontab(hour='*/12'),  # Run every 12 hours
     },
+    'maintain-partitions': {
+        'task': 'app.tasks.webhook_tasks.maintain_partitions',
+        'schedule': crontab(minute=0),  # Run hourly
+    },
+    'release-due-retries': {
+        'task': 'app.tasks.webhook_tasks.release_due_retries',
+        'schedule': settings.RETRY_SWEEP_SECONDS,
+    },
+    'flush-due-batches': {
+        'task': 'app.tasks.webhook_tasks.flush_due_batches',
+        'schedule': settings.BATCH_SWEEP_SECONDS,
+    },
+    'redispatch-fair-queues': {
+        'task': 'app.tasks.webhook_tasks.redispatch_fair_queues',
+        'schedule': settings.FAIR_SWEEP_SECONDS,
+    },
+    'advance-replays': {
+        'task': 'app.tasks.webhook_tasks.advance_replays',
+        'schedule': settings.REPLAY_SWEEP_SECONDS,
+    },
+    'redispatch-ordered-partitions': {
+        'task': 'app.tasks.webhook_tasks.redispatch_ordered_partitions',
+        'schedule': settings.ORDERED_SWEEP_SECONDS,
+    },
+    'recover-stranded-retries': {
+        'task': 'app.tasks.webhook_tasks.recover_stranded_retries',
+        'schedule': crontab(minute='*/5'),
+    },
 }
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+JSON codec microbenchmark for the ingest path and the subscription cache.
+
+Times, per accepted webhook, the serialization work the API does before the
+row is written:
+
+  stdlib   the previous path: json.dumps for the signature, again for the
+           idempotency hash (sorted keys) and again for the payload row
+  once     one encode through app.core.codec, reused for all three
+
+The "once" path runs with both codec backends: orjson (when installed) and
+stdlib json. Cache entry round trips (dumps + loads of a subscription record)
+are timed the same way.
+
+    python -m benchmarks.bench_codec --sizes 1024 16384 204800
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import timeit
+from app.core import codec
+from app.core.payload_store import payload_row
+from benchmarks.bench_signature import SECRET, make_payload
+
+SUBSCRIPTION = {
+    "id": 42, "target_url": "https://example.com/hooks/orders", "event_types": ["order.created", "order.paid"],
+    "is_active": True, "secret_key": "salt:" + "ab" * 32, "rate_limit_per_second": 50.0, "rate_limit_burst": 100,
+    "batch_max_size": None, "batch_max_bytes": None, "batch_linger_ms": None, "version": 3
+}
+
+def stdlib_path(payload: dict):
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+    hashlib.sha256(json.dumps(
+        {"event_type": "order.created", "payload": payload}, sort_keys=True, separators=(",", ":")
+    ).encode()).hexdigest()
+    payload_row(json.dumps(payload, separators=(',', ':')).encode())
+
+def once_path(payload: dict):
+    body = codec.dumps(payload)
+    hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+    hashlib.sha256(b"order.created\n" + body).hexdigest()
+    payload_row(body)
+
+def _time(fn, seconds: float) -> float:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    runs = max(1, int(number * seconds / 0.2))
+    return min(timer.repeat(3, runs)) / runs * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 16 * 1024, 200 * 1024])
+    parser.add_argument("--seconds", type=float, default=1.0, help="approximate time budget per measurement")
+    args = parser.parse_args()
+
+    backends = [("orjson", codec.orjson)] if codec.orjson is not None else []
+    backends.append(("json", None))
+    default_backend = codec._orjson
+
+    print(f"{'payload':>10} {'path':>14} {'us/event':>10}")
+    for size in args.sizes:
+        payload = make_payload(size)
+        print(f"{size:>10} {'stdlib':>14} {_time(lambda: stdlib_path(payload), args.seconds):>10.1f}")
+        for name, backend in backends:
+            codec._orjson = backend
+            print(f"{size:>10} {'once/' + name:>14} {_time(lambda: once_path(payload), args.seconds):>10.1f}")
+
+    stdlib_cache = _time(lambda: json.loads(json.dumps(SUBSCRIPTION)), args.seconds)
+    print(f"{'cache':>10} {'stdlib':>14} {stdlib_cache:>10.2f}")
+    for name, backend in backends:
+        codec._orjson = backend
+        print(f"{'cache':>10} {'codec/' + name:>14} {_time(lambda: codec.loads(codec.dumps(SUBSCRIPTION)), args.seconds):>10.2f}")
+    codec._orjson = default_backend
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Delivery throughput benchmark for one worker process.
+
+Starts a local stand-in receiver that answers every POST after a fixed delay,
+then sends the same number of deliveries two ways from this single process:
+
+  requests   one requests.post per delivery, no shared session (the old path)
+  engine     DeliveryEngine.send_many, pooled keep-alive connections on asyncio
+
+    python -m benchmarks.bench_delivery --deliveries 500 --latency-ms 200
+"""
+import argparse
+import json
+import time
+import requests
+from app.core.delivery_engine import DeliveryEngine
+from benchmarks.receiver import Receiver
+
+def bench_requests(url: str, count: int) -> float:
+    started = time.perf_counter()
+    for i in range(count):
+        requests.post(url, json={"delivery": i}, timeout=30)
+    return time.perf_counter() - started
+
+def bench_engine(url: str, count: int) -> float:
+    engine = DeliveryEngine()
+    engine.send_many([(url, b'{"warmup":true}')])
+    started = time.perf_counter()
+    results = engine.send_many([(url, json.dumps({"delivery": i}).encode()) for i in range(count)])
+    elapsed = time.perf_counter() - started
+    engine.close()
+    failed = sum(1 for result in results if not result.succeeded)
+    if failed:
+        print(f"engine: {failed} deliveries failed")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deliveries", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--baseline-deliveries", type=int, default=50,
+                        help="the sequential baseline is slow, so it runs a smaller sample")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    receiver = Receiver(latency_ms=args.latency_ms).start()
+    url = receiver.url
+
+    report = {"latency_ms": args.latency_ms, "results": []}
+    for name, runner, count in (
+        ("requests", bench_requests, args.baseline_deliveries),
+        ("engine", bench_engine, args.deliveries),
+    ):
+        elapsed = runner(url, count)
+        rate = count / elapsed
+        print(f"{name:>9}: {count} deliveries in {elapsed:.2f}s = {rate:.1f} deliveries/sec")
+        report["results"].append({"mode": name, "deliveries": count, "seconds": round(elapsed, 3), "deliveries_per_sec": round(rate, 1)})
+
+    receiver.stop()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+"""
+End-to-end benchmark: ingest through the API, delivery through a Celery worker.
+
+Starts everything locally:
+
+  redis      --redis-url if given, else a redis-server from PATH, else an
+             in-process fakeredis TCP server (pip install "fakeredis[lua]")
+  database   --database-url, default a SQLite file in the run directory
+             (use Postgres for numbers that mean anything in production)
+  receiver   benchmarks.receiver with the latency, error and slow-loris knobs
+  api        uvicorn app.main:app
+  worker     celery worker with embedded beat, so retries are released
+
+then posts webhooks at --rate per second for --duration seconds and waits for
+the receiver to see every accepted one. Reports ingest throughput and latency
+percentiles, delivery throughput and end-to-end lag percentiles (ingest
+request sent to first successful arrival at the receiver).
+
+Settings can be overridden for both processes with --env, and two result
+files can be compared to catch regressions:
+
+    python -m benchmarks.bench_end_to_end --rate 200 --duration 30 --output before.json
+    python -m benchmarks.bench_end_to_end --rate 200 --duration 30 --env INGEST_GROUP_COMMIT=true --output after.json
+    python -m benchmarks.bench_end_to_end --compare before.json after.json --threshold 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+import httpx
+from app.core.security import generate_direct_signature
+from benchmarks.receiver import Receiver
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET = "Pass123"
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    return {
+        "p50": round(rank(50) * 1000, 2),
+        "p95": round(rank(95) * 1000, 2),
+        "p99": round(rank(99) * 1000, 2),
+        "max": round(ordered[-1] * 1000, 2)
+    }
+
+class Stack:
+    """Redis, API and worker processes for one run; stop() tears everything down"""
+
+    def __init__(self, args, workdir: str):
+        self.args = args
+        self.workdir = workdir
+        self.processes: List[subprocess.Popen] = []
+        self.fake_server = None
+        self.api_url = None
+
+    def start_redis(self):
+        if self.args.redis_url:
+            parsed = urlparse(self.args.redis_url)
+            return parsed.hostname, parsed.port or 6379
+        port = free_port()
+        if shutil.which("redis-server"):
+            self._spawn("redis", ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"])
+            self._wait_for_port(port)
+            return "127.0.0.1", port
+        try:
+            from fakeredis import TcpFakeServer
+        except ImportError:
+            raise SystemExit("No redis-server on PATH and fakeredis is not installed; pass --redis-url")
+        self.fake_server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+        threading.Thread(target=self.fake_server.serve_forever, daemon=True).start()
+        return "127.0.0.1", port
+
+    def default_database(self) -> str:
+        # API and worker write from separate processes; WAL and a busy timeout keep SQLite from failing on lock waits
+        path = os.path.join(self.workdir, "bench.db")
+        with sqlite3.connect(path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+        return f"sqlite:///{path}?timeout=30"
+
+    def start(self):
+        redis_host, redis_port = self.start_redis()
+        database_url = self.args.database_url or self.default_database()
+        broker_url = f"redis://{redis_host}:{redis_port}/0"
+        env = dict(
+            os.environ,
+            DATABASE_URL=database_url,
+            REDIS_HOST=redis_host,
+            REDIS_PORT=str(redis_port),
+            BROKER_URL=broker_url,
+            CELERY_RESULT_BACKEND=broker_url,
+            PYTHONPATH=ROOT
+        )
+        for override in self.args.env:
+            key, _, value = override.partition("=")
+            env[key] = value
+
+        api_port = free_port()
+        self.api_url = f"http://127.0.0.1:{api_port}"
+        self._spawn("api", [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--port", str(api_port), "--log-level", "warning"
+        ], env)
+        self.start_workers(env)
+        self._wait_for_health()
+
+    def start_workers(self, env: dict):
+        self.spawn_worker("worker", env, self.args.worker_concurrency, beat=True)
+
+    def spawn_worker(self, name: str, env: dict, concurrency: int, queues: Optional[List[str]] = None, beat: bool = False):
+        """A celery worker consuming queues (all of them when None); beat embeds the scheduler"""
+        command = [
+            sys.executable, "-m", "celery", "-A", "app.tasks.webhook_tasks", "worker",
+            "--loglevel=warning", "--concurrency", str(concurrency), "-n", f"{name}@%h"
+        ]
+        if queues:
+            command += ["-Q", ",".join(queues)]
+        if beat:
+            command += ["-B", "-s", os.path.join(self.workdir, "celerybeat-schedule")]
+        self._spawn(name, command, env)
+
+    def _spawn(self, name: str, command: List[str], env: dict = None):
+        log = open(os.path.join(self.workdir, f"{name}.log"), "wb")
+        self.processes.append(subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT))
+
+    def _wait_for_port(self, port: int, timeout: float = 10):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise SystemExit(f"Nothing listening on port {port}; see logs in {self.workdir}")
+
+    def _wait_for_health(self, timeout: float = 60):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                if httpx.get(f"{self.api_url}/health", timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.25)
+        raise SystemExit(f"API did not become healthy; see logs in {self.workdir}")
+
+    def stop(self):
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in reversed(self.processes):
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if self.fake_server:
+            self.fake_server.shutdown()
+
+async def drive_ingest(
+    api_url: str,
+    subscription_id: int,
+    args,
+    rate: Optional[float] = None,
+    first_seq: int = 0,
+    accepted_at: Optional[Dict[int, float]] = None
+) -> dict:
+    """Open-loop load: requests start on schedule whether or not earlier ones finished.
+
+    rate defaults to args.rate; first_seq keeps sequence numbers apart when
+    several subscriptions deliver to the same receiver. accepted_at, if
+    given, collects the wall-clock time of each 202 by sequence number.
+    """
+    rate = rate or args.rate
+    url = f"{api_url}/webhooks/ingest/{subscription_id}"
+    latencies = []
+    statuses: Dict[int, int] = {}
+    in_flight = asyncio.Semaphore(args.max_in_flight)
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def send(seq: int, scheduled: float):
+            # Timed from the scheduled start, so waiting for an in-flight slot counts as latency
+            sent_at = time.time() - (time.perf_counter() - scheduled)
+            async with in_flight:
+                payload = {"bench_seq": seq, "bench_sent_at": sent_at, "data": "x" * args.payload_bytes}
+                headers = {"X-Hub-Signature-256": "sha256=" + generate_direct_signature(payload, SECRET)}
+                try:
+                    response = await client.post(url, json={"payload": payload, "event_type": "bench"}, headers=headers)
+                    code = response.status_code
+                    if code == 202 and accepted_at is not None:
+                        accepted_at[seq] = time.time()
+                except httpx.HTTPError:
+                    code = 0
+                latencies.append(time.perf_counter() - scheduled)
+                statuses[code] = statuses.get(code, 0) + 1
+
+        total = int(rate * args.duration)
+        interval = 1 / rate
+        started = time.perf_counter()
+        tasks = []
+        for seq in range(total):
+            scheduled = started + seq * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(first_seq + seq, scheduled)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "accepted": statuses.get(202, 0),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(total / elapsed, 1),
+        "latency_ms": percentiles(latencies)
+    }
+
+def wait_for_deliveries(receiver: Receiver, expected: int, timeout: float) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline and len(receiver.arrivals) < expected:
+        time.sleep(0.2)
+    arrivals = list(receiver.arrivals.values())
+    lags = [arrived - sent_at for sent_at, arrived in arrivals if sent_at is not None]
+    first_sent = min((sent_at for sent_at, _ in arrivals), default=None)
+    last_arrival = max((arrived for _, arrived in arrivals), default=None)
+    span = (last_arrival - first_sent) if arrivals else 0
+    return {
+        "expected": expected,
+        "delivered": len(arrivals),
+        "missing": expected - len(arrivals),
+        "seconds": round(span, 3),
+        "deliveries_per_sec": round(len(arrivals) / span, 1) if span else None,
+        "lag_ms": percentiles(lags)
+    }
+
+def stage_means(api_url: str) -> Dict[str, float]:
+    """Mean milliseconds per ingest stage, from the API's /metrics"""
+    from prometheus_client.parser import text_string_to_metric_families
+
+    totals: Dict[str, Dict[str, float]] = {}
+    text = httpx.get(f"{api_url}/metrics", timeout=10).text
+    for family in text_string_to_metric_families(text):
+        if family.name != "webhook_ingest_stage_seconds":
+            continue
+        for sample in family.samples:
+            if sample.name.endswith(("_sum", "_count")):
+                stage = totals.setdefault(sample.labels["stage"], {})
+                stage[sample.name.rsplit("_", 1)[1]] = sample.value
+    return {
+        stage: round(values["sum"] / values["count"] * 1000, 3)
+        for stage, values in totals.items() if values.get("count")
+    }
+
+def run(args) -> dict:
+    receiver = Receiver(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        slow_loris_rate=args.slow_loris_rate,
+        slow_loris_seconds=args.slow_loris_seconds
+    ).start()
+    workdir = tempfile.mkdtemp(prefix="webhook-bench-")
+    stack = Stack(args, workdir)
+    try:
+        stack.start()
+        response = httpx.post(f"{stack.api_url}/subscriptions/", json={
+            "target_url": receiver.url,
+            "event_types": ["bench"],
+            "secret_key": SECRET
+        }, timeout=10)
+        response.raise_for_status()
+        subscription_id = response.json()["id"]
+
+        ingest = asyncio.run(drive_ingest(stack.api_url, subscription_id, args))
+        print(f"ingest:   {ingest['requests_per_sec']} req/s, p50 {ingest['latency_ms']['p50']} ms, "
+              f"p99 {ingest['latency_ms']['p99']} ms, statuses {ingest['statuses']}")
+        stages = stage_means(stack.api_url)
+        print(f"stages:   {stages} (mean ms)")
+        delivery = wait_for_deliveries(receiver, ingest["accepted"], args.drain_timeout)
+        print(f"delivery: {delivery['delivered']}/{delivery['expected']} delivered, {delivery['deliveries_per_sec']} /s, "
+              f"lag p50 {delivery['lag_ms']['p50']} ms, p99 {delivery['lag_ms']['p99']} ms")
+    finally:
+        stack.stop()
+        receiver.stop()
+    print(f"logs in {workdir}")
+
+    return {
+        "label": args.label,
+        "commit": _git_commit(),
+        "config": {
+            key: value for key, value in vars(args).items()
+            if key not in ("output", "compare", "threshold", "label")
+        },
+        "ingest": ingest,
+        "ingest_stages_ms": stages,
+        "delivery": delivery,
+        "receiver": receiver.stats()
+    }
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# (section, metric, True when higher is better)
+COMPARED = [
+    ("ingest", "requests_per_sec", True),
+    ("ingest", "latency_ms.p50", False),
+    ("ingest", "latency_ms.p95", False),
+    ("ingest", "latency_ms.p99", False),
+    ("delivery", "deliveries_per_sec", True),
+    ("delivery", "lag_ms.p50", False),
+    ("delivery", "lag_ms.p95", False),
+    ("delivery", "lag_ms.p99", False),
+]
+
+def _lookup(report: dict, section: str, metric: str):
+    value = report[section]
+    for part in metric.split("."):
+        value = value[part]
+    return value
+
+def compare(before_path: str, after_path: str, threshold: float) -> bool:
+    """Print both runs side by side; returns False if any metric regressed past threshold"""
+    before = json.load(open(before_path))
+    after = json.load(open(after_path))
+    ok = True
+    print(f"{'metric':<30} {before['label']:>12} {after['label']:>12} {'change':>8}")
+    for section, metric, higher_is_better in COMPARED:
+        old = _lookup(before, section, metric)
+        new = _lookup(after, section, metric)
+        if not old or new is None:
+            print(f"{section + '.' + metric:<30} {old!s:>12} {new!s:>12}")
+            continue
+        change = (new - old) / old
+        regressed = -change > threshold if higher_is_better else change > threshold
+        ok = ok and not regressed
+        print(f"{section + '.' + metric:<30} {old:>12} {new:>12} {change:>+7.1%}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=100, help="ingest requests per second")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of ingest load")
+    parser.add_argument("--max-in-flight", type=int, default=200, help="cap on concurrent ingest requests")
+    parser.add_argument("--payload-bytes", type=int, default=256)
+    parser.add_argument("--drain-timeout", type=float, default=120, help="seconds to wait for deliveries after ingest")
+    parser.add_argument("--latency-ms", type=float, default=20, help="receiver response delay")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of deliveries answered with 500")
+    parser.add_argument("--slow-loris-rate", type=float, default=0, help="fraction of responses trickled out slowly")
+    parser.add_argument("--slow-loris-seconds", type=float, default=5)
+    parser.add_argument("--worker-concurrency", type=int, default=4)
+    parser.add_argument("--database-url")
+    parser.add_argument("--redis-url")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="setting override for the API and worker, repeatable")
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--output")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(0 if compare(*args.compare, args.threshold) else 1)
+
+    report = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
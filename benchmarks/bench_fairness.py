@@ -0,0 +1,139 @@
+"""
+Noisy-neighbour benchmark: delivery lag for healthy subscribers while one
+subscriber is failing hard.
+
+Several healthy subscriptions post to a receiver that answers quickly; one
+more subscription, at a much higher rate, posts to a receiver that answers
+every delivery with a slow 500, so its first attempts and retries pile up.
+Reports, for the healthy subscriptions only, end-to-end lag (request sent to
+arrival) and delivery lag (202 received to arrival). On SQLite the first is
+dominated by ingest waiting on the write lock; the second is the queueing.
+
+Runs each --layouts entry on a fresh stack:
+
+  split   deliveries and retries queues with fair scheduling, one worker pool
+          per queue (--delivery-concurrency and --retry-concurrency)
+  shared  everything on the default queue in arrival order and one pool with
+          the same total concurrency, as before the queues were split
+
+The circuit breaker is raised out of reach by default so the failing
+destination keeps costing worker time; pass --env to change any setting.
+
+    python -m benchmarks.bench_fairness --duration 20 --output fairness.json
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+from typing import Dict, List
+import httpx
+from benchmarks.bench_end_to_end import SECRET, Stack, drive_ingest, percentiles, wait_for_deliveries, _git_commit
+from benchmarks.receiver import Receiver
+
+# Keeps retries inside the run and the failing destination open
+DEFAULT_ENV = ["RETRY_INTERVALS=[1,2,4]", "BREAKER_FAILURE_THRESHOLD=1000000"]
+SHARED_QUEUE_ENV = ["DELIVERY_QUEUE=celery", "RETRY_QUEUE=celery", "FAIR_SCHEDULING=false"]
+
+class FairnessStack(Stack):
+    def start_workers(self, env: dict):
+        if self.args.layout == "shared":
+            concurrency = self.args.delivery_concurrency + self.args.retry_concurrency
+            self.spawn_worker("worker", env, concurrency, beat=True)
+        else:
+            self.spawn_worker("deliveries", env, self.args.delivery_concurrency, ["deliveries", "celery"], beat=True)
+            self.spawn_worker("retries", env, self.args.retry_concurrency, ["retries"])
+
+def _subscribe(api_url: str, target_url: str) -> int:
+    response = httpx.post(f"{api_url}/subscriptions/", json={
+        "target_url": target_url,
+        "event_types": ["bench"],
+        "secret_key": SECRET
+    }, timeout=10)
+    response.raise_for_status()
+    return response.json()["id"]
+
+async def _drive_all(api_url: str, healthy_ids: List[int], failing_id: int, accepted_at: dict, args) -> List[dict]:
+    # Sequence numbers are spaced out per subscription so arrivals never collide
+    drivers = [
+        drive_ingest(api_url, subscription_id, args, args.healthy_rate, (i + 1) * 1_000_000, accepted_at)
+        for i, subscription_id in enumerate(healthy_ids)
+    ]
+    drivers.append(drive_ingest(api_url, failing_id, args, args.failing_rate))
+    return await asyncio.gather(*drivers)
+
+def run_layout(layout: str, args) -> dict:
+    healthy = Receiver(latency_ms=args.latency_ms).start()
+    failing = Receiver(latency_ms=args.failing_latency_ms, error_rate=1.0).start()
+    workdir = tempfile.mkdtemp(prefix=f"webhook-fairness-{layout}-")
+    stack_args = argparse.Namespace(**vars(args))
+    stack_args.layout = layout
+    stack_args.env = DEFAULT_ENV + (SHARED_QUEUE_ENV if layout == "shared" else []) + args.env
+    stack = FairnessStack(stack_args, workdir)
+    try:
+        stack.start()
+        healthy_ids = [_subscribe(stack.api_url, healthy.url) for _ in range(args.healthy_subscriptions)]
+        failing_id = _subscribe(stack.api_url, failing.url)
+
+        accepted_at: Dict[int, float] = {}
+        ingests = asyncio.run(_drive_all(stack.api_url, healthy_ids, failing_id, accepted_at, args))
+        expected = sum(ingest["accepted"] for ingest in ingests[:-1])
+        delivery = wait_for_deliveries(healthy, expected, args.drain_timeout)
+        delivery["delivery_lag_ms"] = percentiles([
+            arrived - accepted_at[seq] for seq, (_, arrived) in healthy.arrivals.items() if seq in accepted_at
+        ])
+        print(f"[{layout}] healthy: {delivery['delivered']}/{expected} delivered, "
+              f"end-to-end lag p50 {delivery['lag_ms']['p50']} ms, p99 {delivery['lag_ms']['p99']} ms, "
+              f"delivery lag p50 {delivery['delivery_lag_ms']['p50']} ms, p99 {delivery['delivery_lag_ms']['p99']} ms; "
+              f"failing receiver saw {failing.stats()['requests']} requests")
+    finally:
+        stack.stop()
+        healthy.stop()
+        failing.stop()
+    print(f"[{layout}] logs in {workdir}")
+    return {
+        "ingest": {"healthy": ingests[:-1], "failing": ingests[-1]},
+        "healthy_delivery": delivery,
+        "failing_receiver": failing.stats()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--layouts", default="split,shared")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of ingest load")
+    parser.add_argument("--healthy-subscriptions", type=int, default=4)
+    parser.add_argument("--healthy-rate", type=float, default=5, help="requests per second per healthy subscription")
+    parser.add_argument("--failing-rate", type=float, default=40, help="requests per second to the failing subscription")
+    parser.add_argument("--latency-ms", type=float, default=20, help="healthy receiver response delay")
+    parser.add_argument("--failing-latency-ms", type=float, default=500, help="delay before the failing receiver's 500")
+    parser.add_argument("--delivery-concurrency", type=int, default=3)
+    parser.add_argument("--retry-concurrency", type=int, default=1)
+    parser.add_argument("--max-in-flight", type=int, default=200)
+    parser.add_argument("--payload-bytes", type=int, default=256)
+    parser.add_argument("--drain-timeout", type=float, default=120, help="seconds to wait for healthy deliveries")
+    parser.add_argument("--database-url")
+    parser.add_argument("--redis-url")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="setting override for the API and workers, repeatable")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    results: Dict[str, dict] = {}
+    for layout in args.layouts.split(","):
+        results[layout] = run_layout(layout, args)
+
+    print(f"{'layout':<8} {'delivery p50 ms':>16} {'delivery p99 ms':>16} {'e2e p99 ms':>12} {'delivered':>10}")
+    for layout, result in results.items():
+        delivery = result["healthy_delivery"]
+        print(f"{layout:<8} {delivery['delivery_lag_ms']['p50']!s:>16} {delivery['delivery_lag_ms']['p99']!s:>16} "
+              f"{delivery['lag_ms']['p99']!s:>12} {delivery['delivered']:>5}/{delivery['expected']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": _git_commit(),
+                "config": {key: value for key, value in vars(args).items() if key != "output"},
+                "layouts": results
+            }, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Ingest throughput benchmark.
+
+Drives POST /webhooks/ingest/{subscription_id} against a running API at a
+fixed number of concurrent clients and reports requests/sec per level.
+
+Run it once against a build of the old sync ingest path and once against the
+current tree, then compare the two result files:
+
+    python -m benchmarks.bench_ingest --subscription-id 1 --label before --output before.json
+    python -m benchmarks.bench_ingest --subscription-id 1 --label after --output after.json
+    python -m benchmarks.bench_ingest --compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import time
+import httpx
+from app.core.security import generate_direct_signature
+
+async def _run_level(client: httpx.AsyncClient, url: str, body: dict, headers: dict, concurrency: int, total: int) -> dict:
+    remaining = total
+    errors = 0
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            response = await client.post(url, json=body, headers=headers)
+            if response.status_code != 202:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(total / elapsed, 1)
+    }
+
+async def run(args) -> dict:
+    payload = {"order_id": "123", "amount": 100}
+    body = {"payload": payload, "event_type": args.event_type}
+    headers = {"X-Hub-Signature-256": "sha256=" + generate_direct_signature(payload, args.secret)}
+    url = f"{args.base_url}/webhooks/ingest/{args.subscription_id}"
+
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    results = []
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        for concurrency in args.concurrency:
+            total = max(args.requests, concurrency)
+            result = await _run_level(client, url, body, headers, concurrency, total)
+            print(f"[{args.label}] {concurrency:>4} clients: {result['requests_per_sec']:>9} req/s ({result['errors']} errors)")
+            results.append(result)
+    return {"label": args.label, "results": results}
+
+def compare(before_path: str, after_path: str):
+    before = json.load(open(before_path))
+    after = json.load(open(after_path))
+    print(f"{'clients':>8} {before['label']:>12} {after['label']:>12} {'speedup':>8}")
+    for old, new in zip(before["results"], after["results"]):
+        speedup = new["requests_per_sec"] / old["requests_per_sec"] if old["requests_per_sec"] else float("inf")
+        print(f"{old['concurrency']:>8} {old['requests_per_sec']:>12} {new['requests_per_sec']:>12} {speedup:>7.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--subscription-id", type=int, default=1)
+    parser.add_argument("--secret", default="Pass123")
+    parser.add_argument("--event-type", default="order.created")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per concurrency level")
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--output")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Ordered-delivery partitioning: balance and movement of the consistent-hash
+ring against plain modulo hashing.
+
+For each partition count change in --changes, reports the share of
+subscriptions that land on a different partition (each of which has to
+drain its old partition before moving) and the spread of subscriptions
+across partitions (largest partition over the mean).
+
+    python -m benchmarks.bench_partitions --subscriptions 100000 --changes 8:9 8:12 16:15
+"""
+import argparse
+from collections import Counter
+from app.core.ordered_queue import partition_for
+
+def modulo(subscription_id: int, partitions: int) -> int:
+    return subscription_id % partitions
+
+def measure(assign, subscription_ids, before: int, after: int) -> dict:
+    moved = sum(assign(i, before) != assign(i, after) for i in subscription_ids)
+    counts = Counter(assign(i, after) for i in subscription_ids)
+    return {
+        "moved": moved / len(subscription_ids),
+        "skew": max(counts.values()) / (len(subscription_ids) / after)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscriptions", type=int, default=100_000)
+    parser.add_argument("--changes", nargs="+", default=["8:9", "8:12", "16:15", "16:32"], metavar="BEFORE:AFTER")
+    args = parser.parse_args()
+
+    subscription_ids = range(1, args.subscriptions + 1)
+    print(f"{'change':>8} {'ideal moved':>12} {'ring moved':>11} {'mod moved':>10} {'ring skew':>10} {'mod skew':>9}")
+    for change in args.changes:
+        before, after = (int(count) for count in change.split(":"))
+        ring = measure(partition_for, subscription_ids, before, after)
+        mod = measure(modulo, subscription_ids, before, after)
+        ideal = abs(after - before) / max(before, after)
+        print(f"{change:>8} {ideal:>12.1%} {ring['moved']:>11.1%} {mod['moved']:>10.1%} "
+              f"{ring['skew']:>10.2f} {mod['skew']:>9.2f}")
+
+if __name__ == "__main__":
+    main()
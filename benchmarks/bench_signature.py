@@ -0,0 +1,74 @@
+"""
+Signature verification microbenchmark across payload sizes.
+
+Compares the two ingest modes on the same request body:
+
+  parsed   json.loads -> WebhookIngestion -> verify_signature, which re-serializes
+           the payload with app.core.codec and signs it for every candidate secret
+  raw      StreamingSignatureVerifier fed the body in 64 KB chunks, then
+           WebhookIngestion.model_validate_json once the signature passes
+
+Both the accept path (valid signature) and the reject path (forged
+signature) are timed; the raw mode rejects without parsing at all.
+
+    python -m benchmarks.bench_signature --sizes 1024 16384 204800 1048576
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import timeit
+from app.core.security import verify_signature, StreamingSignatureVerifier
+from app.schemas.webhook import WebhookIngestion
+
+CHUNK_SIZE = 64 * 1024
+SECRET = "Pass123"
+STORED_SECRET = "salt:" + hashlib.sha256(b"salt" + SECRET.encode()).hexdigest()
+
+def make_payload(size: int) -> dict:
+    item = {"id": "d6740d13-22d6-410a-93e9-6f065c5aa0da", "amount": 100.25, "status": "DELIVERED", "flag": True}
+    per_item = len(json.dumps(item, separators=(',', ':'))) + 1
+    return {"notificationType": "DATA_FETCH_SUCCESS", "items": [item] * max(1, size // per_item)}
+
+def parsed_mode(body: bytes, signature: str) -> bool:
+    webhook = WebhookIngestion(**json.loads(body))
+    return verify_signature(webhook.payload, STORED_SECRET, signature)
+
+def raw_mode(body: bytes, signature: str) -> bool:
+    verifier = StreamingSignatureVerifier(STORED_SECRET)
+    for start in range(0, len(body), CHUNK_SIZE):
+        verifier.update(body[start:start + CHUNK_SIZE])
+    if not verifier.verify(signature):
+        return False
+    WebhookIngestion.model_validate_json(body)
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 16 * 1024, 200 * 1024, 1024 * 1024])
+    parser.add_argument("--seconds", type=float, default=1.0, help="approximate time budget per measurement")
+    args = parser.parse_args()
+
+    print(f"{'payload':>10} {'mode':>7} {'accept us':>11} {'reject us':>11}")
+    for size in args.sizes:
+        payload = make_payload(size)
+        body = json.dumps({"payload": payload, "event_type": "order.created"}, separators=(',', ':')).encode()
+        payload_bytes = json.dumps(payload, separators=(',', ':')).encode()
+        signatures = {
+            "parsed": "sha256=" + hmac.new(SECRET.encode(), payload_bytes, hashlib.sha256).hexdigest(),
+            "raw": "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+        }
+        forged = "sha256=" + "0" * 64
+
+        for name, mode in (("parsed", parsed_mode), ("raw", raw_mode)):
+            assert mode(body, signatures[name]) and not mode(body, forged)
+            timings = []
+            for signature in (signatures[name], forged):
+                timer = timeit.Timer(lambda: mode(body, signature))
+                number, _ = timer.autorange()
+                runs = max(1, int(number * args.seconds / 0.2))
+                timings.append(min(timer.repeat(3, runs)) / runs * 1e6)
+            print(f"{len(body):>10} {name:>7} {timings[0]:>11.1f} {timings[1]:>11.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Configurable stand-in webhook receiver for benchmarks.
+
+Answers every POST after --latency-ms (plus up to --jitter-ms), fails a
+--error-rate fraction with 500, and answers a --slow-loris-rate fraction by
+sending headers at once and then trickling the body out over
+--slow-loris-seconds. Records when each benchmark delivery arrived so the
+harness can work out end-to-end lag.
+
+    python -m benchmarks.receiver --port 9000 --latency-ms 50 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+class Receiver:
+    def __init__(
+        self,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        error_rate: float = 0,
+        slow_loris_rate: float = 0,
+        slow_loris_seconds: float = 5,
+        host: str = "127.0.0.1",
+        port: int = 0
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.slow_loris_rate = slow_loris_rate
+        self.slow_loris_seconds = slow_loris_seconds
+        self.requests = 0
+        self.failed = 0
+        self.slow = 0
+        # bench sequence number -> (sent_at from the payload, wall-clock arrival)
+        self.arrivals: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+        self._server = self._make_server(host, port)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/hook"
+
+    def _make_server(self, host: str, port: int) -> ThreadingHTTPServer:
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                arrived = time.time()
+                delay = receiver.latency_ms + random.uniform(0, receiver.jitter_ms)
+                if delay:
+                    time.sleep(delay / 1000)
+
+                roll = random.random()
+                if roll < receiver.error_rate:
+                    receiver._record_failure()
+                    self._respond(500, b"error")
+                    return
+                slow = roll < receiver.error_rate + receiver.slow_loris_rate
+                receiver._record_delivery(body, arrived, slow)
+                if slow:
+                    self._trickle(b"ok" * 16)
+                else:
+                    self._respond(200, b"ok")
+
+            def _respond(self, code: int, content: bytes):
+                self.send_response(code)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def _trickle(self, content: bytes):
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                pause = receiver.slow_loris_seconds / len(content)
+                for i in range(len(content)):
+                    self.wfile.write(content[i:i + 1])
+                    self.wfile.flush()
+                    time.sleep(pause)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 1024
+
+        return Server((host, port), Handler)
+
+    def _record_failure(self):
+        with self._lock:
+            self.requests += 1
+            self.failed += 1
+
+    def _record_delivery(self, body: bytes, arrived: float, slow: bool):
+        try:
+            payload = json.loads(body)
+            seq = payload["bench_seq"]
+        except (ValueError, KeyError, TypeError):
+            seq = None
+        with self._lock:
+            self.requests += 1
+            self.slow += slow
+            # Retries of an already delivered payload keep the first arrival
+            if seq is not None:
+                self.arrivals.setdefault(seq, (payload.get("bench_sent_at"), arrived))
+
+    def start(self) -> "Receiver":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "failed": self.failed,
+                "slow_loris": self.slow,
+                "delivered": len(self.arrivals)
+            }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--slow-loris-rate", type=float, default=0)
+    parser.add_argument("--slow-loris-seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    receiver = Receiver(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        slow_loris_rate=args.slow_loris_rate,
+        slow_loris_seconds=args.slow_loris_seconds,
+        host=args.host,
+        port=args.port
+    ).start()
+    print(f"Receiving on {receiver.url}")
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(receiver.stats()))
+    except KeyboardInterrupt:
+        receiver.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Payload store, delivery query indexes, attempt timing, batching and rate limits
+
+Every step checks what already exists, because databases created by
+init_db between the baseline and this revision have some of it already.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+SUBSCRIPTION_COLUMNS = [
+    sa.Column("batch_max_size", sa.Integer(), nullable=True),
+    sa.Column("batch_max_bytes", sa.Integer(), nullable=True),
+    sa.Column("batch_linger_ms", sa.Integer(), nullable=True),
+    sa.Column("rate_limit_per_second", sa.Float(), nullable=True),
+    sa.Column("rate_limit_burst", sa.Integer(), nullable=True),
+]
+
+DELIVERY_INDEXES = {
+    "ix_webhook_deliveries_payload_hash": ["payload_hash"],
+    "ix_webhook_deliveries_next_retry": ["next_retry"],
+    "ix_webhook_deliveries_subscription_created": ["subscription_id", "created_at", "id"],
+    "ix_webhook_deliveries_status_created": ["status", "created_at", "id"],
+    "ix_webhook_deliveries_created": ["created_at", "id"],
+}
+
+def _columns(inspector, table: str) -> set:
+    return {column["name"] for column in inspector.get_columns(table)}
+
+def _indexes(inspector, table: str) -> set:
+    return {index["name"] for index in inspector.get_indexes(table)}
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    
+    if "webhook_payloads" not in inspector.get_table_names():
+        op.create_table(
+            "webhook_payloads",
+            sa.Column("hash", sa.String(64), primary_key=True),
+            sa.Column("encoding", sa.String(16), nullable=False),
+            sa.Column("size", sa.Integer(), nullable=False),
+            sa.Column("data", sa.LargeBinary(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+    
+    delivery_columns = _columns(inspector, "webhook_deliveries")
+    with op.batch_alter_table("webhook_deliveries") as batch:
+        batch.alter_column("payload", existing_type=sa.JSON(), nullable=True)
+        if "payload_hash" not in delivery_columns:
+            batch.add_column(sa.Column("payload_hash", sa.String(64), nullable=True))
+            batch.create_foreign_key("fk_webhook_deliveries_payload_hash", "webhook_payloads", ["payload_hash"], ["hash"])
+    
+    existing = _indexes(sa.inspect(op.get_bind()), "webhook_deliveries")
+    for name, columns in DELIVERY_INDEXES.items():
+        if name not in existing:
+            op.create_index(name, "webhook_deliveries", columns)
+    
+    if "duration_ms" not in _columns(inspector, "delivery_attempts"):
+        op.add_column("delivery_attempts", sa.Column("duration_ms", sa.Integer(), nullable=True))
+    if "ix_delivery_attempts_delivery_id" not in _indexes(inspector, "delivery_attempts"):
+        op.create_index("ix_delivery_attempts_delivery_id", "delivery_attempts", ["delivery_id"])
+    
+    subscription_columns = _columns(inspector, "subscriptions")
+    for column in SUBSCRIPTION_COLUMNS:
+        if column.name not in subscription_columns:
+            op.add_column("subscriptions", column.copy())
+
+def downgrade():
+    for column in reversed(SUBSCRIPTION_COLUMNS):
+        op.drop_column("subscriptions", column.name)
+    op.drop_index("ix_delivery_attempts_delivery_id", table_name="delivery_attempts")
+    op.drop_column("delivery_attempts", "duration_ms")
+    for name in reversed(list(DELIVERY_INDEXES)):
+        op.drop_index(name, table_name="webhook_deliveries")
+    with op.batch_alter_table("webhook_deliveries") as batch:
+        batch.drop_constraint("fk_webhook_deliveries_payload_hash", type_="foreignkey")
+        batch.drop_column("payload_hash")
+    op.drop_table("webhook_payloads")
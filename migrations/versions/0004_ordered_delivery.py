@@ -0,0 +1,21 @@
+"""Per-subscription ordered delivery flag
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table("subscriptions") as batch:
+        batch.add_column(sa.Column("ordered", sa.Boolean(), nullable=False, server_default=sa.false()))
+
+def downgrade():
+    with op.batch_alter_table("subscriptions") as batch:
+        batch.drop_column("ordered")
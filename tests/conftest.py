@@ -0,0 +1,112 @@
+"""
+Shared fixtures. The suite needs no running services: Redis is fakeredis
+(with Lua, so the scripts run for real) and the database is a SQLite file in
+a temporary directory. Both are wired in before any app module is imported,
+because those create their clients at import time.
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='webhook-tests-')}/test.db"
+
+import fakeredis
+import redis
+import redis.asyncio
+
+_server = fakeredis.FakeServer()
+
+class _FakeRedis(fakeredis.FakeRedis):
+    def __init__(self, *args, host=None, port=None, **kwargs):
+        super().__init__(*args, server=_server, **kwargs)
+
+class _FakeAsyncRedis(fakeredis.FakeAsyncRedis):
+    def __init__(self, *args, host=None, port=None, **kwargs):
+        super().__init__(*args, server=_server, **kwargs)
+
+redis.Redis = redis.StrictRedis = _FakeRedis
+redis.asyncio.Redis = redis.asyncio.StrictRedis = _FakeAsyncRedis
+
+import pytest
+from app.config import settings
+
+class Clock:
+    """Stands in for the time module in code under test"""
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+@pytest.fixture(autouse=True)
+def redis_client():
+    from app.core.cache import redis_client, async_redis_client, local_cache
+    redis_client.flushall()
+    local_cache.clear()
+    yield redis_client
+    # Async connections belong to the event loop of the test that opened them
+    async_redis_client.connection_pool.reset()
+
+@pytest.fixture
+def config(monkeypatch):
+    """Override settings for one test: config(NAME=value, ...)"""
+    def override(**values):
+        for name, value in values.items():
+            monkeypatch.setattr(settings, name, value)
+    return override
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A controllable clock; pass it the modules whose time.time() it replaces"""
+    fake = Clock()
+    def install(*modules):
+        for module in modules:
+            monkeypatch.setattr(module, "time", fake)
+        return fake
+    return install
+
+@pytest.fixture
+def db():
+    from app.database import Base, SessionLocal, engine
+    from app.core.db_init import create_schema
+    with engine.begin() as conn:
+        create_schema(conn, partitioned=False)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def subscription(db):
+    from app.models.subscription import Subscription
+    subscription = Subscription(target_url="http://receiver.test/hook", secret_key="x")
+    db.add(subscription)
+    db.commit()
+    return {"id": subscription.id}
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    """(delivery id, payload hash, subscription) tuples the group-commit buffer enqueued"""
+    from app.core import ingest_buffer
+    enqueued = []
+    async def enqueue(deliveries):
+        enqueued.extend(deliveries)
+    monkeypatch.setattr(ingest_buffer, "enqueue_new_deliveries_async", enqueue)
+    return enqueued
+
+@pytest.fixture
+async def buffer(enqueued):
+    from app.core import ingest_buffer
+    from app.database import async_engine
+    yield ingest_buffer.DeliveryWriteBuffer(max_rows=10, max_delay_ms=20)
+    await async_engine.dispose()
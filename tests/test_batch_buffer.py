@@ -0,0 +1,31 @@
+import pytest
+from app.core import batch_buffer, retry_scheduler
+
+@pytest.fixture
+def now(clock):
+    return clock(batch_buffer, retry_scheduler)
+
+def test_first_delivery_sets_the_flush_time(now):
+    assert batch_buffer.add_to_batch(1, [10, 11], linger_seconds=5) == 2
+    now.advance(4)
+    assert batch_buffer.add_to_batch(1, [12], linger_seconds=5) == 3
+    assert batch_buffer.pop_due_batches(10) == []
+    now.advance(1)
+    assert batch_buffer.pop_due_batches(10) == [1]
+    assert batch_buffer.pop_due_batches(10) == []
+
+def test_take_reschedules_leftovers(now, redis_client):
+    batch_buffer.add_to_batch(1, [10, 11, 12], linger_seconds=5)
+    assert batch_buffer.take_batch(1, 2, linger_seconds=5) == [10, 11]
+    assert redis_client.zscore(batch_buffer.BATCH_DUE_KEY, "1") == now.now + 5
+    assert batch_buffer.take_batch(1, 2, linger_seconds=5) == [12]
+    assert redis_client.zscore(batch_buffer.BATCH_DUE_KEY, "1") is None
+
+def test_retries_pop_once_when_due(now):
+    retry_scheduler.schedule_retry(1, 10)
+    retry_scheduler.schedule_retries([2, 3])
+    retry_scheduler.schedule_retries([1], delay_seconds=0, only_new=True)  # keeps the due time of 1
+    assert sorted(retry_scheduler.pop_due_retries(10)) == [2, 3]
+    now.advance(10)
+    assert retry_scheduler.pop_due_retries(10) == [1]
+    assert retry_scheduler.pending_retry_count() == 0
@@ -0,0 +1,65 @@
+import pytest
+from app.core import circuit_breaker
+
+HOST = "receiver.example.com"
+
+@pytest.fixture
+def now(clock, config):
+    config(
+        BREAKER_FAILURE_THRESHOLD=2,
+        BREAKER_OPEN_SECONDS=30,
+        BREAKER_HALF_OPEN_PROBES=1,
+        HOST_LEASE_SECONDS=60,
+        HOST_MAX_IN_FLIGHT=10
+    )
+    return clock(circuit_breaker)
+
+def _fail(times: int):
+    for _ in range(times):
+        lease, _ = circuit_breaker.acquire(HOST)
+        circuit_breaker.release(HOST, lease, False)
+
+def _half_open(now) -> str:
+    _fail(2)
+    now.advance(31)
+    lease, state = circuit_breaker.acquire(HOST)
+    assert (lease is not None, state) == (True, "half_open")
+    return lease
+
+def test_opens_after_threshold_and_defers(now):
+    _fail(2)
+    lease, state = circuit_breaker.acquire(HOST)
+    assert lease is None and state == "open"
+    assert circuit_breaker.get_destination_state(HOST)["deferred"] == 1
+
+def test_half_open_allows_only_the_probe_budget(now):
+    _half_open(now)
+    assert circuit_breaker.acquire(HOST) == (None, "half_open")
+
+def test_probe_released_without_outcome_is_given_back(now):
+    probe = _half_open(now)
+    circuit_breaker.release(HOST, probe, None)
+    lease, state = circuit_breaker.acquire(HOST)
+    assert lease is not None and state == "half_open"
+
+def test_expired_probe_lease_is_given_back(now):
+    _half_open(now)
+    now.advance(61)
+    lease, state = circuit_breaker.acquire(HOST)
+    assert lease is not None and state == "half_open"
+
+def test_probe_success_closes(now):
+    circuit_breaker.release(HOST, _half_open(now), True)
+    state = circuit_breaker.get_destination_state(HOST)
+    assert (state["state"], state["consecutive_failures"]) == ("closed", 0)
+
+def test_probe_failure_reopens(now):
+    circuit_breaker.release(HOST, _half_open(now), False)
+    assert circuit_breaker.acquire(HOST) == (None, "open")
+
+def test_in_flight_cap(now, config):
+    config(HOST_MAX_IN_FLIGHT=1)
+    first, _ = circuit_breaker.acquire(HOST)
+    assert circuit_breaker.acquire(HOST) == (None, "busy")
+    circuit_breaker.release(HOST, first, True)
+    assert circuit_breaker.acquire(HOST)[0] is not None
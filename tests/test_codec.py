@@ -0,0 +1,42 @@
+import json
+import pytest
+from app.core import codec
+
+VALUES = [
+    {"name": "Zoë", "emoji": "🚀", "nested": {"list": [1, 2.5, None, True]}},
+    {"big": 2 ** 70},
+    [],
+    "plain",
+]
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(codec, "_orjson", None)
+    elif codec.orjson is None:
+        pytest.skip("orjson is not installed")
+    else:
+        monkeypatch.setattr(codec, "_orjson", codec.orjson)
+    return request.param
+
+@pytest.mark.parametrize("value", VALUES)
+def test_backends_write_the_same_bytes(backend, value):
+    expected = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    assert codec.dumps(value) == expected
+    assert codec.loads(codec.dumps(value)) == value
+
+def test_legacy_form_escapes_non_ascii():
+    assert codec.dumps_legacy({"a": "é"}) == b'{"a":"\\u00e9"}'
+    assert codec.loads(codec.dumps_legacy({"a": "é"})) == {"a": "é"}
+
+def test_loads_with_raw_keeps_the_senders_bytes():
+    data = b' { "event_type" : "a", "payload" : {"x": 1.0,  "y": "\\u00e9"} } '
+    members, raw = codec.loads_with_raw(data, "payload")
+    assert members == {"event_type": "a", "payload": {"x": 1.0, "y": "é"}}
+    assert raw == b'{"x": 1.0,  "y": "\\u00e9"}'
+    assert codec.loads_with_raw(b"{}", "payload") == ({}, None)
+
+@pytest.mark.parametrize("data", [b"[1]", b'{"a":1', b'{"a":1} x', b'{"a" 1}', b'{"a":1,}'])
+def test_loads_with_raw_rejects_anything_but_one_object(data):
+    with pytest.raises(ValueError):
+        codec.loads_with_raw(data, "payload")
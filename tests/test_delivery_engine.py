@@ -0,0 +1,50 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from app.core.delivery_engine import DeliveryEngine
+
+class Receiver(BaseHTTPRequestHandler):
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/moved":
+            self.send_response(307)
+            self.send_header("Location", "/ok")
+        else:
+            Receiver.received.append((self.path, body))
+            self.send_response(500 if self.path == "/fail" else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture(scope="module")
+def receiver():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Receiver)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+@pytest.fixture
+def engine():
+    engine = DeliveryEngine()
+    yield engine
+    engine.close()
+
+def test_one_bad_url_fails_only_its_own_delivery(receiver, engine):
+    ok, bad, failing = engine.send_many([
+        (f"{receiver}/ok", b"{}"),
+        ("http://bad\x00host/", b"{}"),
+        (f"{receiver}/fail", b"{}")
+    ])
+    assert ok.succeeded and ok.status_code == 200
+    assert not bad.succeeded and bad.status_code is None and bad.error
+    assert not failing.succeeded and failing.status_code == 500
+
+def test_redirects_are_followed_to_the_final_response(receiver, engine):
+    Receiver.received.clear()
+    result, = engine.send_many([(f"{receiver}/moved", b'{"a":1}')])
+    assert result.succeeded and result.status_code == 200
+    assert Receiver.received == [("/ok", b'{"a":1}')]
@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.api.events import publish_event
+from app.core import event_index
+from app.models.subscription import Subscription
+from app.schemas.webhook import EventPublish
+
+def _subscribe(db, event_types=None, is_active=True) -> Subscription:
+    subscription = Subscription(target_url="http://receiver.test/hook", secret_key="x", event_types=event_types, is_active=is_active)
+    db.add(subscription)
+    db.commit()
+    return subscription
+
+def _members(redis_client, event_type: str):
+    return sorted(int(member) for member in redis_client.sunion(event_index._type_key(event_type), event_index.ALL_EVENTS_KEY))
+
+def test_rebuild_indexes_active_subscriptions(db, redis_client):
+    typed = _subscribe(db, ["order.created"])
+    everything = _subscribe(db)
+    _subscribe(db, ["order.created"], is_active=False)
+    redis_client.sadd(event_index._type_key("order.created"), 999)
+    event_index.rebuild_event_index()
+    assert _members(redis_client, "order.created") == [typed.id, everything.id]
+    assert redis_client.exists(event_index.READY_KEY)
+
+def test_rebuild_starts_over_when_a_move_lands_after_its_snapshot(db, redis_client, monkeypatch):
+    snapshot = event_index._snapshot
+    late = []
+    def racing_snapshot():
+        members = snapshot()
+        if not late:
+            late.append(_subscribe(db, ["order.paid"]))
+            event_index.index_subscription(late[0])
+        return members
+    monkeypatch.setattr(event_index, "_snapshot", racing_snapshot)
+    event_index.rebuild_event_index()
+    assert _members(redis_client, "order.paid") == [late[0].id]
+
+def test_move_keeps_membership_in_step(db, redis_client):
+    subscription = _subscribe(db, ["a", "b"])
+    event_index.index_subscription(subscription)
+    subscription.event_types = ["b", "c"]
+    event_index.index_subscription(subscription)
+    assert [_members(redis_client, event_type) for event_type in "abc"] == [[], [subscription.id], [subscription.id]]
+    event_index.remove_subscription(subscription.id)
+    assert not redis_client.exists(event_index._membership_key(subscription.id))
+    assert _members(redis_client, "b") == []
+
+@pytest.mark.anyio
+async def test_missing_index_is_rebuilt_once(db, monkeypatch):
+    _subscribe(db, ["order.created"])
+    rebuilds = []
+    rebuild = event_index.rebuild_event_index
+    def counted():
+        rebuilds.append(1)
+        rebuild()
+    monkeypatch.setattr(event_index, "rebuild_event_index", counted)
+    results = await asyncio.gather(*(event_index.subscribers_for_event("order.created") for _ in range(5)))
+    assert len(rebuilds) == 1 and all(len(ids) == 1 for ids in results)
+
+@pytest.mark.anyio
+async def test_publishing_needs_the_signing_secret(config):
+    config(EVENTS_SIGNING_SECRET=None)
+    with pytest.raises(HTTPException) as refused:
+        await publish_event("order.created", EventPublish(payload={"a": 1}), None, None)
+    assert refused.value.status_code == 503
@@ -0,0 +1,22 @@
+from app.core import fair_queue
+
+QUEUE = "webhooks"
+
+def test_subscriptions_take_turns():
+    fair_queue.push(QUEUE, {1: [{"n": n} for n in range(5)], 2: [{"n": 10}]})
+    assert fair_queue.backlog(QUEUE) == (6, 2)
+    assert fair_queue.pop(QUEUE, 2) == (1, [{"n": 0}, {"n": 1}])
+    assert fair_queue.pop(QUEUE, 2) == (2, [{"n": 10}])
+    assert fair_queue.pop(QUEUE, 2) == (1, [{"n": 2}, {"n": 3}])
+    assert fair_queue.backlog(QUEUE) == (1, 1)
+
+def test_push_behind_waiting_subscription_keeps_one_ring_entry():
+    fair_queue.push(QUEUE, {1: [{"n": 0}]})
+    fair_queue.push(QUEUE, {1: [{"n": 1}], 2: []})
+    assert fair_queue.backlog(QUEUE) == (2, 1)
+    assert fair_queue.pop(QUEUE, 10) == (1, [{"n": 0}, {"n": 1}])
+    assert fair_queue.pop(QUEUE, 10) == (None, [])
+    assert fair_queue.backlog(QUEUE) == (0, 0)
+
+def test_turns_needed():
+    assert [fair_queue.turns_needed(count, 10) for count in (1, 10, 11)] == [1, 1, 2]
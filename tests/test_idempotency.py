@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from app.core import idempotency, ingest_buffer
+from app.models.webhook import WebhookDelivery
+
+pytestmark = pytest.mark.anyio
+
+KEY = "idempotency:1:key:abc"
+
+def test_payload_key_without_event_type(config):
+    config(IDEMPOTENCY_DERIVED_TTL_SECONDS=300)
+    key, ttl = idempotency.scoped_key(1, None, None, b'{"a":1}')
+    assert key.startswith("idempotency:1:hash:") and ttl == 300
+
+async def test_claim_is_short_lived_until_completed(redis_client, config):
+    config(IDEMPOTENCY_PENDING_TTL_SECONDS=60)
+    assert await idempotency.claim(KEY) is None
+    assert redis_client.get(KEY) == idempotency.PENDING and redis_client.ttl(KEY) <= 60
+    await idempotency.complete(KEY, 42, 86400)
+    assert redis_client.ttl(KEY) > 60
+    assert await idempotency.claim(KEY) == 42
+
+async def test_pending_claim_blocks_then_expires(redis_client, config):
+    config(IDEMPOTENCY_WAIT_SECONDS=0.1)
+    await idempotency.claim(KEY)
+    with pytest.raises(idempotency.IdempotencyKeyInUse):
+        await idempotency.claim(KEY)
+    redis_client.delete(KEY)  # as if the owner's claim expired
+    assert await idempotency.claim(KEY) is None
+
+def _row(subscription):
+    return {"subscription_id": subscription["id"], "payload": b'{"a":1}', "event_type": "order.created", "status": "PENDING"}
+
+async def test_group_commit_completes_the_claim_of_a_cancelled_caller(db, subscription, buffer, redis_client):
+    await idempotency.claim(KEY)
+    caller = asyncio.ensure_future(buffer.submit(_row(subscription), subscription, (KEY, 86400)))
+    await asyncio.sleep(0)
+    caller.cancel()
+    await asyncio.sleep(0.2)
+    delivery_ids = [delivery_id for delivery_id, in db.query(WebhookDelivery.id)]
+    assert len(delivery_ids) == 1
+    assert await idempotency.claim(KEY) == delivery_ids[0]
+
+async def test_group_commit_releases_the_claim_when_the_insert_fails(subscription, buffer, redis_client, monkeypatch):
+    async def failing_insert(rows, db):
+        raise RuntimeError("database unavailable")
+    monkeypatch.setattr(ingest_buffer, "insert_deliveries", failing_insert)
+    await idempotency.claim(KEY)
+    with pytest.raises(RuntimeError):
+        await buffer.submit(_row(subscription), subscription, (KEY, 86400))
+    assert redis_client.get(KEY) is None
@@ -0,0 +1,33 @@
+import asyncio
+import pytest
+from app.models.webhook import WebhookDelivery
+
+pytestmark = pytest.mark.anyio
+
+def _row(subscription, n):
+    return {"subscription_id": subscription["id"], "payload": b'{"n":%d}' % n, "event_type": "order.created", "status": "PENDING"}
+
+async def test_concurrent_submits_share_one_flush(db, subscription, buffer, enqueued, monkeypatch):
+    flushes = []
+    flush = buffer._flush
+    async def counting_flush(batch):
+        flushes.append(len(batch))
+        await flush(batch)
+    monkeypatch.setattr(buffer, "_flush", counting_flush)
+    delivery_ids = await asyncio.gather(*(buffer.submit(_row(subscription, n), subscription) for n in range(5)))
+    assert flushes == [5]
+    assert len(set(delivery_ids)) == 5
+    assert [delivery_id for delivery_id, _, _ in enqueued] == delivery_ids
+    stored = dict(db.query(WebhookDelivery.id, WebhookDelivery.payload_hash))
+    assert [stored[delivery_id] for delivery_id in delivery_ids] == [payload_hash for _, payload_hash, _ in enqueued]
+
+async def test_batch_is_cut_at_max_rows(db, subscription, buffer, monkeypatch):
+    buffer.max_rows, buffer.max_delay = 2, 1.0
+    flushes = []
+    flush = buffer._flush
+    async def counting_flush(batch):
+        flushes.append(len(batch))
+        await flush(batch)
+    monkeypatch.setattr(buffer, "_flush", counting_flush)
+    await asyncio.wait_for(asyncio.gather(*(buffer.submit(_row(subscription, n), subscription) for n in range(4))), 0.5)
+    assert flushes == [2, 2]
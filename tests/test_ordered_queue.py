@@ -0,0 +1,57 @@
+import pytest
+from app.core import ordered_queue
+
+@pytest.fixture
+def now(clock, config):
+    config(ORDERED_PARTITIONS=4)
+    return clock(ordered_queue)
+
+def test_head_blocks_its_subscription_until_settled(now):
+    partition, = ordered_queue.push({7: [101, 102]})
+    assert ordered_queue.ready_heads(partition, 10) == [(7, 101)]
+    ordered_queue.advance(partition, [(7, 101, 30)])
+    assert ordered_queue.ready_heads(partition, 10) == []
+    now.advance(31)
+    assert ordered_queue.ready_heads(partition, 10) == [(7, 101)]
+    ordered_queue.advance(partition, [(7, 101, None)])
+    assert ordered_queue.ready_heads(partition, 10) == [(7, 102)]
+
+def test_draining_forgets_the_subscription(now, redis_client):
+    partition, = ordered_queue.push({7: [101]})
+    assert ordered_queue.active_partitions() == [partition]
+    ordered_queue.advance(partition, [(7, 101, None)])
+    assert ordered_queue.active_partitions() == []
+    assert ordered_queue.backlog() == {}
+    assert redis_client.get(ordered_queue.PENDING_KEY) == "0"
+    assert not redis_client.exists(ordered_queue.HOME_KEY.format(subscription_id=7))
+
+def test_stale_outcome_does_not_drop_the_new_head(now):
+    partition, = ordered_queue.push({7: [101, 102]})
+    ordered_queue.advance(partition, [(7, 101, None)])
+    ordered_queue.advance(partition, [(7, 101, None)])  # replayed by a second consumer
+    assert ordered_queue.ready_heads(partition, 10) == [(7, 102)]
+
+def test_moved_subscription_stays_home_until_drained(now, config):
+    home, = ordered_queue.push({4: [101]})
+    assert ordered_queue.partition_for(4, 8) != home
+    config(ORDERED_PARTITIONS=8)
+    assert ordered_queue.push({4: [102]}) == [home]
+    assert ordered_queue.ready_heads(home, 10) == [(4, 101)]
+    ordered_queue.advance(home, [(4, 101, None), (4, 102, None)])
+    assert ordered_queue.push({4: [103]}) == [ordered_queue.partition_for(4, 8)]
+
+def test_lease_is_exclusive_and_token_checked(now):
+    token = ordered_queue.acquire(3)
+    assert token and ordered_queue.acquire(3) is None
+    assert not ordered_queue.renew(3, "someone-else")
+    ordered_queue.release(3, "someone-else")
+    assert ordered_queue.is_draining(3)
+    assert ordered_queue.renew(3, token)
+    ordered_queue.release(3, token)
+    assert not ordered_queue.is_draining(3)
+
+def test_due_partitions_skip_leased(now):
+    partition, = ordered_queue.push({7: [101]})
+    assert ordered_queue.due_partitions() == [partition]
+    ordered_queue.acquire(partition)
+    assert ordered_queue.due_partitions() == []
@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app.core import delivery_store
+from app.core.payload_store import delete_orphaned_payloads, payload_row
+from app.database import AsyncSessionLocal, async_engine
+from app.models.subscription import Subscription
+from app.models.webhook import WebhookDelivery, WebhookPayload
+
+@pytest.fixture
+def subscription(db):
+    subscription = Subscription(target_url="http://receiver.test/hook", secret_key="x")
+    db.add(subscription)
+    db.commit()
+    return subscription
+
+def test_sweep_deletes_only_unreferenced_payloads(db, subscription):
+    kept, orphan = payload_row(b'{"a":1}'), payload_row(b'{"b":2}')
+    db.add_all([WebhookPayload(**kept), WebhookPayload(**orphan)])
+    db.add(WebhookDelivery(subscription_id=subscription.id, payload_hash=kept["hash"], event_type="e", status="PENDING"))
+    db.commit()
+    assert delete_orphaned_payloads(db, batch_size=1) == 1
+    assert [payload_hash for payload_hash, in db.query(WebhookPayload.hash)] == [kept["hash"]]
+
+@pytest.mark.anyio
+async def test_insert_retries_when_its_reused_payload_was_swept(db, subscription, monkeypatch):
+    failures = []
+    async with AsyncSessionLocal() as session:
+        execute = session.execute
+        async def execute_once_swept(statement, *args, **kwargs):
+            # The first delivery INSERT finds its payload gone, as if swept in between
+            if args and not failures:
+                failures.append(statement)
+                raise IntegrityError(str(statement), None, Exception("FOREIGN KEY constraint failed"))
+            return await execute(statement, *args, **kwargs)
+        monkeypatch.setattr(session, "execute", execute_once_swept)
+        row = {"subscription_id": subscription.id, "payload": b'{"a":1}', "event_type": "e", "status": "PENDING"}
+        (delivery_id, payload_hash), = await delivery_store.insert_deliveries([row], session)
+    await async_engine.dispose()
+    assert len(failures) == 1
+    assert db.get(WebhookDelivery, delivery_id).payload_hash == payload_hash
+    assert db.get(WebhookPayload, payload_hash) is not None
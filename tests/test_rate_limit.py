@@ -0,0 +1,34 @@
+import pytest
+from app.core import rate_limit
+
+pytestmark = pytest.mark.anyio
+
+# Slow enough that the bucket does not noticeably refill during a test
+LIMITED = {"id": 1, "rate_limit_per_second": 0.001, "rate_limit_burst": 3}
+UNLIMITED = {"id": 2, "rate_limit_per_second": None, "rate_limit_burst": None}
+
+async def test_whole_cost_is_admitted_until_the_bucket_is_empty():
+    for _ in range(3):
+        assert await rate_limit.take_tokens(LIMITED) == 1
+    with pytest.raises(rate_limit.LimitExceeded) as refused:
+        await rate_limit.take_tokens(LIMITED)
+    assert refused.value.reason == "rate_limit" and refused.value.retry_after > 0
+
+async def test_cost_above_burst_is_refused():
+    with pytest.raises(rate_limit.LimitExceeded):
+        await rate_limit.take_tokens(LIMITED, 10)
+    assert await rate_limit.take_tokens(LIMITED, 3) == 3
+
+async def test_partial_admits_only_what_the_bucket_holds():
+    assert await rate_limit.take_tokens(LIMITED, 1000, partial=True) == 3
+    with pytest.raises(rate_limit.LimitExceeded):
+        await rate_limit.take_tokens(LIMITED, 1000, partial=True)
+
+async def test_unlimited_subscriptions_are_not_charged():
+    assert await rate_limit.take_tokens(UNLIMITED, 1000) == 1000
+
+async def test_each_subscription_is_charged_separately():
+    other = dict(LIMITED, id=3, rate_limit_burst=1)
+    assert await rate_limit.take_tokens_each([LIMITED, other, UNLIMITED]) == [None, None, None]
+    waits = await rate_limit.take_tokens_each([LIMITED, other, UNLIMITED])
+    assert waits[0] is None and waits[1] > 0 and waits[2] is None
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+import pytest
+from app.models.subscription import Subscription
+from app.models.webhook import WebhookDelivery
+from app.core import broker
+from app.core.retry_scheduler import RETRY_SCHEDULE_KEY, schedule_retries
+from app.tasks import webhook_tasks
+
+@pytest.fixture
+def subscription(db):
+    subscription = Subscription(target_url="http://receiver.test/hook", secret_key="x", event_types=["order.created"])
+    db.add(subscription)
+    db.commit()
+    return subscription
+
+@pytest.fixture
+def add_delivery(db, subscription):
+    def add(status: str, age: float, next_retry_age=None, subscription_id=None, **fields) -> int:
+        now = datetime.utcnow()
+        delivery = WebhookDelivery(
+            subscription_id=subscription_id or subscription.id,
+            payload={"n": 1},
+            event_type="order.created",
+            status=status,
+            created_at=now - timedelta(seconds=age),
+            next_retry=None if next_retry_age is None else now - timedelta(seconds=next_retry_age),
+            **fields
+        )
+        db.add(delivery)
+        db.commit()
+        return delivery.id
+    return add
+
+def _statuses(db, *delivery_ids):
+    db.expire_all()
+    return [db.get(WebhookDelivery, delivery_id).status for delivery_id in delivery_ids]
+
+def _scheduled(redis_client):
+    return {int(member) for member in redis_client.zrange(RETRY_SCHEDULE_KEY, 0, -1)}
+
+def test_recovers_rows_whose_message_was_lost(db, add_delivery, redis_client, config):
+    config(RETRY_RECOVERY_GRACE_SECONDS=300)
+    released = add_delivery("QUEUED", 900, next_retry_age=600, attempt_count=1)
+    first = add_delivery("PENDING", 600)
+    sending = add_delivery("IN_PROGRESS", 600, last_attempt=datetime.utcnow() - timedelta(seconds=400))
+    webhook_tasks.recover_stranded_retries()
+    assert _statuses(db, released, first, sending) == ["PENDING_RETRY"] * 3
+    assert _scheduled(redis_client) == {released, first, sending}
+
+def test_leaves_recent_and_settled_rows_alone(db, add_delivery, redis_client, config):
+    config(RETRY_RECOVERY_GRACE_SECONDS=300)
+    released = add_delivery("QUEUED", 900, next_retry_age=10)
+    deferred = add_delivery("PENDING", 900, next_retry_age=-10)
+    fresh = add_delivery("PENDING", 10)
+    done = add_delivery("COMPLETED", 900)
+    webhook_tasks.recover_stranded_retries()
+    assert _statuses(db, released, deferred, fresh, done) == ["QUEUED", "PENDING", "PENDING", "COMPLETED"]
+    assert _scheduled(redis_client) == set()
+
+def test_skips_ordered_subscriptions(db, add_delivery, redis_client):
+    ordered = Subscription(target_url="http://receiver.test/hook", secret_key="x", ordered=True)
+    db.add(ordered)
+    db.commit()
+    waiting = add_delivery("PENDING", 3600, subscription_id=ordered.id)
+    webhook_tasks.recover_stranded_retries()
+    assert _statuses(db, waiting) == ["PENDING"]
+
+def test_reindexes_overdue_retries_keeping_existing_entries(db, add_delivery, redis_client):
+    lost = add_delivery("PENDING_RETRY", 3600, next_retry_age=3000)
+    kept = add_delivery("PENDING_RETRY", 3600, next_retry_age=3000)
+    redis_client.zadd(RETRY_SCHEDULE_KEY, {str(kept): 1})
+    webhook_tasks.recover_stranded_retries()
+    assert _scheduled(redis_client) == {lost, kept}
+    assert redis_client.zscore(RETRY_SCHEDULE_KEY, str(kept)) == 1
+
+def test_release_marks_rows_queued(db, add_delivery, monkeypatch):
+    sent = []
+    monkeypatch.setattr(broker, "enqueue_deliveries", lambda rows, queue: sent.extend(rows))
+    due = add_delivery("PENDING_RETRY", 60, next_retry_age=5, attempt_count=1)
+    done = add_delivery("COMPLETED", 60)
+    schedule_retries([due, done])
+    webhook_tasks.release_due_retries()
+    assert [delivery_id for delivery_id, _ in sent] == [due]
+    assert _statuses(db, due, done) == ["QUEUED", "COMPLETED"]
+
+def test_release_puts_rows_back_when_publishing_fails(db, add_delivery, redis_client, monkeypatch):
+    def unavailable(rows, queue):
+        raise ConnectionError("broker down")
+    monkeypatch.setattr(broker, "enqueue_deliveries", unavailable)
+    due = add_delivery("PENDING_RETRY", 60, next_retry_age=5, attempt_count=1)
+    schedule_retries([due])
+    with pytest.raises(ConnectionError):
+        webhook_tasks.release_due_retries()
+    assert _statuses(db, due) == ["PENDING_RETRY"]
+    assert _scheduled(redis_client) == {due}
@@ -198,21 +198,22 @@ export function SubscriptionDetails() {
                                         </tr>
                                       </thead>
                                       <tbody>
-                                        {delivery.attempts.map((attempt, index) => (
-                                          <tr key={index}>
-                                            <td>{index + 1}</td>
+                                        {delivery.attempts.map((attempt) => (
+                                          <tr key={attempt.attempt_number}>
+                                            <td>{attempt.attempt_number}</td>
                                             <td>{new Date(attempt.timestamp).toLocaleString()}</td>
                                             <td>
                                               <Badge 
                                                 size="sm"
-                                                color={attempt.success ? 'green' : 'red'}
+                                                color={attempt.outcome === 'SUCCESS' ? 'green' : 'red'}
                                               >
-                                                {attempt.success ? 'SUCCESS' : 'FAILED'}
+                                                {attempt.outcome === 'SUCCESS' ? 'SUCCESS' : 'FAILED'}
                                               </Badge>
                                             </td>
                                             <td>
                                               <Text size="sm">
-                                                {attempt.response_code} - {attempt.response_message || 'No message'}
+                                                {attempt.status_code ?? 'No response'} - {attempt.error_details || 'No message'}
+                                                {attempt.duration_ms !== null && ` (${attempt.duration_ms} ms)`}
                                               </Text>
                                             </td>
                                           </tr>
@@ -1,11 +1,10 @@
 export interface DeliveryAttempt {
-    id: number;
-    delivery_id: number;
+    attempt_number: number;
     timestamp: string;
-    success: boolean;
-    response_code: number;
-    response_message: string | null;
-    response_body: string | null;
+    status_code: number | null;
+    outcome: 'SUCCESS' | 'FAILED_ATTEMPT';
+    error_details: string | null;  // error, or the response body of a failed attempt
+    duration_ms: number | null;
   }
   
   export interface WebhookDelivery {
@@ -17,8 +16,6 @@ export interface DeliveryAttempt {
     created_at: string;
     last_attempt: string | null;
     next_retry: string | null;
-    response_code?: number;
-    response_body?: string;
-    payload?: any;
+    payload?: any;  // on single deliveries and recent deliveries, not on the filtered listing
     attempts: DeliveryAttempt[];
   }
\ No newline at end of file